@@ -0,0 +1,275 @@
+"""부하 테스트/리플레이용 가짜 Telegram·Gemini 구현과 봇 부팅 도우미.
+
+네트워크 없이 main의 라우터를 그대로 돌리기 위해
+- Bot 세션을 FakeSession으로 바꿔 Bot API 호출을 메모리에서 처리하고
+- llm._get_client를 FakeGenaiClient로 바꿔 지연/실패를 흉내냅니다.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import math
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from types import ModuleType, SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram import methods, types  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from google.genai import errors  # noqa: E402
+
+FAKE_BOT_ID = 999_000
+FAKE_BOT_USERNAME = "loadtest_bot"
+
+# 현재 처리 중인 업데이트가 들어온 시각 (perf_counter). 응답 지연 측정용
+update_started: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("update_started", default=None)
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[k]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """밀리초 단위 샘플의 p50/p95/p99/max를 반환합니다."""
+    return {
+        "count": len(samples),
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "p99_ms": percentile(samples, 99),
+        "max_ms": max(samples) if samples else 0.0,
+    }
+
+
+class FakeSession(BaseSession):
+    """Bot API 요청을 네트워크 없이 처리하는 세션. 보낸 메시지와 응답 지연을 기록합니다."""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        bot_id: int = FAKE_BOT_ID,
+        bot_username: str = FAKE_BOT_USERNAME,
+    ) -> None:
+        super().__init__()
+        self.latency = latency
+        self.bot_id = bot_id
+        self.bot_username = bot_username
+        self.calls: Dict[str, int] = {}
+        self.sent: List[Dict[str, Any]] = []
+        self.reply_latencies_ms: List[float] = []
+        self._next_message_id = 1
+
+    async def make_request(self, bot, method, timeout=None):  # type: ignore[override]
+        name = type(method).__name__
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if isinstance(method, methods.GetMe):
+            return self._me()
+        if isinstance(method, methods.SendMessage):
+            started = update_started.get()
+            if started is not None:
+                self.reply_latencies_ms.append((time.perf_counter() - started) * 1000)
+            self.sent.append({"chat_id": method.chat_id, "text": method.text})
+            self._next_message_id += 1
+            return types.Message(
+                message_id=self._next_message_id,
+                date=datetime.now(),
+                chat=types.Chat(id=int(method.chat_id), type="supergroup"),
+                from_user=self._me(),
+                text=method.text,
+            )
+        return True
+
+    def _me(self) -> types.User:
+        return types.User(id=self.bot_id, is_bot=True, first_name="loadtest", username=self.bot_username)
+
+    async def close(self) -> None:
+        return None
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):  # type: ignore[override]
+        yield b""
+
+
+class FakeModels:
+    """genai Client.models.generate_content를 흉내냅니다 (동기, 스레드에서 호출됨).
+
+    지연은 median_ms/p95_ms로 정한 로그정규분포를 따르고, failure_rate 비율로 503을 던집니다.
+    """
+
+    def __init__(self, median_ms: float, p95_ms: float, failure_rate: float, seed: int) -> None:
+        self._mu = math.log(max(median_ms, 0.001) / 1000)
+        self._sigma = max(0.0, math.log(max(p95_ms, median_ms) / max(median_ms, 0.001)) / 1.645)
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+
+    def generate_content(self, *, model: str, contents: Any, config: Any = None) -> Any:
+        with self._lock:
+            self.calls += 1
+            delay = self._rng.lognormvariate(self._mu, self._sigma)
+            fail = self._rng.random() < self.failure_rate
+            if fail:
+                self.failures += 1
+        time.sleep(delay)
+        if fail:
+            raise errors.ServerError(503, {"error": {"code": 503, "message": "fake overload", "status": "UNAVAILABLE"}})
+        text = f"({model}) 가짜 응답입니다."
+        part = SimpleNamespace(text=text)
+        candidate = SimpleNamespace(content=SimpleNamespace(parts=[part]), finish_reason="STOP")
+        usage = SimpleNamespace(prompt_token_count=len(str(contents)) // 3, candidates_token_count=len(text) // 2)
+        return SimpleNamespace(text=text, candidates=[candidate], usage_metadata=usage)
+
+
+class FakeGenaiClient:
+    def __init__(self, median_ms: float = 800, p95_ms: float = 2500, failure_rate: float = 0.0, seed: int = 1) -> None:
+        self.models = FakeModels(median_ms, p95_ms, failure_rate, seed)
+
+
+class LoopLagMonitor:
+    """interval마다 깨어나 예정보다 늦게 깨어난 시간을 이벤트 루프 지연으로 기록합니다."""
+
+    def __init__(self, interval: float = 0.05) -> None:
+        self.interval = interval
+        self.samples_ms: List[float] = []
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="loop-lag-monitor")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples_ms.append(max(0.0, (loop.time() - expected) * 1000))
+
+
+def boot_bot(
+    chat_ids: Iterable[int],
+    *,
+    storage: str = "memory",
+    data_dir: Optional[str] = None,
+    idle_reply_prob: float = 0.0,
+    telegram_latency: float = 0.0,
+    llm: Optional[FakeGenaiClient] = None,
+    bot_id: int = FAKE_BOT_ID,
+    bot_username: str = FAKE_BOT_USERNAME,
+) -> ModuleType:
+    """가짜 환경 변수와 스텁으로 main을 import하고 모듈을 반환합니다.
+
+    .env 파일은 만들지 않으며, sqlite 저장소를 쓰면 data_dir 아래에 DB를 만듭니다.
+    """
+    if "main" in sys.modules:
+        raise RuntimeError("main은 프로세스당 한 번만 부팅할 수 있어요.")
+
+    env = {
+        "TELEGRAM_BOT_TOKEN": "123456:LOADTEST",
+        "GEMINI_API_KEY": "fake",
+        "TELEGRAM_GROUP_IDS": ",".join(str(c) for c in chat_ids),
+        "TELEGRAM_ADMIN_IDS": "",
+        "BOT_IDLE_REPLY_PROB": str(idle_reply_prob),
+        "STORAGE_BACKEND": storage,
+        "MAX_CALLS_PER_DAY": str(10**9),
+        "MAX_INPUT_CHARS_PER_DAY": str(10**12),
+        "MAX_OUTPUT_TOKENS_PER_DAY": str(10**12),
+        "MAX_CALLS_PER_CHAT_PER_DAY": "0",
+    }
+    if storage == "sqlite":
+        if not data_dir:
+            raise ValueError("sqlite 저장소에는 data_dir이 필요해요.")
+        env["USAGE_DB_PATH"] = os.path.join(data_dir, "usage.db")
+    os.environ.update(env)
+
+    import setenv
+    import store
+
+    setenv.ensure_env_file = lambda *a, **kw: None  # 저장소에 .env를 만들지 않도록
+    if storage == "sqlite":
+        store.DB_PATH = os.path.join(data_dir, "chat.db")  # type: ignore[arg-type]
+
+    import llm as llm_module
+    import main
+
+    fake_llm = llm or FakeGenaiClient()
+    llm_module._get_client = lambda: fake_llm  # type: ignore[assignment]
+    main.bot.session = FakeSession(latency=telegram_latency, bot_id=bot_id, bot_username=bot_username)
+    return main
+
+
+def make_update(
+    update_id: int,
+    chat_id: int,
+    user_id: int,
+    text: str,
+    *,
+    reply_to_bot: bool = False,
+) -> types.Update:
+    """chat_id 방에서 user_id가 text를 보낸 합성 업데이트를 만듭니다."""
+    reply = None
+    if reply_to_bot:
+        reply = types.Message(
+            message_id=update_id * 2,
+            date=datetime.now(),
+            chat=types.Chat(id=chat_id, type="supergroup"),
+            from_user=types.User(id=FAKE_BOT_ID, is_bot=True, first_name="loadtest", username=FAKE_BOT_USERNAME),
+            text="이전 봇 응답",
+        )
+    message = types.Message(
+        message_id=update_id * 2 + 1,
+        date=datetime.now(),
+        chat=types.Chat(id=chat_id, type="supergroup"),
+        from_user=types.User(id=user_id, is_bot=False, first_name=f"user{user_id}", username=f"user{user_id}"),
+        text=text,
+        reply_to_message=reply,
+    )
+    return types.Update(update_id=update_id, message=message)
+
+
+def print_report(tag: str, result: Dict[str, Any]) -> None:
+    """loadtest/replay 결과 딕셔너리를 사람이 읽기 좋게 출력합니다."""
+    print(
+        f"[{tag}] 업데이트 {result['updates']}건 / {result['elapsed_s']:.2f}s "
+        f"= {result['throughput_msg_s']:.1f} msg/s (오류 {result['errors']}건)"
+    )
+    print(f"[{tag}] 응답 {result['replies']}건, LLM 호출 {result['llm_calls']}건 (실패 {result['llm_failures']}건)")
+    for key, label in (("reply_latency", "응답 지연"), ("handle_latency", "처리 시간"), ("loop_lag", "루프 지연")):
+        s = result[key]
+        print(
+            f"[{tag}] {label}: p50 {s['p50_ms']:.1f}ms, p95 {s['p95_ms']:.1f}ms, "
+            f"p99 {s['p99_ms']:.1f}ms, max {s['max_ms']:.1f}ms (n={s['count']})"
+        )
+
+
+async def feed(dp: Any, bot: Any, update: types.Update) -> float:
+    """업데이트 하나를 디스패처에 넣고 처리 시간(ms)을 반환합니다."""
+    started = time.perf_counter()
+    token = update_started.set(started)
+    try:
+        await dp.feed_update(bot, update)
+    finally:
+        update_started.reset(token)
+    return (time.perf_counter() - started) * 1000
@@ -0,0 +1,158 @@
+"""main 라우터 전체를 합성 메시지로 두드리는 종단 간 부하 테스트.
+
+Telegram과 Gemini는 benchmarks/fakes.py의 가짜 구현으로 바꾸므로 네트워크 없이 CI에서도
+같은 시드로 반복 실행할 수 있습니다.
+
+사용 예)
+    python benchmarks/loadtest.py --messages 5000 --rate 200 --chats 300
+    python benchmarks/loadtest.py --duration 30 --rate 100 --llm-median-ms 800 --llm-p95-ms 3000 \\
+        --llm-failure-rate 0.02 --storage sqlite --json result.json
+
+처리량(msg/s), 응답 지연 p50/p95/p99, 이벤트 루프 지연을 출력합니다.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import fakes  # noqa: E402
+
+WORDS = ("안녕", "오늘", "점심", "뭐", "먹지", "ㅋㅋ", "회의", "언제", "좋아요", "link", "test", "주말")
+
+
+def _message_text(rng: random.Random, mention_ratio: float) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 12)))
+    if rng.random() < mention_ratio:
+        text = f"@{fakes.FAKE_BOT_USERNAME} {text}"
+    return text
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    chat_ids = [-1000 - i for i in range(args.chats)]
+    data_dir = tempfile.mkdtemp(prefix="loadtest-") if args.storage == "sqlite" else None
+    fake_llm = fakes.FakeGenaiClient(
+        median_ms=args.llm_median_ms,
+        p95_ms=args.llm_p95_ms,
+        failure_rate=args.llm_failure_rate,
+        seed=args.seed,
+    )
+
+    sink = io.StringIO() if not args.verbose else None
+    with contextlib.redirect_stdout(sink) if sink is not None else contextlib.nullcontext():
+        main = fakes.boot_bot(
+            chat_ids,
+            storage=args.storage,
+            data_dir=data_dir,
+            idle_reply_prob=args.idle_reply_prob,
+            telegram_latency=args.telegram_latency_ms / 1000,
+            llm=fake_llm,
+        )
+        import botlog
+        import outbound
+        import store
+
+        if args.outbound:
+            outbound.init_sender(main.bot)
+
+        lag = fakes.LoopLagMonitor()
+        lag.start()
+        interval = 1 / args.rate if args.rate > 0 else 0.0
+        deadline = time.perf_counter() + args.duration if args.duration else None
+        tasks: List[asyncio.Task[float]] = []
+        started = time.perf_counter()
+        next_at = started
+        update_id = 0
+        while True:
+            if deadline is not None:
+                if time.perf_counter() >= deadline:
+                    break
+            elif update_id >= args.messages:
+                break
+            update_id += 1
+            update = fakes.make_update(
+                update_id,
+                rng.choice(chat_ids),
+                rng.randint(1, args.users),
+                _message_text(rng, args.mention_ratio),
+                reply_to_bot=rng.random() < args.reply_ratio,
+            )
+            tasks.append(asyncio.create_task(fakes.feed(main.dp, main.bot, update)))
+            if interval:
+                next_at += interval
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    await asyncio.sleep(0)
+
+        handled = await asyncio.gather(*tasks, return_exceptions=True)
+        elapsed = time.perf_counter() - started
+        await lag.stop()
+        store.shutdown_executors()
+        botlog.flush()  # 큐에 남은 봇 로그도 sink로 보냄
+
+    session: fakes.FakeSession = main.bot.session  # type: ignore[assignment]
+    handle_ms = [h for h in handled if isinstance(h, float)]
+    return {
+        "config": {
+            k: v for k, v in vars(args).items() if k not in ("json", "verbose")
+        },
+        "updates": len(tasks),
+        "errors": sum(1 for h in handled if isinstance(h, BaseException)),
+        "elapsed_s": elapsed,
+        "throughput_msg_s": len(tasks) / elapsed if elapsed else 0.0,
+        "replies": len(session.sent),
+        "reply_latency": fakes.summarize(session.reply_latencies_ms),
+        "handle_latency": fakes.summarize(handle_ms),
+        "loop_lag": fakes.summarize(lag.samples_ms),
+        "llm_calls": fake_llm.models.calls,
+        "llm_failures": fake_llm.models.failures,
+        "telegram_calls": dict(session.calls),
+    }
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000, help="보낼 업데이트 수 (--duration이 없을 때)")
+    parser.add_argument("--duration", type=float, default=0.0, help="초 단위 실행 시간 (지정하면 --messages 무시)")
+    parser.add_argument("--rate", type=float, default=200.0, help="초당 업데이트 수 (0이면 최대한 빠르게)")
+    parser.add_argument("--chats", type=int, default=300)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--mention-ratio", type=float, default=0.2, help="봇을 멘션하는 메시지 비율")
+    parser.add_argument("--reply-ratio", type=float, default=0.05, help="봇 메시지에 답장하는 비율")
+    parser.add_argument("--idle-reply-prob", type=float, default=0.0)
+    parser.add_argument("--llm-median-ms", type=float, default=800.0)
+    parser.add_argument("--llm-p95-ms", type=float, default=2500.0)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--telegram-latency-ms", type=float, default=0.0)
+    parser.add_argument("--storage", choices=("memory", "sqlite"), default="memory")
+    parser.add_argument("--outbound", action="store_true", help="outbound 전송 속도 제한을 켭니다")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", default=None, help="결과를 JSON 파일로 저장 ('-'면 표준 출력)")
+    parser.add_argument("--verbose", action="store_true", help="봇 로그를 그대로 출력합니다")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args))
+    fakes.print_report("loadtest", result)
+    if args.json == "-":
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    elif args.json:
+        Path(args.json).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 1 if result["errors"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
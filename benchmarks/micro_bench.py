@@ -0,0 +1,219 @@
+"""응답마다 실행되는 저장소/컨텍스트 경로의 마이크로 벤치마크.
+
+측정 대상
+    store.save_message, store.get_recent_messages, store.get_memory_config,
+    utils.filter_and_compact, context_builder.build_context_for_llm,
+    quota._check_quota_or_msg + quota.add_usage
+
+사용 예)
+    python benchmarks/micro_bench.py --rows 10000 1000000 10000000 --json result.json
+    python benchmarks/micro_bench.py --rows 10000 --save-baseline benchmarks/baseline.json
+    python benchmarks/micro_bench.py --rows 10000 --baseline benchmarks/baseline.json --tolerance 0.25
+
+DB는 store_bench.py와 같은 방식(bench_<rows>.db, 300개 채팅방)으로 --db-dir에 만들어 재사용합니다.
+--baseline을 주면 p50이 기준보다 tolerance 이상(그리고 --min-delta-us 이상) 느려진 항목을 표시하고
+종료 코드 1로 끝납니다.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Sequence
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import store_bench  # noqa: E402  (저장소 루트를 sys.path에 추가함)
+
+import store  # noqa: E402
+
+CONFIG = SimpleNamespace(max_output_tokens=300)  # llm.CONFIG 대신 (genai import 없이)
+SAMPLE_TEXT = "오늘 점심 뭐 먹지 ㅋㅋ 회의는 언제예요?"
+
+
+def _stats(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+
+    def pct(p: float) -> float:
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+    return {
+        "n": len(ordered),
+        "mean_us": statistics.fmean(ordered),
+        "p50_us": pct(50),
+        "p95_us": pct(95),
+        "p99_us": pct(99),
+    }
+
+
+def _measure(fn: Callable[..., Any], args_list: Sequence[tuple], warmup: int = 20) -> Dict[str, float]:
+    for args in args_list[:warmup]:
+        fn(*args)
+    samples = []
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - t0) * 1e6)
+    return _stats(samples)
+
+
+def _max_message_id() -> int:
+    conn = store.get_conn()
+    try:
+        return conn.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _drop_messages_after(message_id: int) -> None:
+    conn = store.get_conn()
+    try:
+        conn.execute("DELETE FROM messages WHERE id > ?", (message_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def bench_paths(iterations: int, chats: int, seed: int) -> Dict[str, Dict[str, float]]:
+    """현재 store.DB_PATH에 대해 각 경로를 iterations번씩 측정합니다."""
+    import context_builder
+    import quota
+    import utils
+
+    rng = random.Random(seed)
+    chat_ids = [-1000 - rng.randrange(chats) for _ in range(iterations)]
+    now = int(time.time())
+    results: Dict[str, Dict[str, float]] = {}
+
+    # 쓰기 경로: 측정 후 추가한 행을 지워 캐시된 DB가 실행마다 커지지 않게 합니다.
+    before = _max_message_id()
+    results["save_message"] = _measure(
+        store.save_message, [(cid, 42, "bench", "user", SAMPLE_TEXT, now) for cid in chat_ids]
+    )
+    _drop_messages_after(before)
+
+    results["get_recent_messages"] = _measure(
+        store.get_recent_messages, [(cid, 60 * 24, 100) for cid in chat_ids]
+    )
+    results["get_memory_config"] = _measure(store.get_memory_config, [(cid,) for cid in chat_ids])
+
+    fetched = [store.get_recent_messages(cid, 60 * 24 * 30, 100) for cid in chat_ids[: min(200, iterations)]]
+    results["filter_and_compact"] = _measure(
+        utils.filter_and_compact, [(fetched[i % len(fetched)],) for i in range(iterations)]
+    )
+    results["build_context_for_llm"] = _measure(
+        context_builder.build_context_for_llm, [(cid, "bench", SAMPLE_TEXT, 2000) for cid in chat_ids]
+    )
+
+    def quota_round_trip(cid: int) -> None:
+        quota._check_quota_or_msg(cid, input_chars=2000, config=CONFIG)
+        quota.add_usage(cid, input_chars=2000, output_tokens=300)
+
+    results["check_quota+add_usage"] = _measure(quota_round_trip, [(cid,) for cid in chat_ids])
+    return results
+
+
+def compare(
+    current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_delta_us: float = 20.0
+) -> List[str]:
+    """p50 기준으로 tolerance 이상 느려진 항목 설명 목록을 반환합니다.
+
+    수 마이크로초짜리 경로의 측정 잡음은 min_delta_us 이하 차이로 보고 무시합니다.
+    """
+    regressions: List[str] = []
+    for rows, paths in current["results"].items():
+        base_paths = baseline.get("results", {}).get(rows)
+        if not base_paths:
+            print(f"[micro] rows={rows}: 기준값 없음")
+            continue
+        for name, stats in paths.items():
+            base = base_paths.get(name)
+            if not base:
+                continue
+            ratio = stats["p50_us"] / base["p50_us"] if base["p50_us"] else 1.0
+            mark = ""
+            if ratio > 1 + tolerance and stats["p50_us"] - base["p50_us"] > min_delta_us:
+                mark = "  <-- 회귀"
+                regressions.append(f"rows={rows} {name}: p50 {base['p50_us']:.0f}us -> {stats['p50_us']:.0f}us")
+            print(f"[micro] rows={rows} {name}: p50 x{ratio:.2f}{mark}")
+    return regressions
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="*", default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument("--chats", type=int, default=store_bench.CHATS)
+    parser.add_argument("--db-dir", default=None)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=2)
+    parser.add_argument("--json", default=None, help="결과를 JSON 파일로 저장 ('-'면 표준 출력)")
+    parser.add_argument("--baseline", default=None, help="비교할 기준 JSON")
+    parser.add_argument("--save-baseline", default=None, help="이번 결과를 기준 JSON으로 저장")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="허용하는 p50 증가 비율 (기본 0.2 = 20%%)")
+    parser.add_argument("--min-delta-us", type=float, default=20.0, help="이보다 작은 p50 증가는 회귀로 보지 않음")
+    args = parser.parse_args(argv)
+
+    db_dir = args.db_dir or tempfile.mkdtemp(prefix="micro-bench-")
+    import quota
+
+    quota.USAGE_DB_PATH = os.path.join(db_dir, "usage.db")
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+            "chats": args.chats,
+            "seed": args.seed,
+            "created_at": int(time.time()),
+        },
+        "results": {},
+    }
+    for rows in args.rows:
+        path = os.path.join(db_dir, f"bench_{rows}.db")
+        if not os.path.exists(path):
+            t0 = time.perf_counter()
+            store_bench.generate(path, rows, chats=args.chats)
+            print(f"[micro] {rows:,}행 생성: {time.perf_counter() - t0:.1f}s ({path})")
+        store.DB_PATH = path
+        store.init_db()
+        results = bench_paths(args.iterations, args.chats, args.seed)
+        report["results"][str(rows)] = results
+        for name, s in results.items():
+            print(
+                f"[micro] rows={rows:,} {name}: mean {s['mean_us']:.0f}us, p50 {s['p50_us']:.0f}us, "
+                f"p95 {s['p95_us']:.0f}us, p99 {s['p99_us']:.0f}us"
+            )
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.json == "-":
+        print(text)
+    elif args.json:
+        Path(args.json).write_text(text, encoding="utf-8")
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(text, encoding="utf-8")
+        print(f"[micro] 기준값 저장: {args.save_baseline}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(report, baseline, args.tolerance, args.min_delta_us)
+        for r in regressions:
+            print(f"[micro] 회귀: {r}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,211 @@
+"""recorder.py로 기록한 업데이트 로그를 가짜 Telegram/Gemini 환경에서 가속 재생합니다.
+
+사용 예)
+    python benchmarks/replay.py updates.jsonl.gz --speed 20
+    python benchmarks/replay.py updates.jsonl.gz --speed 100 --max-gap 60 --storage sqlite --json replay.json
+
+업데이트 사이 간격은 기록된 시각 차이를 --speed로 나눈 만큼 기다립니다 (0이면 간격 없이).
+기본적으로 time.time()을 기록 시각 기준의 가상 시계로 바꿔, 가속해도 저장 시각과
+컨텍스트 창(최근 N분)이 실제 트래픽과 같은 모양이 되도록 합니다 (--wall-clock으로 끔).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import fakes  # noqa: E402
+import recorder  # noqa: E402  (fakes가 저장소 루트를 sys.path에 추가함)
+from aiogram import types  # noqa: E402
+
+_CHAT_EVENTS = ("message", "edited_message", "channel_post", "edited_channel_post", "my_chat_member", "chat_member")
+
+
+def _chat_id(update: Dict[str, Any]) -> Optional[int]:
+    for key in _CHAT_EVENTS:
+        event = update.get(key)
+        if event and "chat" in event:
+            return event["chat"]["id"]
+    callback = update.get("callback_query")
+    if callback and callback.get("message"):
+        return callback["message"]["chat"]["id"]
+    return None
+
+
+def scan_log(path: str) -> Dict[str, Any]:
+    """재생 전에 로그를 한 번 훑어 채팅방 목록, 봇 정보, 시간 범위를 구합니다."""
+    chat_ids: Set[int] = set()
+    meta: Dict[str, Any] = {}
+    first_ts = last_ts = None
+    count = 0
+    for record in recorder.read_records(path):
+        if record.get("type") == "meta":
+            meta = record
+            continue
+        if record.get("type") != "update":
+            continue
+        count += 1
+        ts = record["ts"]
+        first_ts = ts if first_ts is None else first_ts
+        last_ts = ts
+        chat_id = _chat_id(record["update"])
+        if chat_id is not None:
+            chat_ids.add(chat_id)
+    return {"chat_ids": chat_ids, "meta": meta, "first_ts": first_ts, "last_ts": last_ts, "updates": count}
+
+
+class VirtualClock:
+    """기록 시작 시각부터 speed배로 흐르는 시계. time.time을 대체합니다."""
+
+    def __init__(self, origin: float, speed: float) -> None:
+        self._origin = origin
+        self._speed = speed
+        self._started = time.perf_counter()
+        self._real_time = time.time
+
+    def __call__(self) -> float:
+        return self._origin + (time.perf_counter() - self._started) * self._speed
+
+    def install(self) -> None:
+        time.time = self  # type: ignore[assignment]
+
+    def uninstall(self) -> None:
+        time.time = self._real_time  # type: ignore[assignment]
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    scan = scan_log(args.log)
+    if not scan["updates"]:
+        raise SystemExit(f"[replay] 재생할 업데이트가 없어요: {args.log}")
+    meta = scan["meta"]
+    data_dir = tempfile.mkdtemp(prefix="replay-") if args.storage == "sqlite" else None
+    fake_llm = fakes.FakeGenaiClient(
+        median_ms=args.llm_median_ms,
+        p95_ms=args.llm_p95_ms,
+        failure_rate=args.llm_failure_rate,
+        seed=args.seed,
+    )
+
+    sink = io.StringIO() if not args.verbose else None
+    with contextlib.redirect_stdout(sink) if sink is not None else contextlib.nullcontext():
+        main = fakes.boot_bot(
+            sorted(scan["chat_ids"]),
+            storage=args.storage,
+            data_dir=data_dir,
+            idle_reply_prob=args.idle_reply_prob,
+            telegram_latency=args.telegram_latency_ms / 1000,
+            llm=fake_llm,
+            bot_id=meta.get("bot_id") or fakes.FAKE_BOT_ID,
+            bot_username=meta.get("bot_username") or fakes.FAKE_BOT_USERNAME,
+        )
+        import botlog
+        import outbound
+        import store
+
+        if args.outbound:
+            outbound.init_sender(main.bot)
+
+        speed = args.speed
+        clock = VirtualClock(scan["first_ts"], speed or 1.0) if not args.wall_clock else None
+        if clock:
+            clock.install()
+
+        lag = fakes.LoopLagMonitor()
+        lag.start()
+        tasks: List[asyncio.Task[float]] = []
+        started = time.perf_counter()
+        offset = 0.0  # --max-gap으로 줄인 시간의 누적
+        prev_ts: Optional[float] = None
+        try:
+            for record in recorder.read_records(args.log):
+                if record.get("type") != "update":
+                    continue
+                if args.limit and len(tasks) >= args.limit:
+                    break
+                ts = record["ts"]
+                if prev_ts is not None and args.max_gap and ts - prev_ts > args.max_gap:
+                    offset += ts - prev_ts - args.max_gap
+                prev_ts = ts
+                if speed:
+                    due = started + (ts - scan["first_ts"] - offset) / speed
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                update = types.Update.model_validate(record["update"], context={"bot": main.bot})
+                tasks.append(asyncio.create_task(fakes.feed(main.dp, main.bot, update)))
+                await asyncio.sleep(0)
+
+            handled = await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            if clock:
+                clock.uninstall()
+        elapsed = time.perf_counter() - started
+        await lag.stop()
+        store.shutdown_executors()
+        botlog.flush()  # 큐에 남은 봇 로그도 sink로 보냄
+
+    session: fakes.FakeSession = main.bot.session  # type: ignore[assignment]
+    handle_ms = [h for h in handled if isinstance(h, float)]
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "verbose")},
+        "log": {
+            "updates": scan["updates"],
+            "chats": len(scan["chat_ids"]),
+            "span_s": (scan["last_ts"] or 0) - (scan["first_ts"] or 0),
+        },
+        "updates": len(tasks),
+        "errors": sum(1 for h in handled if isinstance(h, BaseException)),
+        "elapsed_s": elapsed,
+        "throughput_msg_s": len(tasks) / elapsed if elapsed else 0.0,
+        "replies": len(session.sent),
+        "reply_latency": fakes.summarize(session.reply_latencies_ms),
+        "handle_latency": fakes.summarize(handle_ms),
+        "loop_lag": fakes.summarize(lag.samples_ms),
+        "llm_calls": fake_llm.models.calls,
+        "llm_failures": fake_llm.models.failures,
+        "telegram_calls": dict(session.calls),
+    }
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="UPDATE_RECORD_PATH로 기록한 .jsonl.gz 파일")
+    parser.add_argument("--speed", type=float, default=10.0, help="재생 배속 (1~100, 0이면 간격 없이)")
+    parser.add_argument("--max-gap", type=float, default=0.0, help="기록상 이보다 긴 공백(초)은 이 길이로 줄임")
+    parser.add_argument("--limit", type=int, default=0, help="앞에서부터 이 개수만 재생")
+    parser.add_argument("--wall-clock", action="store_true", help="가상 시계를 쓰지 않고 실제 시각으로 저장")
+    parser.add_argument("--idle-reply-prob", type=float, default=0.0)
+    parser.add_argument("--llm-median-ms", type=float, default=800.0)
+    parser.add_argument("--llm-p95-ms", type=float, default=2500.0)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--telegram-latency-ms", type=float, default=0.0)
+    parser.add_argument("--storage", choices=("memory", "sqlite"), default="memory")
+    parser.add_argument("--outbound", action="store_true", help="outbound 전송 속도 제한을 켭니다")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", default=None, help="결과를 JSON 파일로 저장 ('-'면 표준 출력)")
+    parser.add_argument("--verbose", action="store_true", help="봇 로그를 그대로 출력합니다")
+    args = parser.parse_args(argv)
+    if args.speed < 0 or args.speed > 100:
+        parser.error("--speed는 0~100 사이여야 해요.")
+
+    result = asyncio.run(run(args))
+    fakes.print_report("replay", result)
+    if args.json == "-":
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    elif args.json:
+        Path(args.json).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 1 if result["errors"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,144 @@
+"""main.py의 시작 시간 리포트 (`python -X importtime` + startup.py 단계 타이머).
+
+가짜 토큰과 메모리 저장소로 새 인터프리터에서 `import main`만 실행해(폴링·API 호출 없음)
+-X importtime 출력을 모아 누적 시간이 큰 모듈과 패키지별 합계를 보여 주고, startup.py가 잰
+imports → init_db → bots 단계 시간을 함께 출력합니다. 지연 import 대상(google.genai, bs4)이
+시작 시점에 불러와졌으면 알려 줍니다.
+
+사용 예)
+    python benchmarks/startup_report.py
+    python benchmarks/startup_report.py --top 30 --budget-ms 5000 --json startup.json
+
+--budget-ms를 넘기거나 지연 import 대상이 시작 시점에 불러와지면 종료 코드 1로 끝납니다.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+
+LAZY_MODULES = ("google.genai", "bs4")
+
+# 새 인터프리터에서 실행할 코드: .env를 만들지 않도록 막고 main을 import한 뒤 결과를 JSON 한 줄로 출력.
+_BOOT = """
+import io, json, sys, contextlib
+sys.path.insert(0, {root!r})
+import setenv
+setenv.ensure_env_file = lambda *a, **kw: None
+with contextlib.redirect_stdout(io.StringIO()):
+    import main
+import botlog, startup
+botlog.flush()
+print(json.dumps({{"phases": startup.phases(), "loaded": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def _parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """'import time: self [us] | cumulative | imported package' 줄을 모듈별 dict로 바꿉니다."""
+    rows: List[Dict[str, Any]] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            stripped = name.lstrip()
+            rows.append(
+                {
+                    "module": stripped.strip(),
+                    "depth": (len(name) - len(stripped) - 1) // 2,
+                    "self_ms": int(self_us) / 1000,
+                    "cumulative_ms": int(cumulative_us) / 1000,
+                }
+            )
+        except ValueError:
+            continue
+    return rows
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    data_dir = tempfile.mkdtemp(prefix="startup-report-")
+    env = dict(os.environ)
+    env.update(
+        {
+            "TELEGRAM_BOT_TOKEN": "123456:STARTUP",
+            "GEMINI_API_KEY": "fake",
+            "STORAGE_BACKEND": "memory",
+            "USAGE_DB_PATH": os.path.join(data_dir, "usage.db"),
+            "PYTHONDONTWRITEBYTECODE": "1",
+        }
+    )
+    env.pop("BOTS_CONFIG", None)
+    code = _BOOT.format(root=str(ROOT), lazy=LAZY_MODULES)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=data_dir,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=args.timeout,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"main import 실패 (종료 코드 {proc.returncode}):\n{proc.stderr[-2000:]}")
+    boot = json.loads(proc.stdout.strip().splitlines()[-1])
+    rows = _parse_importtime(proc.stderr)
+
+    packages: Dict[str, float] = {}
+    for row in rows:
+        top = row["module"].split(".")[0]
+        packages[top] = packages.get(top, 0.0) + row["self_ms"]
+    main_row = next((r for r in rows if r["module"] == "main"), None)
+    return {
+        "imports_ms": sum(r["self_ms"] for r in rows),
+        "main_cumulative_ms": main_row["cumulative_ms"] if main_row else None,
+        "modules": len(rows),
+        "top_cumulative": sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)[: args.top],
+        "top_packages": sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[: args.top],
+        "phases": boot["phases"],
+        "lazy_loaded_at_startup": boot["loaded"],
+    }
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15, help="출력할 모듈·패키지 수")
+    parser.add_argument("--budget-ms", type=float, default=None, help="import main 누적 시간 예산")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--json", default=None, help="결과를 JSON 파일로 저장 ('-'면 표준 출력)")
+    args = parser.parse_args(argv)
+
+    result = run(args)
+    print(f"[startup] import main 누적 {result['main_cumulative_ms']:.0f}ms (모듈 {result['modules']}개)")
+    print("[startup] 단계: " + ", ".join(f"{name} {sec * 1000:.0f}ms" for name, sec in result["phases"]))
+    print("[startup] 누적 시간 상위 모듈:")
+    for row in result["top_cumulative"]:
+        print(f"  {row['cumulative_ms']:9.1f}ms  {'  ' * row['depth']}{row['module']}")
+    print("[startup] 패키지별 self 합계:")
+    for name, ms in result["top_packages"]:
+        print(f"  {ms:9.1f}ms  {name}")
+
+    failed = False
+    if result["lazy_loaded_at_startup"]:
+        print(f"[startup] 시작 시점에 불러오면 안 되는 모듈이 로드됐어요: {', '.join(result['lazy_loaded_at_startup'])}")
+        failed = True
+    if args.budget_ms is not None and (result["main_cumulative_ms"] or 0) > args.budget_ms:
+        print(f"[startup] 예산 초과: {result['main_cumulative_ms']:.0f}ms > {args.budget_ms:.0f}ms")
+        failed = True
+    if args.json:
+        text = json.dumps(result, ensure_ascii=False, indent=2)
+        if args.json == "-":
+            print(text)
+        else:
+            Path(args.json).write_text(text, encoding="utf-8")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,161 @@
+"""메시지 읽기 경로의 실행 계획 검사 + 대용량 벤치마크.
+
+사용 예)
+    python benchmarks/store_bench.py --check-only          # 실행 계획만 검사 (CI용)
+    python benchmarks/store_bench.py --rows 1000000 10000000
+
+실행 계획에 TEMP B-TREE가 나오거나 커버링 인덱스를 쓰지 않으면 종료 코드 1로 끝납니다.
+생성한 DB는 --db-dir(기본: 임시 디렉터리)에 bench_<rows>.db로 남겨 재사용합니다.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import store  # noqa: E402
+
+CHATS = 300
+SPAN_DAYS = 30
+INSERT_CHUNK = 50_000
+WORDS = ("안녕", "오늘", "점심", "뭐", "먹지", "ㅋㅋ", "봇", "회의", "언제", "좋아요", "link", "test")
+
+
+def _use_db(path: str) -> None:
+    store.DB_PATH = path
+    store.init_db()
+
+
+def check_plans() -> List[str]:
+    """읽기 경로마다 실행 계획을 확인하고 문제를 설명하는 문자열 목록을 반환합니다."""
+    problems: List[str] = []
+    conn = store.get_conn()
+    try:
+        for name, (sql, params) in store.READ_PATH_QUERIES.items():
+            details = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+            plan = " | ".join(details)
+            print(f"[plan] {name}: {plan}")
+            if any("TEMP B-TREE" in d for d in details):
+                problems.append(f"{name}: 정렬에 TEMP B-TREE 사용")
+            if not any("COVERING INDEX" in d for d in details):
+                problems.append(f"{name}: 커버링 인덱스 미사용")
+    finally:
+        conn.close()
+    return problems
+
+
+def generate(path: str, rows: int, chats: int = CHATS, seed: int = 1) -> None:
+    """chats개 채팅방에 rows개 메시지를 SPAN_DAYS일에 걸쳐 채웁니다."""
+    rng = random.Random(seed)
+    now = int(time.time())
+    start = now - SPAN_DAYS * 86400
+    step = max(1, (now - start) // max(1, rows))
+    chat_ids = [-1000 - i for i in range(chats)]
+
+    _use_db(path)
+    conn = store.get_conn()
+    try:
+        conn.execute("PRAGMA synchronous=OFF")
+        for offset in range(0, rows, INSERT_CHUNK):
+            batch = []
+            for i in range(offset, min(rows, offset + INSERT_CHUNK)):
+                bot = rng.random() < 0.2
+                text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 20)))
+                batch.append(
+                    (
+                        rng.choice(chat_ids),
+                        None if bot else rng.randint(1, 500),
+                        "bot" if bot else f"user{rng.randint(1, 500)}",
+                        "bot" if bot else "user",
+                        text,
+                        start + i * step,
+                    )
+                )
+            conn.executemany(
+                """INSERT INTO messages(chat_id, user_id, username, sender, text, ts)
+                       VALUES(?,?,?,?,?,?)""",
+                batch,
+            )
+            conn.commit()
+    finally:
+        conn.close()
+
+
+def _time_calls(fn, args_list) -> Dict[str, float]:
+    samples = []
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - t0) * 1e6)
+    samples.sort()
+    return {
+        "mean_us": statistics.fmean(samples),
+        "p50_us": samples[len(samples) // 2],
+        "p95_us": samples[int(len(samples) * 0.95) - 1],
+    }
+
+
+def bench_reads(iterations: int = 2000, chats: int = CHATS, seed: int = 2) -> Dict[str, Dict[str, float]]:
+    rng = random.Random(seed)
+    chat_ids = [-1000 - rng.randrange(chats) for _ in range(iterations)]
+    now = int(time.time())
+    return {
+        "get_recent_messages": _time_calls(
+            store.get_recent_messages, [(cid, 60 * 24, 100) for cid in chat_ids]
+        ),
+        "get_messages_before": _time_calls(
+            store.get_messages_before,
+            [(cid, now - rng.randrange(SPAN_DAYS * 86400), 200) for cid in chat_ids],
+        ),
+        "get_last_message": _time_calls(store.get_last_message, [(cid,) for cid in chat_ids]),
+    }
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="*", default=[1_000_000, 10_000_000])
+    parser.add_argument("--db-dir", default=None)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--check-only", action="store_true")
+    args = parser.parse_args(argv)
+
+    db_dir = args.db_dir or tempfile.mkdtemp(prefix="store-bench-")
+
+    if args.check_only:
+        _use_db(os.path.join(db_dir, "plan_check.db"))
+        problems = check_plans()
+        for p in problems:
+            print(f"[plan] 실패: {p}")
+        return 1 if problems else 0
+
+    failed = False
+    for rows in args.rows:
+        path = os.path.join(db_dir, f"bench_{rows}.db")
+        if not os.path.exists(path):
+            t0 = time.perf_counter()
+            generate(path, rows)
+            print(f"[bench] {rows:,}행 생성: {time.perf_counter() - t0:.1f}s ({path})")
+        _use_db(path)
+        problems = check_plans()
+        for p in problems:
+            print(f"[plan] 실패: {p}")
+        failed = failed or bool(problems)
+        for name, result in bench_reads(args.iterations).items():
+            print(
+                f"[bench] rows={rows:,} {name}: mean {result['mean_us']:.0f}us, "
+                f"p50 {result['p50_us']:.0f}us, p95 {result['p95_us']:.0f}us"
+            )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,167 @@
+"""웹훅 서버의 수신 처리량 측정.
+
+로컬 포트에 webhook.WebhookServer를 띄우고(setWebhook 호출 없음) 합성 업데이트를 HTTP POST로
+--concurrency개씩 동시에 보냅니다. Telegram·Gemini는 fakes.py의 가짜 구현을 씁니다.
+
+사용 예)
+    python benchmarks/webhook_ingest.py --updates 5000 --concurrency 64
+    python benchmarks/webhook_ingest.py --updates 5000 --queue-size 100 --workers 4 --llm-median-ms 800
+
+수신 처리량(요청/s), POST 지연 p50/p95/p99, 503(역압) 횟수, 큐가 모두 처리될 때까지의 시간을 출력합니다.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import aiohttp
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import fakes  # noqa: E402
+from loadtest import _message_text  # noqa: E402
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    chat_ids = [-1000 - i for i in range(args.chats)]
+    data_dir = tempfile.mkdtemp(prefix="webhook-ingest-") if args.storage == "sqlite" else None
+    fake_llm = fakes.FakeGenaiClient(
+        median_ms=args.llm_median_ms,
+        p95_ms=args.llm_p95_ms,
+        failure_rate=0.0,
+        seed=args.seed,
+    )
+    bodies = [
+        fakes.make_update(
+            i + 1,
+            rng.choice(chat_ids),
+            rng.randint(1, 5000),
+            _message_text(rng, args.mention_ratio),
+        ).model_dump(mode="json", exclude_none=True)
+        for i in range(args.updates)
+    ]
+
+    sink = io.StringIO() if not args.verbose else None
+    with contextlib.redirect_stdout(sink) if sink is not None else contextlib.nullcontext():
+        main = fakes.boot_bot(chat_ids, storage=args.storage, data_dir=data_dir, llm=fake_llm)
+        import botlog
+        import store
+        import webhook
+
+        server = webhook.WebhookServer(
+            main.bot,
+            main.dp,
+            host="127.0.0.1",
+            port=0,
+            queue_size=args.queue_size,
+            workers=args.workers,
+        )
+        await server.start(register=False)
+        url = f"http://127.0.0.1:{server.port}{webhook.WEBHOOK_PATH}"
+        headers = {"X-Telegram-Bot-Api-Secret-Token": server.secret_token}
+
+        lag = fakes.LoopLagMonitor()
+        lag.start()
+        post_ms: List[float] = []
+        statuses: Dict[int, int] = {}
+        pending = iter(bodies)
+
+        async def client(session: aiohttp.ClientSession) -> None:
+            for body in pending:
+                t0 = time.perf_counter()
+                async with session.post(url, json=body, headers=headers) as resp:
+                    await resp.read()
+                    statuses[resp.status] = statuses.get(resp.status, 0) + 1
+                post_ms.append((time.perf_counter() - t0) * 1000)
+
+        started = time.perf_counter()
+        connector = aiohttp.TCPConnector(limit=args.concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            async with session.post(url, json=bodies[0], headers={}) as resp:
+                unauthorized = resp.status  # 비밀 토큰 없는 요청은 거절돼야 함
+            await asyncio.gather(*(client(session) for _ in range(args.concurrency)))
+        ingest_s = time.perf_counter() - started
+        drained = await server.handler.drain(timeout=args.drain_timeout)
+        total_s = time.perf_counter() - started
+        await lag.stop()
+        await server.stop()
+        store.shutdown_executors()
+        botlog.flush()
+
+    handler = server.handler
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "verbose")},
+        "ingest": {
+            "requests": len(post_ms),
+            "seconds": ingest_s,
+            "requests_per_s": len(post_ms) / ingest_s if ingest_s else 0.0,
+            "statuses": {str(k): v for k, v in sorted(statuses.items())},
+            "unauthorized_status": unauthorized,
+        },
+        "post_latency": fakes.summarize(post_ms),
+        "processing": {
+            "accepted": handler.accepted,
+            "rejected": handler.rejected,
+            "processed": handler.processed,
+            "drained": drained,
+            "seconds_until_drained": total_s,
+        },
+        "loop_lag": fakes.summarize(lag.samples_ms),
+    }
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=40, help="동시 POST 수 (Telegram max_connections 기본 40)")
+    parser.add_argument("--chats", type=int, default=300)
+    parser.add_argument("--mention-ratio", type=float, default=0.1)
+    parser.add_argument("--queue-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--drain-timeout", type=float, default=120.0)
+    parser.add_argument("--llm-median-ms", type=float, default=50.0)
+    parser.add_argument("--llm-p95-ms", type=float, default=150.0)
+    parser.add_argument("--storage", choices=("memory", "sqlite"), default="memory")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", default=None, help="결과를 JSON 파일로 저장 ('-'면 표준 출력)")
+    parser.add_argument("--verbose", action="store_true", help="봇 로그를 그대로 출력합니다")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args))
+    ingest, proc = result["ingest"], result["processing"]
+    print(
+        f"[webhook] POST {ingest['requests']}건 / {ingest['seconds']:.2f}s = {ingest['requests_per_s']:.0f} req/s "
+        f"(상태 {ingest['statuses']}, 토큰 없는 요청 {ingest['unauthorized_status']})"
+    )
+    for key, label in (("post_latency", "POST 지연"), ("loop_lag", "루프 지연")):
+        s = result[key]
+        print(
+            f"[webhook] {label}: p50 {s['p50_ms']:.1f}ms, p95 {s['p95_ms']:.1f}ms, "
+            f"p99 {s['p99_ms']:.1f}ms, max {s['max_ms']:.1f}ms (n={s['count']})"
+        )
+    print(
+        f"[webhook] 수락 {proc['accepted']}, 503 {proc['rejected']}, 처리 {proc['processed']} "
+        f"(전부 처리까지 {proc['seconds_until_drained']:.2f}s{'' if proc['drained'] else ', 시간 초과'})"
+    )
+    if args.json:
+        text = json.dumps(result, ensure_ascii=False, indent=2)
+        if args.json == "-":
+            print(text)
+        else:
+            Path(args.json).write_text(text, encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,147 @@
+"""큐 기반 로깅 설정. 이벤트 루프에서는 레코드를 큐에 넣기만 하고 출력은 별도 스레드가 합니다.
+
+환경 변수
+    LOG_LEVEL        DEBUG/INFO/WARNING/ERROR (기본 INFO)
+    LOG_FORMAT       text 또는 json (기본 text). json이면 한 줄에 하나의 JSON 객체
+    LOG_SAMPLE_RATE  sampled=True로 남긴 대량 로그(수신 메시지, LLM 응답)를 남길 비율 0~1 (기본 1)
+    LOG_REDACT       1이면 redact()를 거친 메시지 본문을 길이만 남기고 가립니다 (기본 0)
+
+사용 예)
+    log = botlog.get_logger("llm")
+    log.info("LLM 응답", extra={"chat_id": chat_id, "latency_ms": 812, "sampled": True})
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+from typing import Any, Optional
+
+LOG_LEVEL = (os.getenv("LOG_LEVEL", "INFO") or "INFO").upper()
+LOG_FORMAT = (os.getenv("LOG_FORMAT", "text") or "text").lower()
+LOG_SAMPLE_RATE = max(0.0, min(1.0, float(os.getenv("LOG_SAMPLE_RATE", "1") or 1)))
+LOG_REDACT = os.getenv("LOG_REDACT", "0").lower() in ("1", "true", "yes", "on")
+LOG_QUEUE_SIZE = 10_000  # 출력이 밀리면 이 이상은 버림 (루프를 막지 않도록)
+
+_ROOT = "bot"
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sampled"}
+
+_queue: Optional[queue.Queue] = None
+_handler: Optional[logging.Handler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def redact(text: Optional[str]) -> Optional[str]:
+    """LOG_REDACT가 켜져 있으면 메시지 본문 대신 길이만 남깁니다."""
+    if text is None or not LOG_REDACT:
+        return text
+    return f"<{len(text)}자 생략>"
+
+
+def _fields(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in vars(record).items() if k not in _RESERVED and not k.startswith("_")}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload: dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        payload.update(_fields(record))
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """기존 print 출력처럼 "[모듈] 메시지" 형태에 추가 필드를 key=value로 붙입니다."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        stamp = time.strftime("%H:%M:%S", time.localtime(record.created))
+        tag = record.name.split(".", 1)[-1]
+        level = "" if record.levelno == logging.INFO else f"{record.levelname} "
+        line = f"{stamp} {level}[{tag}] {record.getMessage()}"
+        extra = " ".join(f"{k}={v}" for k, v in _fields(record).items() if v is not None)
+        if extra:
+            line = f"{line} ({extra})"
+        if record.exc_info:
+            line = f"{line}\n{self.formatException(record.exc_info)}"
+        return line
+
+
+class _SampleFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False) or LOG_SAMPLE_RATE >= 1.0:
+            return True
+        return random.random() < LOG_SAMPLE_RATE
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """출력 시점의 sys.stdout에 씁니다 (벤치마크의 redirect_stdout을 따르도록)."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.stream = sys.stdout
+        super().emit(record)
+
+
+class _DropQueueHandler(logging.handlers.QueueHandler):
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def setup_logging() -> None:
+    """"bot" 로거에 큐 핸들러와 출력 스레드를 붙입니다. 여러 번 호출해도 한 번만 설정합니다."""
+    global _queue, _handler, _listener
+    if _listener is not None:
+        return
+    logger = logging.getLogger(_ROOT)
+    logger.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+    logger.propagate = False
+
+    output = _StdoutHandler()
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+    _queue = queue.Queue(LOG_QUEUE_SIZE)
+    _handler = _DropQueueHandler(_queue)
+    _handler.addFilter(_SampleFilter())
+    logger.addHandler(_handler)
+
+    _listener = logging.handlers.QueueListener(_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def get_logger(name: str) -> logging.Logger:
+    setup_logging()
+    return logging.getLogger(f"{_ROOT}.{name}")
+
+
+def flush() -> None:
+    """큐에 쌓인 레코드가 모두 출력될 때까지 기다립니다."""
+    if _queue is not None and _listener is not None:
+        _queue.join()
+
+
+def shutdown_logging() -> None:
+    """남은 레코드를 출력하고 출력 스레드를 멈춥니다."""
+    global _handler, _listener
+    if _listener is None:
+        return
+    if _handler is not None:
+        logging.getLogger(_ROOT).removeHandler(_handler)
+        _handler = None
+    _listener.stop()
+    _listener = None
@@ -1,9 +1,14 @@
 from __future__ import annotations
 import os
-from typing import Set, Optional
+from typing import Callable, Optional, Set
 from aiogram import types, Bot
 from aiogram.filters import Filter
 
+import botlog
+import outbound
+
+log = botlog.get_logger("filter")
+
 
 def parse_ids_from_env(var_name: str = "TELEGRAM_GROUP_IDS") -> Set[int]:
     """
@@ -18,7 +23,7 @@ def parse_ids_from_env(var_name: str = "TELEGRAM_GROUP_IDS") -> Set[int]:
         try:
             out.add(int(chunk))
         except ValueError:
-            print(f"[warn] Ignore invalid chat id in {var_name}: {chunk!r}")
+            log.warning("Ignore invalid chat id in %s: %r", var_name, chunk)
     return out
 
 
@@ -26,15 +31,18 @@ class ChatAllowed(Filter):
     """
     허용된 chat.id 인지 검사하는 필터.
     notify=True 이면 차단시 안내 메시지를 보냄.
+    allowed_for를 주면 업데이트를 받은 봇마다 그 함수로 허용 목록을 구함 (여러 봇 실행 시).
     """
     def __init__(
         self,
         allowed_ids: Optional[Set[int]] = None,
         *,
+        allowed_for: Optional[Callable[[Bot], Set[int]]] = None,
         notify: bool = False,
         notice: str = "이 채팅방은 허용 목록에 없습니다."
     ):
         self.allowed_ids = allowed_ids or set()
+        self.allowed_for = allowed_for
         self.notify = notify
         self.notice = notice
 
@@ -60,16 +68,17 @@ class ChatAllowed(Filter):
             return False
 
         # 허용이면 통과
-        if chat.id in self.allowed_ids:
+        allowed_ids = self.allowed_for(bot) if self.allowed_for else self.allowed_ids
+        if chat.id in allowed_ids:
             return True
 
         # 차단 안내 (무한루프 방지: 봇 메시지에는 알림 X)
         if self.notify:
-            print(f"[info] {chat.id} / {self.allowed_ids})")
+            log.info("허용되지 않은 채팅방", extra={"chat_id": chat.id, "allowed": sorted(allowed_ids), "sampled": True})
             try:
                 if isinstance(event, types.Message):
                     if not self.blocked:
-                        await bot.send_message(chat.id, self.notice)
+                        await outbound.send_message(bot, chat.id, self.notice)
                         self.blocked = True
                 elif isinstance(event, types.CallbackQuery):
                     await event.answer("이 채팅방에서는 사용할 수 없어요.", show_alert=True)
@@ -1,37 +1,43 @@
+import asyncio
+import html
 import time
 from typing import Callable, Set
 
 from aiogram import Bot, types
 
+import botlog
+import loopwatch
+import outbound
 import post_idle
+import profiler
+import retention
+import store
+import tenants
 from context_builder import build_context_for_llm
 from quota import (
-    get_limits,
     get_usage_summary_today,
+    llm_perf_summary,
     reset_limits,
     reset_usage,
     set_limit,
 )
 from store import (
-    cleanup_keep_recent_per_chat,
-    cleanup_old_messages,
     clear_guidelines,
     get_guidelines,
     get_memory_config,
     reset_db,
-    save_message,
     set_guidelines,
     set_memory_config,
 )
-from persona import bot_name
-BOT_NAME = bot_name
+
+log = botlog.get_logger("commands")
 
 
 HELP_TEXT = (
     "[설정]\n"
     "memory show - 메모리 설정 보기\n"
     "memory set [TIME] [COUNT] - 메모리 설정 변경\n"
-    "memory retain [COUNT] [DAY] - 총 보존 개수·일수 설정\n"
+    "memory retain [COUNT] [DAY] - 이 채팅방 보존 개수·일수 설정\n"
     "---\n"
     "guide show - 커스텀 지침 보기\n"
     "guide set [TEXT] - 커스텀 지침 설정/덮어쓰기\n"
@@ -41,12 +47,25 @@ HELP_TEXT = (
     "quota set [KEY] [INT] - 한도 변경 (세션/DB 오버라이드)\n"
     "quota reset [limits|today|all] - 한도/사용량 초기화\n"
     "---\n"
+    "perf [HOURS] - 최근 N시간(기본 24) LLM 지연·상위 채팅방·경로별 비용, 마지막 보존 정리 결과\n"
+    "loop - 이벤트 루프를 오래 막은 코드 위치\n"
+    "profile start [SEC] [mem] - 샘플링 프로파일러 시작 (mem: 할당 추적)\n"
+    "profile stop / profile report [N] [file] - 중지 / 상위 N개 함수·파일 저장\n"
+    "---\n"
     "data context - 현재 컨텍스트 미리보기\n"
     "data reset - 모든 데이터 초기화"
 )
 
 
-def bot_settings(parts, chat_id, user_id, user_name):
+async def bot_settings(parts, chat_id, user_id, user_name, bot_key=None):
+    """/botset 하위 명령. 분기는 이벤트 루프에서 하고, DB 작업은 하나씩 알맞은 스레드로 보냅니다.
+
+    채팅방 설정·지침 쓰기는 그 채팅방 샤드의 writer, 사용량 DB 쓰기는 run_write, 읽기는 run_read,
+    전체 초기화는 샤드마다 그 샤드의 writer에서 실행합니다 (DB마다 writer 하나 원칙).
+    bot_key는 명령을 받은 봇의 Tenant.key로, 컨텍스트 미리보기가 그 봇이 실제로 받는 컨텍스트와 같게 합니다.
+    """
+    shard = store.shard_of(chat_id)
+
     if len(parts) < 2:
         return HELP_TEXT
 
@@ -55,7 +74,7 @@ def bot_settings(parts, chat_id, user_id, user_name):
         return HELP_TEXT
 
     if command == "memory":
-        win, lim, keep, days = get_memory_config(chat_id)
+        win, lim, keep, days = await store.run_read(get_memory_config, chat_id)
 
         if len(parts) < 3:
             return "[사용법] /botset memory [show|set|retain]"
@@ -73,7 +92,7 @@ def bot_settings(parts, chat_id, user_id, user_name):
                 lim = max(1, int(parts[4]))
             except ValueError:
                 return "[사용법] /botset memory set [분] [개수]  예) /botset memory set 60 100"
-            set_memory_config(chat_id, window_minutes=win, memory_limit=lim)
+            await store.run_shard_write(shard, set_memory_config, chat_id, window_minutes=win, memory_limit=lim)
             return f"[컨텍스트 설정 완료] 최근 {win}분, 최대 {lim}개"
 
         if sub == "retain":
@@ -84,10 +103,9 @@ def bot_settings(parts, chat_id, user_id, user_name):
                 m = max(1, int(parts[4]))
             except ValueError:
                 return "[사용법] /botset memory retain [개수] [일수]  예) /botset memory retain 3000 3"
-            set_memory_config(chat_id, keep_per_chat=n, retain_days=m)
-            deleted1 = cleanup_keep_recent_per_chat(keep=n)
-            deleted2 = cleanup_old_messages(days=m)
-            return f"[보존 설정 완료] 채팅방별 최근 {n}개, {m}일 보관 (대략 {deleted1} + {deleted2}개 정리)"
+            await store.run_shard_write(shard, set_memory_config, chat_id, keep_per_chat=n, retain_days=m)
+            deleted = await retention.prune_chat(chat_id, keep=n, days=m)
+            return f"[보존 설정 완료] 이 채팅방 최근 {n}개, {m}일 보관 ({deleted}개 정리)"
 
         return "[사용법] /botset memory [show|set|retain]"
 
@@ -98,7 +116,7 @@ def bot_settings(parts, chat_id, user_id, user_name):
         sub = parts[2].lower()
 
         if sub == "show":
-            txt = get_guidelines(chat_id)
+            txt = await store.run_read(get_guidelines, chat_id)
             if not txt.strip():
                 return "현재 커스텀 지침이 없어요."
             preview = (txt[:900] + "…") if len(txt) > 900 else txt
@@ -108,11 +126,11 @@ def bot_settings(parts, chat_id, user_id, user_name):
             if len(parts) < 4:
                 return "[사용법] /botset guide set [지침내용]"
             text = " ".join(parts[3:]).strip()
-            set_guidelines(chat_id, text, updated_by=user_id)
+            await store.run_shard_write(shard, set_guidelines, chat_id, text, updated_by=user_id)
             return f"커스텀 지침을 저장했어요. ({len(text)}자)"
 
         if sub == "clear":
-            clear_guidelines(chat_id)
+            await store.run_shard_write(shard, clear_guidelines, chat_id)
             return "커스텀 지침을 삭제했어요."
 
         return "[사용법] /botset guide [show|set|clear]"
@@ -123,8 +141,7 @@ def bot_settings(parts, chat_id, user_id, user_name):
         sub = parts[2].lower()
 
         if sub == "show":
-            limits = get_limits()
-            us = get_usage_summary_today()
+            us = await store.run_read(get_usage_summary_today)
             tc, ti, to = us["total"]
             return f"오늘 사용량(총)\n- 호출: {tc}\n- 입력 문자: {ti}\n- 출력 토큰(추정): {to}"
 
@@ -141,7 +158,7 @@ def bot_settings(parts, chat_id, user_id, user_name):
             except ValueError:
                 return "값은 정수여야 해요."
             try:
-                set_limit(key, value)
+                await store.run_write(set_limit, key, value)
             except ValueError as e:
                 return f"오류: {e}"
             return f"{key} = {value} 로 설정했어요."
@@ -149,33 +166,59 @@ def bot_settings(parts, chat_id, user_id, user_name):
         if sub == "reset":
             scope = parts[3].lower() if len(parts) >= 4 else "limits"
             if scope == "limits":
-                reset_limits()
+                await store.run_write(reset_limits)
                 return "한도 오버라이드를 초기화했어요."
             if scope in ("today", "all"):
-                reset_usage(scope)
+                await store.run_write(reset_usage, scope)
                 return f"사용량을 초기화했어요. (scope={scope})"
             return "[사용법] /botset quota reset [limits|today|all]"
 
         return "[사용법] /botset quota [show|set|reset]"
 
+    if command == "perf":
+        try:
+            hours = int(parts[2]) if len(parts) >= 3 else 24
+        except ValueError:
+            return "[사용법] /botset perf [HOURS]"
+        hours = max(1, min(hours, 24 * 31))
+        now = int(time.time())
+        text = _format_perf(await store.run_read(llm_perf_summary, now - hours * 3600, now), hours)
+        scheduler = retention.get_scheduler()
+        if scheduler is not None:  # 보존 정책은 주 프로세스에서만 돕니다
+            text += "\n" + scheduler.report()
+        return text
+
+    if command == "loop":
+        watchdog = loopwatch.get_watchdog()
+        if watchdog is None:
+            return "루프 감시가 실행 중이 아니에요."
+        return html.escape(watchdog.report())
+
+    if command == "profile":
+        # report file은 파일을 쓰므로 이벤트 루프 밖에서
+        return html.escape(await asyncio.to_thread(profiler.handle_profile_command, parts[2:]))
+
     if command == "data":
         if len(parts) < 3:
             return "[사용법] /botset data [context|reset]"
         sub = parts[2].lower()
         if sub == "reset":
-            reset_db()
+            for sid in range(store.shard_count()):
+                await store.run_shard_write(sid, reset_db, shard=sid)
             return "DB 스키마를 초기화했어요. (모든 데이터 삭제)"
 
         if sub == "context":
             try:
-                final_ctx = build_context_for_llm(
+                final_ctx = await store.run_read(
+                    build_context_for_llm,
                     chat_id=chat_id,
                     user_name=user_name,
                     user_msg="메세지",
                     budget_chars=3000,
+                    bot_key=bot_key,
                 )
             except Exception as err:
-                print(f"[ctx] build_context_for_llm error: {err}")
+                log.warning("컨텍스트 미리보기 생성 오류: %r", err, extra={"chat_id": chat_id})
                 return "컨텍스트 생성 중 오류가 발생했어요. 로그를 확인해 주세요."
 
             if not final_ctx.strip():
@@ -188,6 +231,35 @@ def bot_settings(parts, chat_id, user_id, user_name):
     return "모르겠어요. /botset help 로 도움말을 확인하세요."
 
 
+def _format_perf(summary, hours: int) -> str:
+    def ms(value):
+        return f"≤{value}ms" if value is not None else "-"
+
+    calls = summary["calls"]
+    if not calls:
+        return f"최근 {hours}시간 동안 LLM 호출 기록이 없어요."
+    lines = [
+        f"최근 {hours}시간 LLM 호출",
+        f"- 호출: {calls}회 (오류 {summary['errors']}회, {summary['errors'] / calls:.1%})",
+        f"- 지연: p50 {ms(summary['p50_ms'])}, p95 {ms(summary['p95_ms'])}, p99 {ms(summary['p99_ms'])}"
+        f" (평균 {summary['avg_latency_ms']:.0f}ms)",
+        f"- 프롬프트: 평균 {summary['avg_prompt_chars']:.0f}자, 최대 {summary['max_prompt_chars']}자",
+        f"- 토큰: 입력 {summary['prompt_tokens']}, 출력 {summary['output_tokens']}",
+        "호출 많은 채팅방",
+    ]
+    lines += [f"- {chat_id}: {n}회" for chat_id, n in summary["top_calls"]]
+    lines.append("프롬프트 큰 채팅방")
+    lines += [f"- {chat_id}: 평균 {avg}자 (최대 {mx}자)" for chat_id, avg, mx in summary["top_prompt"]]
+    if summary["routes"]:
+        lines.append("경로별 (routing)")
+        lines += [
+            f"- {r['route']} ({r['model']}): {r['calls']}회, 오류 {r['errors']}회, 평균 {r['avg_latency_ms']:.0f}ms,"
+            f" 프롬프트 평균 {r['avg_prompt_chars']:.0f}자, 토큰 입력 {r['prompt_tokens']}/출력 {r['output_tokens']}"
+            for r in summary["routes"]
+        ]
+    return "\n".join(lines)
+
+
 async def handle_command(
     msg: types.Message,
     bot: Bot,
@@ -195,47 +267,57 @@ async def handle_command(
     allowed_chat_ids: Set[int] | None = None,
 ) -> None:
     if not is_admin(msg.from_user.id if msg.from_user else None):
-        await msg.answer("이 명령은 관리자만 사용할 수 있어요.")
+        await outbound.answer(msg, "이 명령은 관리자만 사용할 수 있어요.")
         return
 
     command = (msg.text or "").split(maxsplit=1)[0].lower().lstrip("/")
 
     if command == "botstart":
-        if allowed_chat_ids is not None:
-            print(f"[info] {msg.chat.id} / {allowed_chat_ids}")
-        else:
-            print(f"[info] {msg.chat.id}")
-        await msg.answer("안녕하세요.")
+        log.info(
+            "/botstart",
+            extra={
+                "chat_id": msg.chat.id,
+                "allowed": msg.chat.id in allowed_chat_ids if allowed_chat_ids is not None else None,
+            },
+        )
+        await outbound.answer(msg, "안녕하세요.")
         return
 
     if command == "botset":
-        print(f'{msg.from_user.id}: {msg.text}')
         parts = (msg.text or "").split()
+        # 지침 본문 등이 로그에 남지 않도록 하위 명령까지만 기록
+        log.info(
+            "/botset %s",
+            " ".join(parts[1:3]),
+            extra={"chat_id": msg.chat.id, "user_id": msg.from_user.id if msg.from_user else None},
+        )
         chat_id = msg.chat.id
         user_id = msg.from_user.id if msg.from_user else None
         user_name = msg.from_user.username if msg.from_user else None
 
-        text = bot_settings(parts, chat_id, user_id, user_name)
+        text = await bot_settings(parts, chat_id, user_id, user_name, tenants.for_bot(bot).key)
         if text:
-            await msg.answer(text)
+            await outbound.answer(msg, text)
         return
 
     if command == "botpost":
         post_text = await post_idle.fetch_post_message(bot)
         if not post_text:
-            await msg.answer("지금은 포스트를 가져오지 못했어요. 잠시 후 다시 시도해 주세요!")
+            await outbound.answer(msg, "지금은 포스트를 가져오지 못했어요. 잠시 후 다시 시도해 주세요!")
             return
 
-        await msg.answer(post_text)
+        await outbound.answer(msg, post_text)
 
-        save_message(
+        tenant = tenants.for_bot(bot)
+        await store.asave_message(
             msg.chat.id,
             None,
-            BOT_NAME,
+            tenant.name,
             'bot',
             post_text,
-            int(time.time())
+            int(time.time()),
+            bot_key=tenant.key,
         )
         return
 
-    await msg.answer("사용할 수 있는 명령이 아니에요.")
+    await outbound.answer(msg, "사용할 수 있는 명령이 아니에요.")
@@ -17,10 +17,11 @@ def make_context_block(lines: List[str], max_chars:int)->str:
         buf.append(s); used += len(s) + 1
     return "\n".join(buf)
 
-def build_context_for_llm(chat_id:int, user_name:str, user_msg:str, budget_chars:int=3000)->str:
+def build_context_for_llm(chat_id:int, user_name:str, user_msg:str, budget_chars:int=3000, bot_key:str|None=None)->str:
     """
     [SYSTEM][MEMORY][RECAP][CHAT][USER] 순서로 조립한 최종 컨텍스트 반환.
     문자 기준 상한(budget_chars) 내에서 블록별 상한을 적용.
+    bot_key(Tenant.key)를 주면 [CHAT]에서 같은 방의 다른 봇 응답은 뺌.
     """
     # --- 설정: settings.py가 기대하는 형태와 동일 ---
     # get_context_config -> (win_minutes, limit, keep_per_chat, retain_days)
@@ -32,7 +33,7 @@ def build_context_for_llm(chat_id:int, user_name:str, user_msg:str, budget_chars
     guidelines_block = guidelines if guidelines else ""
 
     # --- CHAT: 최근창 ---
-    rows = store.get_recent_messages(chat_id, minutes=win, limit=lim)
+    rows = store.get_recent_messages(chat_id, minutes=win, limit=lim, bot_key=bot_key)
     chat_lines = utils.filter_and_compact(rows)
     chat_block = make_context_block(chat_lines, max_chars=int(budget_chars*0.6))
 
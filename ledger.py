@@ -0,0 +1,128 @@
+"""LLM 호출 한 건마다 원장 항목을 모아 배치로 기록하는 백그라운드 작업."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from contextlib import suppress
+from typing import Any, Dict, List, Optional
+
+import botlog
+import quota
+import store
+
+LEDGER_FLUSH_SECONDS = 5.0   # 이 주기마다 모인 항목을 기록
+LEDGER_BATCH_SIZE = 200      # 이만큼 쌓이면 주기를 기다리지 않고 기록
+LEDGER_MAX_BUFFER = 10_000   # 기록이 계속 실패할 때 메모리에 둘 최대 항목 수
+
+log = botlog.get_logger("ledger")
+
+
+class LedgerWriter:
+    """record()로 받은 항목을 버퍼에 모았다가 quota.write_llm_calls로 한 번에 씁니다."""
+
+    def __init__(self) -> None:
+        self._flush_interval = LEDGER_FLUSH_SECONDS
+        self._batch_size = LEDGER_BATCH_SIZE
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task[None]] = None
+        self.written = 0
+        self.dropped = 0
+
+    def start(self) -> Optional[asyncio.Task[None]]:
+        if self._task and not self._task.done():
+            return self._task
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run_loop(), name="llm-ledger")
+        return self._task
+
+    async def stop(self) -> None:
+        if not self._task:
+            return
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        await self.flush()
+
+    def record(
+        self,
+        chat_id: int,
+        *,
+        trigger: Optional[str],
+        model: Optional[str],
+        route: Optional[str] = None,
+        prompt_chars: int,
+        prompt_tokens: Optional[int],
+        output_tokens: Optional[int],
+        latency_ms: float,
+        finish_reason: Optional[str],
+        error: Optional[str],
+    ) -> None:
+        entry = {
+            "ts": int(time.time()),
+            "chat_id": chat_id,
+            "trigger": trigger,
+            "route": route,
+            "model": model,
+            "prompt_chars": int(prompt_chars),
+            "prompt_tokens": prompt_tokens,
+            "output_tokens": output_tokens,
+            "latency_ms": int(latency_ms),
+            "finish_reason": finish_reason,
+            "error": error,
+        }
+        with self._lock:
+            if len(self._buffer) >= LEDGER_MAX_BUFFER:
+                self.dropped += 1
+                return
+            self._buffer.append(entry)
+            full = len(self._buffer) >= self._batch_size
+        if full and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return 0
+        try:
+            await store.run_write(quota.write_llm_calls, batch)
+        except Exception:
+            with self._lock:  # 다음 주기에 다시 시도
+                self._buffer[:0] = batch
+            raise
+        self.written += len(batch)
+        return len(batch)
+
+    async def _run_loop(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._flush_interval)
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # pragma: no cover - 예방적 로그
+                log.warning("기록 실패: %r", exc)
+
+
+_writer: Optional[LedgerWriter] = None
+
+
+def start_ledger_task() -> LedgerWriter:
+    global _writer
+    _writer = LedgerWriter()
+    _writer.start()
+    return _writer
+
+
+def record_call(chat_id: int, **fields: Any) -> None:
+    """원장 작업이 실행 중일 때만 항목을 남깁니다 (스크립트의 동기 호출은 기록하지 않음)."""
+    if _writer is not None:
+        _writer.record(chat_id, **fields)
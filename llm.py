@@ -1,14 +1,39 @@
+from __future__ import annotations
+
+import asyncio
 import os
-from functools import lru_cache
-from google import genai
-from google.genai import types, errors
+import time
+from functools import lru_cache, partial
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
 
+import botlog
+import ledger
+import metrics
+import resilience
+import routing
+import store
 from context_builder import build_context_for_llm
 from persona import bot_instruction
-from quota import _check_quota_or_msg, add_usage, _estimate_output_tokens_from_config
+from quota import quota_headroom, release_usage, reserve_quota_or_msg, usage_day
+
+if TYPE_CHECKING:  # google-genai는 import에 1초 가까이 걸려 첫 LLM 호출 때 불러옵니다.
+    from google import genai
+    from google.genai import types
+
+log = botlog.get_logger("llm")
 
 # LLM 설정
 MODEL_NAME = "gemini-2.5-flash"
+ROUTES = routing.build_routes(MODEL_NAME)  # 응답마다 고르는 (full, light, lean) 경로
+
+# 재시도·헤지·서킷 브레이커 (resilience.py)
+LLM_REPLY_DEADLINE_SECONDS = 25.0   # main.py는 30초가 넘으면 시간 초과로 답하므로 그 전에 끝냄
+LLM_MAX_ATTEMPTS = 3
+LLM_BACKOFF_BASE_SECONDS = 0.5
+LLM_BACKOFF_CAP_SECONDS = 4.0
+LLM_MIN_ATTEMPT_SECONDS = 2.0       # 남은 시간이 이보다 짧으면 새 요청을 보내지 않음
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0").strip().lower() in ("1", "true", "yes")
+LLM_HEDGE_MIN_SECONDS = 1.0         # p95가 이보다 짧아도 이만큼은 기다린 뒤 헤지
 
 _config_kwargs = dict(
     temperature=0.9,
@@ -17,10 +42,34 @@ _config_kwargs = dict(
     top_k=40,
     stop_sequences=["User:"],
     system_instruction=bot_instruction,
-    thinking_config=types.ThinkingConfig(thinking_budget=0),
 )
 
-CONFIG = genai.types.GenerateContentConfig(**_config_kwargs)
+
+@lru_cache(maxsize=1)
+def _base_config() -> types.GenerateContentConfig:
+    """기본 생성 설정. 처음 필요할 때 google.genai.types를 불러와 만듭니다."""
+    from google.genai import types
+
+    return types.GenerateContentConfig(**_config_kwargs, thinking_config=types.ThinkingConfig(thinking_budget=0))
+
+
+def __getattr__(name: str) -> Any:
+    # 예전처럼 llm.CONFIG로도 쓸 수 있게 둡니다 (접근하는 순간 genai를 불러옴).
+    if name == "CONFIG":
+        return _base_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@lru_cache(maxsize=32)
+def _config_for(instruction: str | None, max_output_tokens: int | None = None) -> types.GenerateContentConfig:
+    """봇(페르소나)의 system_instruction과 경로의 출력 길이만 다른 설정. 같은 조합이면 같은 객체를 재사용합니다."""
+    config = _base_config()
+    update: Dict[str, Any] = {}
+    if instruction is not None and instruction != bot_instruction:
+        update["system_instruction"] = instruction
+    if max_output_tokens is not None and max_output_tokens != config.max_output_tokens:
+        update["max_output_tokens"] = max_output_tokens
+    return config.model_copy(update=update) if update else config
 
 # LLM 클라이언트 (genai.Client) 캐싱
 @lru_cache(maxsize=1)
@@ -30,50 +79,157 @@ def _get_client() -> genai.Client:
         raise RuntimeError(
             "환경변수 GEMINI_API_KEY가 설정되어 있지 않습니다. .env 파일 또는 시스템 환경변수에 키를 등록해주세요."
         )
+    from google import genai
+
     return genai.Client(api_key=api_key)
 
 
-def generate_genai(chat_id: int, user_name: str, user_msg: str) -> str:
-    prompt = build_context_for_llm(
-        chat_id=chat_id,
-        user_name=user_name,
-        user_msg=user_msg,
-        budget_chars=2000,
+def _probe(model: str) -> None:
+    """그 모델의 서킷 브레이커가 열렸을 때 회복을 확인하는 가장 작은 요청 (실패하면 예외)."""
+    from google.genai import types
+
+    config = _base_config().model_copy(
+        update={"max_output_tokens": 1, "system_instruction": None, "http_options": types.HttpOptions(timeout=10_000)}
     )
+    _get_client().models.generate_content(model=model, contents="ping", config=config)
 
-    # [가드] 호출 전 한도 검사
 
-    limit_msg = _check_quota_or_msg(chat_id, input_chars=len(prompt), config=CONFIG)
-    if limit_msg:
-        return limit_msg
-    
-    # [호출] LLM API 호출
+_breakers: Dict[str, resilience.CircuitBreaker] = {}
+_latency: Dict[str, resilience.LatencyWindow] = {}
+
+
+def breaker(model: str) -> resilience.CircuitBreaker:
+    """모델별 서킷 브레이커. 한 모델의 장애가 다른 경로의 호출까지 막지 않게 따로 둡니다."""
+    cb = _breakers.get(model)
+    if cb is None:
+        cb = _breakers.setdefault(model, resilience.CircuitBreaker(f"gemini:{model}", probe=partial(_probe, model)))
+    return cb
+
+
+BREAKER = breaker(MODEL_NAME)  # 기본 모델의 브레이커 (예전 이름)
+
+
+def model_latency(model: str) -> resilience.LatencyWindow:
+    """모델별 최근 성공 지연. 헤지 기준과 라우팅의 지연 조건에 씁니다."""
+    window = _latency.get(model)
+    if window is None:
+        window = _latency.setdefault(model, resilience.LatencyWindow())
+    return window
+
+
+def start_breaker_probes() -> List[resilience.CircuitBreaker]:
+    """경로에 쓰이는 모델마다 브레이커의 회복 확인 태스크를 시작합니다."""
+    breakers = [breaker(model) for model in dict.fromkeys(route.model for route in ROUTES)]
+    for cb in breakers:
+        cb.start()
+    return breakers
+
+
+def warm_up() -> None:
+    """google-genai를 불러와 설정과 클라이언트를 만들어 둡니다 (시작 직후 백그라운드 스레드에서)."""
+    _config_for(None)
+    _get_client()
+
+
+def _build_prompt(
+    chat_id: int, user_name: str, user_msg: str, budget_chars: int = 2000, bot_key: str | None = None
+) -> str:
+    with metrics.CONTEXT_SECONDS.time():
+        prompt = build_context_for_llm(
+            chat_id=chat_id,
+            user_name=user_name,
+            user_msg=user_msg,
+            budget_chars=budget_chars,
+            bot_key=bot_key,
+        )
+    metrics.PROMPT_CHARS.observe(len(prompt))
+    return prompt
+
+
+def _route_and_prompt(
+    chat_id: int, user_name: str, user_msg: str, trigger: str | None, bot_key: str | None = None
+) -> Tuple[routing.Route, str, str]:
+    """한도 여유와 기본 모델의 최근 지연으로 경로를 고르고 그 컨텍스트 예산으로 프롬프트를 만듭니다 (읽기 스레드)."""
+    headroom = quota_headroom(chat_id) if routing.LLM_ROUTING else None
+    route, reason = routing.choose(ROUTES, trigger, headroom, model_latency(MODEL_NAME).percentile(95))
+    return route, reason, _build_prompt(chat_id, user_name, user_msg, route.budget_chars, bot_key)
+
+
+def _invoke_model(
+    prompt: str,
+    config: types.GenerateContentConfig | None = None,
+    timeout: float | None = None,
+    model: str = MODEL_NAME,
+) -> Tuple[Any | None, BaseException | None, float]:
+    """LLM API를 한 번 호출하고 (응답 또는 None, 예외, 지연 초)를 반환합니다.
+
+    timeout을 주면 HTTP 요청 자체에 그 시간 제한을 걸어, 스레드가 응답 기한을 넘겨 붙잡히지 않게 합니다.
+    """
+    from google.genai import errors, types
 
     client = _get_client()
-    
+    config = config or _base_config()
+    if timeout is not None:
+        config = config.model_copy(update={"http_options": types.HttpOptions(timeout=max(1000, int(timeout * 1000)))})
+
+    started = time.perf_counter()
     try:
         response = client.models.generate_content(
-            model=MODEL_NAME,
+            model=model,
             contents=prompt,
-            config=CONFIG,
+            config=config,
         )
+        elapsed = time.perf_counter() - started
+        metrics.LLM_SECONDS.observe(elapsed, outcome="ok")
+        model_latency(model).add(elapsed)
+        breaker(model).record_success()
+        return response, None, elapsed
     except errors.ServerError as exc:
-        print(f"[llm] ServerError: {exc}")
-        return "조금 뒤에 다시 부탁해 주세요."
-    except errors.GoogleAPIError as exc:  # includes ClientError, PermissionDenied 등
-        print(f"[llm] GoogleAPIError: {exc}")
-        return "조금 뒤에 다시 부탁해 주세요."
+        log.warning("ServerError: %s", exc)
+        error = exc
+    except errors.APIError as exc:  # includes ClientError, PermissionDenied 등
+        log.warning("APIError: %s", exc)
+        error = exc
     except Exception as exc:  # defensive catch-all so bot stays alive
-        print(f"[llm] Unexpected error: {exc}")
-        return "조금 뒤에 다시 부탁해 주세요."
+        log.error("Unexpected error: %r", exc)
+        error = exc
+    elapsed = time.perf_counter() - started
+    metrics.LLM_SECONDS.observe(elapsed, outcome="error")
+    metrics.LLM_ERRORS.inc(error=type(error).__name__)
+    if resilience.is_transient(error):
+        breaker(model).record_failure()
+    else:  # 400 등은 요청 문제일 뿐이라 브레이커 상태를 바꾸지 않음
+        breaker(model).record_inconclusive()
+    return None, error, elapsed
 
-    # [기록] 호출 후 사용량 누적
-    add_usage(chat_id, input_chars=len(prompt), output_tokens=_estimate_output_tokens_from_config(CONFIG))
 
-    # [파싱] 응답 파싱 및 반환
-    if hasattr(response, "text"):
-        print(f"LLM response: {response.text}")
+def _call_model(prompt: str) -> Any | None:
+    """LLM API를 호출합니다. 실패하거나 서킷 브레이커가 열려 있으면 None을 반환합니다."""
+    if not BREAKER.allow():
+        metrics.LLM_SHORT_CIRCUITS.inc()
+        return None
+    return _invoke_model(prompt)[0]
 
+
+def _usage_tokens(response: Any) -> Tuple[int | None, int | None]:
+    """응답의 usage_metadata에서 (프롬프트 토큰, 출력 토큰)을 꺼냅니다. 없으면 None."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return None, None
+    return getattr(usage, "prompt_token_count", None), getattr(usage, "candidates_token_count", None)
+
+
+def _finish_reason(response: Any) -> str | None:
+    candidates = getattr(response, "candidates", None) or []
+    if not candidates:
+        return None
+    reason = getattr(candidates[0], "finish_reason", None)
+    if reason is None:
+        return None
+    return getattr(reason, "name", None) or str(reason)
+
+
+def _parse_response(response: Any) -> str:
     candidates = getattr(response, "candidates", None) or []
     if candidates:
         candidate = candidates[0]
@@ -88,4 +244,223 @@ def generate_genai(chat_id: int, user_name: str, user_msg: str) -> str:
         if text:
             return text
 
-    return "통신 상태가 불안정해요. 조금 뒤에 다시 부탁해 주세요." 
\ No newline at end of file
+    return "통신 상태가 불안정해요. 조금 뒤에 다시 부탁해 주세요."
+
+
+def generate_genai(chat_id: int, user_name: str, user_msg: str) -> str:
+    """동기 버전 (스크립트 전용). 봇 핸들러에서는 agenerate_genai를 사용하세요.
+
+    기본 경로로 한 번만 호출합니다. 라우팅·재시도·헤지가 없고 호출 원장(ledger)에도 남지 않으며,
+    서킷 브레이커와 사용량 한도(예약/취소)만 봇과 같이 적용됩니다.
+    """
+    prompt = _build_prompt(chat_id, user_name, user_msg)
+
+    # [가드] 호출 전 한도 검사와 사용량 예약
+    config = _base_config()
+    day = usage_day()
+    limit_msg = reserve_quota_or_msg(chat_id, input_chars=len(prompt), config=config, day=day)
+    if limit_msg:
+        metrics.QUOTA_REJECTIONS.inc()
+        return limit_msg
+
+    # [호출] LLM API 호출
+    response = _call_model(prompt)
+    if response is None:
+        release_usage(chat_id, input_chars=len(prompt), config=config, day=day)
+        return "조금 뒤에 다시 부탁해 주세요."
+    log.info("LLM 응답: %s", botlog.redact(getattr(response, "text", None)), extra={"chat_id": chat_id, "sampled": True})
+
+    # [파싱] 응답 파싱 및 반환
+    return _parse_response(response)
+
+
+# 헤지에서 진 요청: 끝날 때 원장에 기록되도록 참조를 잡아 둡니다.
+_stragglers: Set["asyncio.Future[Any]"] = set()
+
+
+async def _attempt(
+    chat_id: int, trigger: str | None, route: routing.Route, prompt: str, config: Any, timeout: float
+) -> Tuple[Any | None, BaseException | None, float]:
+    """API 요청 한 건. 재시도·헤지로 보낸 요청도 각각 원장에 한 줄씩 남깁니다."""
+    response, error, elapsed = await asyncio.to_thread(_invoke_model, prompt, config, timeout, route.model)
+    prompt_tokens, output_tokens = _usage_tokens(response) if response is not None else (None, None)
+    ledger.record_call(
+        chat_id,
+        trigger=trigger,
+        route=route.name,
+        model=route.model,
+        prompt_chars=len(prompt),
+        prompt_tokens=prompt_tokens,
+        output_tokens=output_tokens,
+        latency_ms=elapsed * 1000,
+        finish_reason=_finish_reason(response) if response is not None else None,
+        error=type(error).__name__ if error is not None else None,
+    )
+    return response, error, elapsed
+
+
+def _hedge_delay(model: str, timeout: float) -> Optional[float]:
+    """헤지 요청을 보낼 시점(초). 꺼져 있거나 표본이 모자라거나 기한 안에 못 끝낼 것 같으면 None."""
+    if not LLM_HEDGE:
+        return None
+    p95 = model_latency(model).percentile(95)
+    if p95 is None:
+        return None
+    delay = max(LLM_HEDGE_MIN_SECONDS, p95)
+    return delay if timeout - delay >= LLM_MIN_ATTEMPT_SECONDS else None
+
+
+async def _hedged_attempt(
+    chat_id: int,
+    trigger: str | None,
+    route: routing.Route,
+    prompt: str,
+    config: Any,
+    timeout: float,
+    reserve: Callable[[], Awaitable[bool]] | None = None,
+) -> Tuple[Any | None, BaseException | None]:
+    """요청을 보내고, 최근 p95보다 오래 걸리면 같은 요청을 하나 더 보내 먼저 성공한 응답을 씁니다.
+
+    reserve가 있으면 두 번째 요청 전에 한도를 한 번 더 예약하고, 거절되면 헤지하지 않습니다.
+    """
+    first = asyncio.ensure_future(_attempt(chat_id, trigger, route, prompt, config, timeout))
+    hedge_after = _hedge_delay(route.model, timeout)
+    if hedge_after is None:
+        response, error, _elapsed = await first
+        return response, error
+    done, _pending = await asyncio.wait({first}, timeout=hedge_after)
+    if done:
+        response, error, _elapsed = first.result()
+        return response, error
+
+    if reserve is not None and not await reserve():
+        response, error, _elapsed = await first
+        return response, error
+    metrics.LLM_HEDGES.inc()
+    second = asyncio.ensure_future(_attempt(chat_id, trigger, route, prompt, config, timeout - hedge_after))
+    pending = {first, second}
+    error: BaseException | None = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            response, error, _elapsed = task.result()
+            if response is not None:
+                for loser in pending:
+                    _stragglers.add(loser)
+                    loser.add_done_callback(_stragglers.discard)
+                return response, None
+    return None, error
+
+
+async def _generate_resilient(
+    chat_id: int,
+    trigger: str | None,
+    route: routing.Route,
+    prompt: str,
+    config: Any,
+    reserve: Callable[[], Awaitable[bool]] | None = None,
+) -> Tuple[Any | None, BaseException | None, float, int]:
+    """응답 기한(LLM_REPLY_DEADLINE_SECONDS) 안에서 일시적 오류를 지터 백오프로 재시도합니다.
+
+    (응답 또는 None, 마지막 예외, 총 소요 초, 보낸 요청 차례 수)를 반환합니다.
+    경로 모델의 서킷 브레이커가 열려 있으면 요청 없이 바로 CircuitOpenError로 끝납니다.
+    첫 요청의 한도는 호출한 쪽이 예약해 두고, 재시도·헤지로 요청을 더 보낼 때마다 reserve()로
+    한 번 더 예약합니다. 거절되면 더 보내지 않습니다.
+    """
+    started = time.perf_counter()
+    deadline = started + LLM_REPLY_DEADLINE_SECONDS
+    error: BaseException | None = None
+    attempts = 0
+    cb = breaker(route.model)
+    while True:
+        if not cb.allow():
+            metrics.LLM_SHORT_CIRCUITS.inc()
+            error = error or resilience.CircuitOpenError(f"{cb.name} circuit is {cb.state}")
+            break
+        attempts += 1
+        response, error = await _hedged_attempt(
+            chat_id, trigger, route, prompt, config, deadline - time.perf_counter(), reserve
+        )
+        if response is not None:
+            return response, None, time.perf_counter() - started, attempts
+        if attempts >= LLM_MAX_ATTEMPTS or not resilience.is_transient(error):
+            break
+        delay = resilience.backoff_delay(attempts, LLM_BACKOFF_BASE_SECONDS, LLM_BACKOFF_CAP_SECONDS)
+        if deadline - time.perf_counter() - delay < LLM_MIN_ATTEMPT_SECONDS:
+            break
+        await asyncio.sleep(delay)
+        if reserve is not None and not await reserve():
+            break
+        metrics.LLM_RETRIES.inc(error=type(error).__name__)
+    return None, error, time.perf_counter() - started, attempts
+
+
+async def agenerate_genai(
+    chat_id: int,
+    user_name: str,
+    user_msg: str,
+    trigger: str | None = None,
+    instruction: str | None = None,
+    bot_key: str | None = None,
+) -> str:
+    """generate_genai와 같은 흐름이지만 DB는 store 스레드 풀, API 호출은 별도 스레드에서 실행합니다.
+
+    모델·출력 길이·컨텍스트 예산은 routing.choose가 트리거, 한도 여유, 기본 모델의 최근 지연으로 고릅니다.
+    API 호출은 _generate_resilient가 응답 기한 안에서 재시도·헤지하고, 서킷 브레이커가 열려 있으면 바로 실패합니다.
+
+    trigger는 응답을 부른 트리거 종류(mention/reply/keyword/idle)로, 호출 원장에 함께 남습니다.
+    instruction을 주면 persona.bot_instruction 대신 그 지침(봇별 페르소나)으로 호출합니다.
+    bot_key(Tenant.key)를 주면 컨텍스트에서 같은 채팅방의 다른 봇 응답을 뺍니다.
+    """
+    route, reason, prompt = await store.run_read(
+        _route_and_prompt, chat_id, user_name, user_msg, trigger, bot_key
+    )
+    metrics.LLM_ROUTES.inc(route=route.name, reason=reason)
+    config = _config_for(instruction, route.max_output_tokens)
+
+    day = usage_day()  # 응답을 기다리는 사이 자정이 지나도 예약한 날에서 되돌리도록
+    limit_msg = await store.run_write(reserve_quota_or_msg, chat_id, input_chars=len(prompt), config=config, day=day)
+    if limit_msg:
+        metrics.QUOTA_REJECTIONS.inc()
+        return limit_msg
+
+    reserved = 1
+
+    async def reserve_extra() -> bool:
+        # 재시도·헤지 요청도 입력·출력 토큰을 쓰므로 보낼 때마다 한도를 다시 확인하고 예약합니다.
+        nonlocal reserved
+        if await store.run_write(reserve_quota_or_msg, chat_id, input_chars=len(prompt), config=config, day=day):
+            return False
+        reserved += 1
+        return True
+
+    response, error, elapsed, attempts = await _generate_resilient(
+        chat_id, trigger, route, prompt, config, reserve_extra
+    )
+    metrics.LLM_ROUTE_SECONDS.observe(elapsed, route=route.name)
+    log.info(
+        "LLM 응답: %s",
+        botlog.redact(getattr(response, "text", None)) if response is not None else "-",
+        extra={
+            "chat_id": chat_id,
+            "trigger": trigger,
+            "route": route.name,
+            "route_reason": reason,
+            "model": route.model,
+            "latency_ms": int(elapsed * 1000),
+            "attempts": attempts,
+            "reserved": reserved,
+            "error": type(error).__name__ if error is not None else None,
+            "sampled": True,
+        },
+    )
+    if response is None:
+        await store.run_write(_release_reserved, chat_id, len(prompt), config, day, reserved)
+        return "조금 뒤에 다시 부탁해 주세요."
+    return _parse_response(response)
+
+
+def _release_reserved(chat_id: int, input_chars: int, config: Any, day: str, count: int) -> None:
+    """응답을 못 받았을 때 재시도·헤지분까지 예약한 한도를 모두 되돌립니다 (writer 스레드에서 한 번에)."""
+    for _ in range(count):
+        release_usage(chat_id, input_chars=input_chars, config=config, day=day)
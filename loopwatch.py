@@ -0,0 +1,188 @@
+"""asyncio 이벤트 루프 지연 감시와 블로킹 지점 스택 수집.
+
+루프 안의 태스크가 주기적으로 심장박동을 남기고, 별도 스레드가 박동이 임계값 이상 끊기면
+sys._current_frames()로 루프 스레드의 스택을 떠 둡니다. 루프가 다시 돌면 멈춘 시간을 그 지점에
+합산해, 가장 오래 루프를 막은 코드 위치를 로그와 /botset loop 명령으로 보여 줍니다.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from contextlib import suppress
+from typing import Dict, List, Optional, Tuple
+
+import botlog
+import metrics
+
+LOOP_LAG_INTERVAL_SECONDS = 0.05
+LOOP_LAG_THRESHOLD_SECONDS = max(0.01, float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100") or 100) / 1000)
+LOOP_LAG_LOG_INTERVAL_SECONDS = 60.0  # 같은 지점은 이 간격에 한 번만 로그
+LOOP_LAG_STACK_DEPTH = 6
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+log = botlog.get_logger("loop")
+
+LOOP_LAG_SECONDS = metrics.histogram("event_loop_lag_seconds", "이벤트 루프가 예정보다 늦게 깨어난 시간")
+LOOP_BLOCKED = metrics.counter("event_loop_blocked_total", "임계값 이상 루프를 막은 횟수 (코드 위치별)", ("site",))
+
+
+def _is_app_frame(filename: str) -> bool:
+    return filename.startswith(_APP_DIR) and os.path.basename(filename) != "loopwatch.py"
+
+
+def _describe_stack(frame) -> Tuple[str, List[str]]:
+    """스택에서 가장 안쪽의 앱 코드 위치와, 표시용 프레임 목록(바깥→안쪽)을 만듭니다."""
+    entries = traceback.extract_stack(frame)
+    app = [e for e in entries if _is_app_frame(e.filename)]
+    if app:
+        site_entry = app[-1]
+    elif entries:
+        site_entry = entries[-1]
+    else:
+        return "unknown", []
+    site = f"{os.path.basename(site_entry.filename)}:{site_entry.lineno} {site_entry.name}"
+    lines = [f"{os.path.basename(e.filename)}:{e.lineno} {e.name}" for e in entries[-LOOP_LAG_STACK_DEPTH:]]
+    return site, lines
+
+
+class _Offender:
+    __slots__ = ("count", "total", "worst", "stack", "last_logged")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self.stack: List[str] = []
+        self.last_logged = 0.0
+
+
+class LoopLagWatchdog:
+    """루프 지연을 계속 재고, 임계값을 넘는 블로킹의 스택을 위치별로 모읍니다."""
+
+    def __init__(self) -> None:
+        self._interval = LOOP_LAG_INTERVAL_SECONDS
+        self._threshold = LOOP_LAG_THRESHOLD_SECONDS
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._pending: Optional[Tuple[float, Tuple[str, List[str]]]] = None  # (멈춘 박동, 스택)
+        self._pending_lock = threading.Lock()
+        self._offenders: Dict[str, _Offender] = {}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._task: Optional[asyncio.Task[None]] = None
+        self.max_lag = 0.0
+        self.samples = 0
+
+    def start(self) -> Optional[asyncio.Task[None]]:
+        if self._task and not self._task.done():
+            return self._task
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run_sidecar, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        self._task = asyncio.create_task(self._run_loop(), name="loop-watchdog")
+        return self._task
+
+    async def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+        if not self._task:
+            return
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def _run_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self._interval
+            await asyncio.sleep(self._interval)
+            lag = max(0.0, loop.time() - expected)
+            last_beat, self._heartbeat = self._heartbeat, time.monotonic()
+            self.samples += 1
+            self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG_SECONDS.observe(lag)
+            if lag >= self._threshold:
+                self._record_block(lag, last_beat)
+
+    def _run_sidecar(self) -> None:
+        # 박동이 임계값 이상 끊긴 동안 한 번만 스택을 뜹니다.
+        captured_for: Optional[float] = None
+        while not self._stop_event.wait(self._interval / 2):
+            beat = self._heartbeat
+            if time.monotonic() - beat < self._threshold + self._interval or captured_for == beat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id or 0)
+            if frame is None:
+                continue
+            described = _describe_stack(frame)
+            del frame
+            with self._pending_lock:
+                self._pending = (beat, described)
+            captured_for = beat
+
+    def _record_block(self, lag: float, last_beat: float) -> None:
+        with self._pending_lock:
+            pending, self._pending = self._pending, None
+        # 사이드카가 보기 전에 끝난 짧은 블로킹은 위치를 모릅니다.
+        if pending and pending[0] == last_beat:
+            site, stack = pending[1]
+        else:
+            site, stack = "(위치 미확인)", []
+        offender = self._offenders.get(site)
+        if offender is None:
+            offender = self._offenders[site] = _Offender()
+        offender.count += 1
+        offender.total += lag
+        offender.worst = max(offender.worst, lag)
+        if stack:
+            offender.stack = stack
+        LOOP_BLOCKED.inc(site=site)
+
+        now = time.monotonic()
+        if now - offender.last_logged >= LOOP_LAG_LOG_INTERVAL_SECONDS:
+            offender.last_logged = now
+            where = " ← ".join(reversed(stack[-3:])) if stack else site
+            log.warning("이벤트 루프가 %.0fms 막혔어요: %s", lag * 1000, where, extra={"site": site})
+
+    def top(self, n: int = 5) -> List[Tuple[str, int, float, float, List[str]]]:
+        """누적 지연이 큰 순서로 (위치, 횟수, 누적 초, 최대 초, 스택)을 반환합니다."""
+        ranked = sorted(self._offenders.items(), key=lambda kv: kv[1].total, reverse=True)
+        return [(site, o.count, o.total, o.worst, list(o.stack)) for site, o in ranked[:n]]
+
+    def report(self, n: int = 5) -> str:
+        lines = [
+            f"이벤트 루프 지연 (임계 {self._threshold * 1000:.0f}ms, 최대 {self.max_lag * 1000:.0f}ms, 표본 {self.samples})"
+        ]
+        offenders = self.top(n)
+        if not offenders:
+            lines.append("- 임계값을 넘은 블로킹이 없어요.")
+        for site, count, total, worst, stack in offenders:
+            lines.append(f"- {site}: {count}회, 누적 {total * 1000:.0f}ms, 최대 {worst * 1000:.0f}ms")
+            if stack:
+                lines.append("  " + " ← ".join(reversed(stack[-3:])))
+        return "\n".join(lines)
+
+
+_watchdog: Optional[LoopLagWatchdog] = None
+
+
+def start_loop_watchdog() -> LoopLagWatchdog:
+    global _watchdog
+    _watchdog = LoopLagWatchdog()
+    _watchdog.start()
+    return _watchdog
+
+
+def get_watchdog() -> Optional[LoopLagWatchdog]:
+    return _watchdog
@@ -1,4 +1,5 @@
 print("Initializing bot...")
+import asyncio
 import os
 import random
 import time
@@ -12,23 +13,43 @@ from aiogram.enums import ParseMode
 from aiogram.filters import Command
 from dotenv import load_dotenv
 print("Loading modules...")
+import startup  # 프로세스 시작 시각 기준으로 단계별 시작 시간을 잽니다.
+import botlog
 import commands
+import ledger
 import llm
+import loopwatch
+import metrics
+import outbound
 import post_idle
+import quota
+import recorder
+import retention
+import shutdown
+import supervisor
+import tenants
+import warmstate
+import webhook
 from chat_filters import ChatAllowed, parse_ids_from_env
-from store import init_db, save_message
+import store
+from store import init_db
 from setenv import ensure_env_file
 from persona import bot_name, bot_sign
 
+log = botlog.get_logger("bot")
+
 ### 기본 설정
 
+startup.mark("imports")
+
 print("Loading environment variables...")
 ensure_env_file()
 init_db()
+startup.mark("init_db")
 load_dotenv(BASE_DIR / ".env")
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
-if not TELEGRAM_BOT_TOKEN:
+if not TELEGRAM_BOT_TOKEN and not tenants.BOTS_CONFIG:
     raise RuntimeError("환경변수 TELEGRAM_BOT_TOKEN이 설정되어 있지 않습니다. .env 파일을 확인하세요.")
 
 BOT_NAME = bot_name
@@ -41,7 +62,7 @@ def _parse_idle_reply_probability(env_name: str = "BOT_IDLE_REPLY_PROB") -> floa
     try:
         value = float(raw)
     except ValueError:
-        print(f"[warn] {env_name} 값이 올바르지 않아요: {raw!r}. 0으로 처리할게요.")
+        log.warning("%s 값이 올바르지 않아요: %r. 0으로 처리할게요.", env_name, raw)
         return 0.0
     return max(0.0, min(1.0, value))
 
@@ -64,7 +85,7 @@ def _parse_admin_ids(raw: str | None) -> set[int]:
         try:
             admin_ids.add(int(chunk))
         except ValueError:
-            print(f"[warning] TELEGRAM_ADMIN_IDS에 잘못된 값이 있어요: {chunk}")
+            log.warning("TELEGRAM_ADMIN_IDS에 잘못된 값이 있어요: %s", chunk)
     return admin_ids
 
 
@@ -72,28 +93,39 @@ ADMIN_IDS = _parse_admin_ids(os.getenv("TELEGRAM_ADMIN_IDS"))
 
 
 
-def is_admin(user_id: int | None) -> bool:
-    """TELEGRAM_ADMIN_IDS가 비어 있으면 모든 사용자 허용."""
-    if not ADMIN_IDS:
-        return True
-    return user_id is not None and user_id in ADMIN_IDS
-
+### 봇 인스턴스
 
+# BOTS_CONFIG가 없으면 위의 .env 값으로 만든 봇 하나만 돌립니다.
+TENANTS = tenants.load_tenants(
+    tenants.Tenant(
+        "default",
+        TELEGRAM_BOT_TOKEN or "",
+        name=BOT_NAME,
+        sign=CALL_KEYWORDS,
+        allowed_chat_ids=ALLOWED_CHAT_IDS,
+        admin_ids=ADMIN_IDS,
+        idle_reply_prob=IDLE_REPLY_PROBABILITY,
+    )
+)
 
-### 봇 인스턴스
 print("Bot instance creation...")
-bot = Bot(
-    token=TELEGRAM_BOT_TOKEN,
-    default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-)
+bots = tenants.create_bots(TENANTS, DefaultBotProperties(parse_mode=ParseMode.HTML))
+bot = bots[0]
 dp = Dispatcher()
+dp.update.outer_middleware(metrics.update_middleware)
+dp.update.outer_middleware(startup.first_update_middleware)
+dp.update.outer_middleware(shutdown.get_tracker().middleware)
+bot.session.middleware(startup.first_poll_middleware)
+startup.mark("bots")
 print("Starting bot!")
 
 
 ### 채팅방 필터링
 
 router = Router()
-chat_filter = ChatAllowed(ALLOWED_CHAT_IDS, notify=True, notice="허용되지 않은 채팅방이에요.")
+chat_filter = ChatAllowed(
+    allowed_for=lambda b: tenants.for_bot(b).allowed_chat_ids, notify=True, notice="허용되지 않은 채팅방이에요."
+)
 router.message.filter(chat_filter)
 router.callback_query.filter(chat_filter)
 router.chat_member.filter(chat_filter)
@@ -106,13 +138,14 @@ dp.include_router(router)
 command_list = ["botstart", "botset", "botpost"]
 
 @router.message(Command(commands=command_list))
-async def handle_commands(msg: types.Message):
+async def handle_commands(msg: types.Message, bot: Bot):
     """Delegate command handling to the commands module."""
+    tenant = tenants.for_bot(bot)
     await commands.handle_command(
         msg=msg,
         bot=bot,
-        is_admin=is_admin,
-        allowed_chat_ids=ALLOWED_CHAT_IDS,
+        is_admin=tenant.is_admin,
+        allowed_chat_ids=tenant.allowed_chat_ids,
     )
 
 
@@ -120,8 +153,14 @@ async def handle_commands(msg: types.Message):
 ### 일반 메시지 처리
 
 @router.message()
-async def on_message(msg: types.Message):
-    print(f"{msg.from_user.username}: {msg.text}")
+async def on_message(msg: types.Message, bot: Bot):
+    tenant = tenants.for_bot(bot)
+    log.info(
+        "%s: %s",
+        msg.from_user.username,
+        botlog.redact(msg.text),
+        extra={"chat_id": msg.chat.id, "user_id": msg.from_user.id, "bot": tenant.key, "sampled": True},
+    )
 
     if msg.text and msg.text.startswith("/"):
         return
@@ -134,40 +173,52 @@ async def on_message(msg: types.Message):
         question = msg.text
 
     if msg.text:
-        save_message(
+        # 그룹은 message_id로 다른 봇과 중복 저장을 피하고, 개인 채팅은 봇마다 id를 따로 매기므로 봇 key로 구분
+        private = msg.chat.type == "private"
+        await store.asave_message(
             msg.chat.id,
             msg.from_user.id,
             msg.from_user.username,
             'user',
             question,
-            int(time.time())
+            int(time.time()),
+            message_id=None if private else msg.message_id,
+            bot_key=tenant.key if private else None,
         )
 
-    # 응답 트리거 체크
+    # 응답 트리거 체크 (먼저 맞는 종류로 기록)
 
-    triggered = False
+    trigger = None
     if msg.text and f"@{me.username}" in msg.text:
-        triggered = True
-    if msg.reply_to_message and msg.reply_to_message.from_user and msg.reply_to_message.from_user.id == me.id:
-        triggered = True
-    if msg.text and any(keyword in msg.text for keyword in CALL_KEYWORDS):
-        triggered = True
-    if not triggered and question and IDLE_REPLY_PROBABILITY > 0:
+        trigger = "mention"
+    elif msg.reply_to_message and msg.reply_to_message.from_user and msg.reply_to_message.from_user.id == me.id:
+        trigger = "reply"
+    elif msg.text and any(keyword in msg.text for keyword in tenant.sign):
+        trigger = "keyword"
+    elif question and tenant.idle_reply_prob > 0:
         roll = random.random()
-        if roll < IDLE_REPLY_PROBABILITY:
-            triggered = True
-            print(f"[bot] idle trigger fired (p={IDLE_REPLY_PROBABILITY}, roll={roll:.3f})")
-    if not triggered:
+        if roll < tenant.idle_reply_prob:
+            trigger = "idle"
+            log.info(
+                "idle trigger fired",
+                extra={"chat_id": msg.chat.id, "p": tenant.idle_reply_prob, "roll": round(roll, 3)},
+            )
+    if not trigger:
         return
+    metrics.TRIGGERS.inc(trigger=trigger)
+    warmstate.touch(msg.chat.id, tenant.key)
     
 
 
     # LLM 호출 및 응답
     start_ts = time.time()
-    response_text = llm.generate_genai(
+    response_text = await llm.agenerate_genai(
         chat_id=msg.chat.id,
         user_name=msg.from_user.username,
-        user_msg=question
+        user_msg=question,
+        trigger=trigger,
+        instruction=tenant.instruction,
+        bot_key=tenant.key,
     )
 
     elapsed = time.time() - start_ts
@@ -175,31 +226,112 @@ async def on_message(msg: types.Message):
         response_text = "응답시간이 초과되었어요."
     elif not response_text:
         response_text = "조금 있다가 다시 시도해 주세요."
-    await msg.answer(response_text)
+    await outbound.answer(msg, response_text)
 
     # 봇 메시지 저장
     
-    save_message(
+    await store.asave_message(
         msg.chat.id,
         None,
-        BOT_NAME,
+        tenant.name,
         'bot',
         response_text,
-        int(time.time())
+        int(time.time()),
+        bot_key=tenant.key,
     )
 
 async def run_bot():
-    idle_poster = post_idle.start_idle_task(bot, ALLOWED_CHAT_IDS)
+    worker = supervisor.worker_index()
+    if len(TENANTS) > 1 and (webhook.WEBHOOK_URL or supervisor.BOT_WORKERS > 1):
+        raise RuntimeError("여러 봇(BOTS_CONFIG)은 아직 폴링 단일 프로세스 모드에서만 실행할 수 있어요.")
+    update_recorder = recorder.install_recorder(dp) if worker is None else None
+    worker_pool = None
+    if worker is None and supervisor.BOT_WORKERS > 1:
+        # 앞단: 업데이트를 받아 워커로 넘기기만 하고, 채팅방별 작업은 워커가 맡습니다.
+        worker_pool = await supervisor.start_worker_pool(dp)
+    else:
+        for tenant in TENANTS:
+            outbound.init_sender(tenant.bot)
+    # 지난 정상 종료 때 남긴 상태(자동 게시 타이머, 최근 채팅방)로 이어서 시작합니다.
+    warm_snapshot = await warmstate.load_snapshot(worker) if not worker_pool else None
+    idle_posters = [
+        post_idle.start_idle_task(
+            tenant.bot,
+            supervisor.own_chats(tenant.allowed_chat_ids),
+            bot_name=tenant.name,
+            bot_key=tenant.key,
+            state=warmstate.idle_state(warm_snapshot, tenant.bot.id),
+        )
+        for tenant in TENANTS
+    ] if not worker_pool else []
+    warm_up = warmstate.start_warm_up(warm_snapshot, supervisor.own_chats) if not worker_pool else None
+    retention_task = retention.start_retention_task() if worker is None else None
+    metrics_server = await metrics.start_metrics_server()
+    llm_ledger = ledger.start_ledger_task()
+    llm_breakers = llm.start_breaker_probes()
+    loop_watchdog = loopwatch.start_loop_watchdog()
+    startup.mark("tasks")
+    webhook_server = None
     try:
-        await dp.start_polling(bot)
+        if worker is not None:
+            await supervisor.serve_worker(bot, dp)
+        elif webhook.WEBHOOK_URL:
+            webhook_server = await webhook.start_webhook(bot, dp)
+            startup.ready("webhook")
+            stop = asyncio.Event()
+            shutdown.install_stop_signals(stop)
+            await stop.wait()
+        else:
+            for polling_bot in bots:  # 웹훅 모드로 돌았던 적이 있으면 getUpdates가 거절되므로 해제
+                await polling_bot.delete_webhook()
+            # 세션은 처리 중인 응답을 마저 보낸 뒤 아래에서 닫습니다.
+            await dp.start_polling(*bots, close_bot_session=False)
     finally:
-        if idle_poster:
-            await idle_poster.stop()
+        # 종료 절차 (순서는 shutdown.py 참고)
+        deadline = shutdown.Deadline()
+        log.info("종료 시작: 처리 중인 업데이트 %d건", shutdown.get_tracker().count)
+        abandoned_webhook = 0
+        if webhook_server:
+            await webhook_server.stop(timeout=deadline.remaining())
+            abandoned_webhook = webhook_server.handler.abandoned
+        if worker_pool:
+            await worker_pool.stop()
+        if warm_up:
+            await warm_up.stop()
+        for idle_poster in idle_posters:
+            if idle_poster:
+                await idle_poster.stop()
+        if retention_task:
+            await retention_task.stop()
+        abandoned = await shutdown.get_tracker().drain(deadline.remaining())
+        unsent = outbound.pending_count()
+
+        for llm_breaker in llm_breakers:
+            await llm_breaker.stop()
+        await llm_ledger.stop()
+        if update_recorder:
+            update_recorder.stop()
+        if not worker_pool:
+            await warmstate.save_snapshot(idle_posters, worker)
+        store.shutdown_executors()
+        busy = store.checkpoint_wal() + quota.checkpoint_usage_wal()
+        for session in {polling_bot.session for polling_bot in bots}:
+            await session.close()
+        await loop_watchdog.stop()
+        if metrics_server:
+            await metrics_server.stop()
+        shutdown.report(
+            deadline,
+            shutdown.get_tracker(),
+            abandoned,
+            webhook_abandoned=abandoned_webhook,
+            unsent=unsent,
+            wal_busy=busy,
+        )
+        botlog.shutdown_logging()
 
 
 if __name__ == "__main__":
-    import asyncio
-
     try:
         asyncio.run(run_bot())
     except KeyboardInterrupt:
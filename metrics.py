@@ -0,0 +1,256 @@
+"""Prometheus 텍스트 형식의 카운터/히스토그램과 로컬 /metrics 엔드포인트.
+
+METRICS_PORT를 지정하면 run_bot이 METRICS_HOST(기본 127.0.0.1):METRICS_PORT에서
+aiohttp 서버를 띄웁니다. 지정하지 않아도 값은 메모리에 쌓이므로 측정 자체는 항상 켜져 있습니다.
+store/quota 함수는 storage.backend_method가, 나머지 단계는 각 모듈이 직접 기록합니다.
+"""
+
+from __future__ import annotations
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import botlog
+
+if TYPE_CHECKING:  # 지표 레지스트리는 의존성 없이 쓰고, aiohttp는 서버를 띄울 때만 불러옵니다.
+    from aiohttp import web
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0") or 0)
+
+# 초 단위 지연 버킷 (SQLite 수백 µs ~ LLM 수십 초)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (250, 500, 1000, 2000, 3000, 4000, 8000, 16000)
+
+log = botlog.get_logger("metrics")
+
+LabelKey = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelKey:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: 레이블은 {self.labelnames}이어야 해요 (받은 값: {tuple(labels)})")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 레이블 값 -> [버킷별 개수..., 합계, 전체 개수]
+        self._values: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: Any) -> float:
+        state = self._values.get(self._key(labels))
+        return state[-1] if state else 0.0
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        for key, state in items:
+            cumulative = 0.0
+            for bound, n in zip(self.buckets, state):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(cumulative)}")
+            inf = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_value(state[-1])}")
+        return lines
+
+
+_registry: Dict[str, Union[Counter, Histogram]] = {}
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    metric = _registry.get(name)
+    if metric is None:
+        metric = _registry[name] = Counter(name, documentation, labelnames)
+    return metric  # type: ignore[return-value]
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = LATENCY_BUCKETS,
+) -> Histogram:
+    metric = _registry.get(name)
+    if metric is None:
+        metric = _registry[name] = Histogram(name, documentation, labelnames, buckets)
+    return metric  # type: ignore[return-value]
+
+
+def render() -> str:
+    """등록된 모든 지표를 Prometheus 텍스트 형식으로 반환합니다."""
+    lines: List[str] = []
+    for name in sorted(_registry):
+        lines.extend(_registry[name].render())
+    return "\n".join(lines) + "\n"
+
+
+### 단계별 지표
+
+UPDATES = counter("bot_updates_total", "수신한 업데이트 수", ("type",))
+UPDATE_SECONDS = histogram("bot_update_seconds", "업데이트 하나를 처리하는 데 걸린 시간", ("type",))
+TRIGGERS = counter("bot_triggers_total", "응답을 유발한 트리거 종류별 횟수", ("trigger",))
+STORE_SECONDS = histogram("store_call_seconds", "store/quota 함수별 DB 처리 시간", ("function",))
+CONTEXT_SECONDS = histogram("llm_context_build_seconds", "LLM 프롬프트(컨텍스트) 조립 시간")
+PROMPT_CHARS = histogram("llm_prompt_chars", "LLM 프롬프트 길이(문자 수)", buckets=SIZE_BUCKETS)
+LLM_SECONDS = histogram("llm_request_seconds", "Gemini 호출 지연", ("outcome",))
+LLM_ERRORS = counter("llm_errors_total", "Gemini 호출 오류 수 (예외 클래스별)", ("error",))
+LLM_RETRIES = counter("llm_retries_total", "일시적 오류 뒤 Gemini 호출을 다시 시도한 수", ("error",))
+LLM_HEDGES = counter("llm_hedged_requests_total", "p95보다 오래 걸려 보낸 두 번째(헤지) 요청 수")
+LLM_SHORT_CIRCUITS = counter("llm_short_circuits_total", "서킷 브레이커가 열려 호출 없이 실패한 수")
+LLM_ROUTES = counter("llm_routes_total", "응답마다 고른 모델 경로 (routing.py, reason은 고른 이유)", ("route", "reason"))
+LLM_ROUTE_SECONDS = histogram("llm_route_seconds", "경로별 응답 생성 시간 (재시도·헤지 포함)", ("route",))
+QUOTA_REJECTIONS = counter("quota_rejections_total", "사용량 한도로 거절한 응답 수")
+IDLE_FETCH_SECONDS = histogram("idle_post_fetch_seconds", "자동 게시용 포스트 페이지 요청 시간", ("outcome",))
+IDLE_PARSE_SECONDS = histogram("idle_post_parse_seconds", "자동 게시용 포스트 페이지 파싱 시간")
+OUTBOUND_WAIT_SECONDS = histogram("outbound_queue_wait_seconds", "발신 큐(속도 제한) 대기 시간")
+OUTBOUND_SEND_SECONDS = histogram("outbound_send_seconds", "Telegram sendMessage 요청 지연", ("outcome",))
+OUTBOUND_RETRIES = counter("outbound_retries_total", "RetryAfter로 재시도한 발신 수")
+
+
+async def update_middleware(
+    handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+    event: Any,
+    data: Dict[str, Any],
+) -> Any:
+    """dp.update.outer_middleware로 등록해 업데이트 수와 처리 시간을 기록합니다."""
+    update_type = getattr(event, "event_type", "unknown")
+    UPDATES.inc(type=update_type)
+    with UPDATE_SECONDS.time(type=update_type):
+        return await handler(event, data)
+
+
+class MetricsServer:
+    """GET /metrics 로 render() 결과를 내보내는 로컬 aiohttp 서버."""
+
+    def __init__(self, host: str = METRICS_HOST, port: int = METRICS_PORT):
+        self._host = host
+        self._port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self) -> None:
+        if self._runner:
+            return
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self._host, self._port).start()
+        log.info("http://%s:%s/metrics 에서 지표를 제공합니다.", self._host, self._port)
+
+    async def stop(self) -> None:
+        if not self._runner:
+            return
+        await self._runner.cleanup()
+        self._runner = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        from aiohttp import web
+
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server() -> Optional[MetricsServer]:
+    """METRICS_PORT가 설정되어 있을 때만 서버를 시작합니다."""
+    if not METRICS_PORT:
+        return None
+    server = MetricsServer()
+    try:
+        await server.start()
+    except OSError as exc:
+        log.warning("서버를 시작하지 못했어요: %r", exc)
+        return None
+    return server
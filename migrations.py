@@ -0,0 +1,36 @@
+"""PRAGMA user_version 기반 SQLite 스키마 마이그레이션 러너."""
+
+from __future__ import annotations
+
+import sqlite3
+from typing import Callable, Sequence
+
+import botlog
+
+Migration = Callable[[sqlite3.Connection], None]
+
+log = botlog.get_logger("migrations")
+
+
+def get_version(conn: sqlite3.Connection) -> int:
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+
+def apply_migrations(conn: sqlite3.Connection, migrations: Sequence[Migration], name: str = "db") -> int:
+    """user_version 이후의 마이그레이션만 순서대로 적용하고 최종 버전을 반환합니다.
+
+    migrations[i]는 버전 i+1로 올리는 함수입니다. 이미 최신이면 아무 DDL도 실행하지 않습니다.
+    각 단계는 IF NOT EXISTS 등으로 재실행해도 안전하게 작성해야 합니다.
+    """
+    current = get_version(conn)
+    target = len(migrations)
+    if current >= target:
+        return current
+
+    for version in range(current + 1, target + 1):
+        migrations[version - 1](conn)
+        conn.commit()
+        conn.execute(f"PRAGMA user_version={version}")
+        conn.commit()
+        log.info("%s 스키마 v%d 적용", name, version)
+    return target
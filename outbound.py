@@ -0,0 +1,191 @@
+"""텔레그램 발신 메시지를 속도 제한에 맞춰 내보내는 중앙 발신 큐."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional
+
+from aiogram import Bot, types
+from aiogram.exceptions import TelegramRetryAfter
+
+import botlog
+import metrics
+
+# 텔레그램 권장 한도 (https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this)
+GLOBAL_RATE_PER_SECOND = 30      # 봇 전체 초당 30건
+GROUP_RATE_PER_MINUTE = 20       # 그룹당 분당 20건
+PRIVATE_RATE_PER_SECOND = 1      # 개인 채팅당 초당 1건
+PRIVATE_BURST = 3
+SEND_MAX_ATTEMPTS = 3
+QUEUE_LATENCY_WARN_SECONDS = 3.0
+
+# 이 프로세스가 쓸 전역 한도. 슈퍼바이저 모드에서는 앞단이 워커마다 GLOBAL_RATE_PER_SECOND / BOT_WORKERS를
+# OUTBOUND_GLOBAL_RATE로 넘겨, 워커를 합쳐도 토큰 하나의 한도를 넘지 않게 합니다.
+# 채팅방별 한도는 한 채팅방을 늘 같은 워커가 맡으므로 나누지 않습니다.
+PROCESS_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "") or GLOBAL_RATE_PER_SECOND)
+
+log = botlog.get_logger("outbound")
+
+
+class TokenBucket:
+    """초당 rate개씩 채워지고 최대 capacity개까지 쌓이는 토큰 버킷."""
+
+    def __init__(self, rate: float, capacity: float):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        # asyncio.Lock은 FIFO라 먼저 기다린 발신이 먼저 토큰을 받습니다.
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+class OutboundSender:
+    """전역/채팅방별 토큰 버킷을 거쳐 메시지를 보내고 RetryAfter를 처리합니다."""
+
+    def __init__(self, bot: Bot):
+        self._bot = bot
+        self._global = TokenBucket(PROCESS_GLOBAL_RATE, max(1.0, PROCESS_GLOBAL_RATE))
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+
+        self._pending = 0
+        self._sent = 0
+        self._retries = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _bucket_for(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            # 음수 chat_id는 그룹/채널, 양수는 개인 채팅
+            if chat_id < 0:
+                bucket = TokenBucket(GROUP_RATE_PER_MINUTE / 60, GROUP_RATE_PER_MINUTE)
+            else:
+                bucket = TokenBucket(PRIVATE_RATE_PER_SECOND, PRIVATE_BURST)
+            self._buckets[chat_id] = bucket
+        return bucket
+
+    def _lock_for(self, chat_id: int) -> asyncio.Lock:
+        lock = self._locks.get(chat_id)
+        if lock is None:
+            lock = self._locks[chat_id] = asyncio.Lock()
+        return lock
+
+    async def send(self, chat_id: int, text: str, **kwargs: Any) -> types.Message:
+        """토큰을 얻을 때까지 대기한 뒤 전송합니다. 같은 채팅방 안에서는 순서를 보장합니다."""
+        enqueued = time.monotonic()
+        self._pending += 1
+        try:
+            async with self._lock_for(chat_id):
+                await self._bucket_for(chat_id).acquire()
+                await self._global.acquire()
+                self._record_wait(chat_id, time.monotonic() - enqueued)
+
+                attempt = 1
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        result = await self._bot.send_message(chat_id, text, **kwargs)
+                    except TelegramRetryAfter as exc:
+                        metrics.OUTBOUND_SEND_SECONDS.observe(time.perf_counter() - started, outcome="retry_after")
+                        if attempt >= SEND_MAX_ATTEMPTS:
+                            raise
+                        attempt += 1
+                        self._retries += 1
+                        metrics.OUTBOUND_RETRIES.inc()
+                        log.warning(
+                            "RetryAfter %ss 후 재시도합니다.",
+                            exc.retry_after,
+                            extra={"chat_id": chat_id, "attempt": attempt},
+                        )
+                        await asyncio.sleep(exc.retry_after)
+                        # 재전송도 한 건의 전송이므로 처음 보낼 때와 같이 두 버킷을 모두 거칩니다.
+                        await self._bucket_for(chat_id).acquire()
+                        await self._global.acquire()
+                        continue
+                    except Exception:
+                        metrics.OUTBOUND_SEND_SECONDS.observe(time.perf_counter() - started, outcome="error")
+                        raise
+                    metrics.OUTBOUND_SEND_SECONDS.observe(time.perf_counter() - started, outcome="ok")
+                    self._sent += 1
+                    return result
+        finally:
+            self._pending -= 1
+
+    def _record_wait(self, chat_id: int, waited: float) -> None:
+        metrics.OUTBOUND_WAIT_SECONDS.observe(waited)
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        if waited >= QUEUE_LATENCY_WARN_SECONDS:
+            log.warning(
+                "발신 대기 지연 %.2fs, 대기 중 %d건",
+                waited,
+                self._pending,
+                extra={"chat_id": chat_id, "sampled": True},
+            )
+
+    def stats(self) -> Dict[str, float]:
+        """발신 건수, 재시도 수, 대기 중 건수, 큐 대기시간(평균/최대)을 반환합니다."""
+        served = self._sent + self._pending
+        return {
+            "sent": self._sent,
+            "retries": self._retries,
+            "pending": self._pending,
+            "wait_avg": self._wait_total / served if served else 0.0,
+            "wait_max": self._wait_max,
+        }
+
+
+# 텔레그램 한도는 봇 토큰마다 따로라서 발신 큐도 봇(bot.id)마다 하나씩 둡니다.
+_senders: Dict[int, OutboundSender] = {}
+
+
+def init_sender(bot: Bot) -> OutboundSender:
+    sender = _senders[bot.id] = OutboundSender(bot)
+    return sender
+
+
+def get_sender(bot: Optional[Bot] = None) -> Optional[OutboundSender]:
+    """bot의 발신 큐. bot을 생략하면 처음 만든 발신 큐를 반환합니다."""
+    if bot is None:
+        return next(iter(_senders.values()), None)
+    return _senders.get(bot.id)
+
+
+def pending_count() -> int:
+    """모든 발신 큐에서 아직 보내지 못한 메시지 수 (종료 시 포기한 발신 확인용)."""
+    return sum(sender.stats()["pending"] for sender in _senders.values())
+
+
+async def send_message(bot: Bot, chat_id: int, text: str, **kwargs: Any) -> types.Message:
+    """발신 큐가 준비되어 있으면 큐를 거치고, 아니면 바로 전송합니다."""
+    sender = _senders.get(bot.id)
+    if sender is None:
+        return await bot.send_message(chat_id, text, **kwargs)
+    return await sender.send(chat_id, text, **kwargs)
+
+
+async def answer(msg: types.Message, text: str, **kwargs: Any) -> types.Message:
+    """msg.answer()와 같은 위치(토픽 포함)로 발신 큐를 거쳐 응답합니다."""
+    sender = _senders.get(msg.bot.id) if msg.bot is not None else None
+    if sender is None:
+        return await msg.answer(text, **kwargs)
+    if msg.is_topic_message and msg.message_thread_id:
+        kwargs.setdefault("message_thread_id", msg.message_thread_id)
+    return await sender.send(msg.chat.id, text, **kwargs)
@@ -11,12 +11,16 @@ from urllib.parse import urljoin
 
 import aiohttp
 from aiogram import Bot
-from bs4 import BeautifulSoup
 
+import botlog
+import metrics
+import outbound
 import store
 from persona import bot_name
 BOT_NAME = bot_name
 
+log = botlog.get_logger("idle")
+
 POST_NAME = "dogdrip"
 POST_URL = "https://www.dogdrip.net/?mid=dogdrip&sort_index=popular"
 POST_IDLE_MINUTES = 180  # 3 hours
@@ -29,11 +33,58 @@ POST_IDLE_TIMEZONE = timezone(timedelta(hours=9))  # 한국 표준시
 POST_BLOCKED_CHAT_IDS = {889998272} # 자동글 차단 예: 개인 채팅방
 
 
+def is_quiet_hours(
+    epoch: Optional[float] = None,
+    quiet_hours: Optional[Tuple[int, int]] = (POST_IDLE_QUIET_START_HOUR, POST_IDLE_QUIET_END_HOUR),
+    tz: Optional[timezone] = None,
+) -> bool:
+    """epoch 시각이 조용한 시간대(start시 이상 end시 미만)에 속하는지 확인합니다."""
+    if not quiet_hours:
+        return False
+
+    start, end = quiet_hours
+    start = max(0, min(23, start))
+    end = max(0, min(23, end))
+
+    if start == end:
+        return False
+
+    tz = tz or POST_IDLE_TIMEZONE
+    target_epoch = epoch or time.time()
+    hour = datetime.fromtimestamp(target_epoch, tz).hour
+
+    if start < end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def quiet_window_start(
+    epoch: Optional[float] = None,
+    quiet_hours: Optional[Tuple[int, int]] = (POST_IDLE_QUIET_START_HOUR, POST_IDLE_QUIET_END_HOUR),
+    tz: Optional[timezone] = None,
+) -> Optional[datetime]:
+    """epoch가 속한 조용한 시간대가 시작한 시각. 조용한 시간대가 아니면 None.
+
+    23시~7시처럼 자정을 넘는 시간대는 자정 이후에도 전날 23시를 반환하므로, 하루 한 번 실행 키로 씁니다.
+    """
+    if not is_quiet_hours(epoch, quiet_hours, tz):
+        return None
+    assert quiet_hours is not None
+    start = max(0, min(23, quiet_hours[0]))
+    now = datetime.fromtimestamp(epoch or time.time(), tz or POST_IDLE_TIMEZONE)
+    window = now.replace(hour=start, minute=0, second=0, microsecond=0)
+    return window if now.hour >= start else window - timedelta(days=1)
+
+
 class IdlePOSTPoster:
     """채팅방이 일정 시간 이상 조용하면 포스트 링크를 전송하는 백그라운드 태스크."""
 
-    def __init__(self, bot: Bot, chat_ids: Iterable[int]):
+    def __init__(
+        self, bot: Bot, chat_ids: Iterable[int], bot_name: str = BOT_NAME, bot_key: Optional[str] = None
+    ):
         self._bot = bot
+        self._bot_name = bot_name
+        self._bot_key = bot_key
         self._chat_ids = {cid for cid in chat_ids if cid}
         if POST_BLOCKED_CHAT_IDS:
             self._chat_ids.difference_update(POST_BLOCKED_CHAT_IDS)
@@ -52,16 +103,35 @@ class IdlePOSTPoster:
         self._recent_links: list[str] = []
         self._task: Optional[asyncio.Task[None]] = None
 
+    @property
+    def bot_id(self) -> int:
+        return self._bot.id
+
+    def export_state(self) -> Dict[str, object]:
+        """재시작 후에도 이어 가야 하는 상태 (채팅방별 마지막 게시 시각, 최근 보낸 링크)."""
+        return {
+            "markers": {str(cid): ts for cid, ts in self._last_post_marker.items()},
+            "recent_links": list(self._recent_links),
+        }
+
+    def restore_state(self, state: Dict[str, object]) -> None:
+        """export_state로 저장한 상태를 되살립니다. 지금 맡지 않는 채팅방은 버립니다."""
+        markers = state.get("markers") or {}
+        for cid, ts in markers.items():  # type: ignore[union-attr]
+            if int(cid) in self._chat_ids:
+                self._last_post_marker[int(cid)] = int(ts)
+        self._recent_links = [str(link) for link in (state.get("recent_links") or [])][-10:]  # type: ignore[union-attr]
+
     @property
     def enabled(self) -> bool:
         if not self._chat_ids:
-            print("[idle] 대상 채팅방이 없어 포스트 링크 자동 게시가 비활성화됩니다.")
+            log.info("대상 채팅방이 없어 포스트 링크 자동 게시가 비활성화됩니다.")
             return False
         if self._idle_seconds <= 0:
-            print("[idle] POST_IDLE_MINUTES가 0 이하로 설정되어 기능이 비활성화됩니다.")
+            log.info("POST_IDLE_MINUTES가 0 이하로 설정되어 기능이 비활성화됩니다.")
             return False
         if not self._post_url:
-            print("[idle] 사용할 포스트 주소가 설정되지 않아 기능이 비활성화됩니다.")
+            log.info("사용할 포스트 주소가 설정되지 않아 기능이 비활성화됩니다.")
             return False
         return True
 
@@ -88,103 +158,113 @@ class IdlePOSTPoster:
             except asyncio.CancelledError:
                 raise
             except Exception as exc:  # pragma: no cover - 예방적 로그
-                print(f"[idle] 배경 태스크 오류: {exc!r}")
+                log.error("배경 태스크 오류: %r", exc)
             await asyncio.sleep(self._check_interval)
 
     async def _tick(self) -> None:
         now = int(time.time())
         if self._is_quiet_hours(now):
             return
-        for chat_id in self._chat_ids:
-            info = store.get_last_message(chat_id)
-            if not info:
-                continue
-            _sender, _text, ts = info
-            if ts <= 0:
-                continue
-            if now - ts < self._idle_seconds:
-                continue
+        chat_ids = list(self._chat_ids)
+        checks = await asyncio.gather(*(self._is_due(chat_id, now) for chat_id in chat_ids))
+        due = [chat_id for chat_id, is_due in zip(chat_ids, checks) if is_due]
+        if not due:
+            return
+        # 게시할 채팅방이 여럿이어도 페이지는 한 번만 받아 파싱하고 후보를 나눠 씁니다.
+        candidates = await self._fetch_candidates()
+        if not candidates:
+            return
+        # 전송 속도는 outbound 발신 큐가 조절하므로 채팅방별 게시를 동시에 진행합니다.
+        results = await asyncio.gather(
+            *(self._post_to_chat(chat_id, candidates) for chat_id in due), return_exceptions=True
+        )
+        for chat_id, result in zip(due, results):
+            if isinstance(result, Exception):
+                log.error("게시 실패: %r", result, extra={"chat_id": chat_id})
 
-            marker = self._last_post_marker.get(chat_id)
-            if marker is not None and now - marker < self._idle_seconds:
-                continue
+    async def _is_due(self, chat_id: int, now: int) -> bool:
+        info = await store.aget_last_message(chat_id)
+        if not info:
+            return False
+        _sender, _text, ts = info
+        if ts <= 0:
+            return False
+        if now - ts < self._idle_seconds:
+            return False
 
-            article = await self._fetch_article()
-            if not article:
-                continue
+        marker = self._last_post_marker.get(chat_id)
+        if marker is not None and now - marker < self._idle_seconds:
+            return False
+        return True
 
-            title, link = article
-            message = self._format_message(title, link)
+    async def _post_to_chat(self, chat_id: int, candidates: list[Tuple[str, str]]) -> None:
+        title, link = self._pick_candidate(candidates)
+        message = self._format_message(title, link)
 
-            try:
-                await self._bot.send_message(chat_id, message)
-            except Exception as exc:  # pragma: no cover - 네트워크/권한 오류 대비
-                print(f"[idle] 메시지 전송 실패(chat={chat_id}): {exc!r}")
-                continue
+        try:
+            await outbound.send_message(self._bot, chat_id, message)
+        except Exception as exc:  # pragma: no cover - 네트워크/권한 오류 대비
+            log.warning("메시지 전송 실패: %r", exc, extra={"chat_id": chat_id})
+            return
 
-            sent_ts = int(time.time())
-            POST_text = "[읽을거리] " + message
-            store.save_message(
-                chat_id,
-                None,
-                BOT_NAME,
-                "bot",
-                POST_text,
-                sent_ts,
-            )
+        sent_ts = int(time.time())
+        POST_text = "[읽을거리] " + message
+        await store.asave_message(
+            chat_id,
+            None,
+            self._bot_name,
+            "bot",
+            POST_text,
+            sent_ts,
+            bot_key=self._bot_key,
+        )
 
-            self._last_post_marker[chat_id] = sent_ts
-            await asyncio.sleep(0.1)
+        self._last_post_marker[chat_id] = sent_ts
 
     def _is_quiet_hours(self, epoch: Optional[int] = None) -> bool:
-        if not self._quiet_hours:
-            return False
-
-        start, end = self._quiet_hours
-        start = max(0, min(23, start))
-        end = max(0, min(23, end))
-
-        if start == end:
-            return False
-
-        tz = self._timezone or POST_IDLE_TIMEZONE
-        target_epoch = epoch or time.time()
-        hour = datetime.fromtimestamp(target_epoch, tz).hour
-
-        if start < end:
-            return start <= hour < end
-        return hour >= start or hour < end
+        return is_quiet_hours(epoch, self._quiet_hours, self._timezone)
 
     async def _fetch_article(self) -> Optional[Tuple[str, str]]:
+        candidates = await self._fetch_candidates()
+        if not candidates:
+            return None
+        return self._pick_candidate(candidates)
+
+    async def _fetch_candidates(self) -> Optional[list[Tuple[str, str]]]:
+        """포스트 페이지를 받아 (제목, 링크) 후보 목록으로 파싱합니다. 실패하거나 없으면 None."""
         timeout = aiohttp.ClientTimeout(total=self._request_timeout)
+        started = time.perf_counter()
         try:
             async with aiohttp.ClientSession(timeout=timeout) as session:
                 text = await self._http_text(session, self._post_url)
         except Exception as exc:
-            print(f"[idle] 포스트 페이지 요청 중 오류: {exc!r}")
+            metrics.IDLE_FETCH_SECONDS.observe(time.perf_counter() - started, outcome="error")
+            log.warning("포스트 페이지 요청 중 오류: %r", exc)
             return None
+        metrics.IDLE_FETCH_SECONDS.observe(time.perf_counter() - started, outcome="ok" if text else "empty")
 
         if not text:
             return None
 
         try:
-            candidates = self._parse_post(text, base=self._post_url)
-            if not candidates:
-                return None
-            return self._pick_candidate(candidates)
+            with metrics.IDLE_PARSE_SECONDS.time():
+                candidates = self._parse_post(text, base=self._post_url)
+            return candidates or None
         except Exception as exc:
-            print(f"[idle] 포스트 파싱 오류: {exc!r}")
+            log.warning("포스트 파싱 오류: %r", exc)
             return None
 
     async def _http_text(self, session: aiohttp.ClientSession, url: str) -> Optional[str]:
         headers = {"User-Agent": "idle-post/1.0"}
         async with session.get(url, headers=headers) as resp:
             if resp.status != 200:
-                print(f"[idle] 요청 실패(status={resp.status}, url={url})")
+                log.warning("요청 실패", extra={"status": resp.status, "url": url})
                 return None
             return await resp.text()
 
     def _parse_post(self, html_text: str, base: str) -> list[Tuple[str, str]]:
+        from bs4 import BeautifulSoup  # 첫 게시글을 가져올 때 불러옴 (시작 시간 단축)
+
         soup = BeautifulSoup(html_text, "html.parser")
         candidates: list[Tuple[str, str]] = []
         seen: set[str] = set()
@@ -222,7 +302,7 @@ class IdlePOSTPoster:
         return choice
 
     def _format_message(self, title: str, link: str) -> str:
-        print(f"[idle] 준비된 포스트: {title} / {link}")
+        log.info("준비된 포스트: %s / %s", title, link)
         message_title = "[포스트] "+ title
         try:
             return self._message_template.format(title=message_title, link=link)
@@ -230,8 +310,16 @@ class IdlePOSTPoster:
             return f"쉬는 동안 읽을거리 하나 드릴게요!\n{title}\n{link}"
 
 
-def start_idle_task(bot: Bot, chat_ids: Iterable[int]) -> Optional[IdlePOSTPoster]:
-    poster = IdlePOSTPoster(bot, chat_ids)
+def start_idle_task(
+    bot: Bot,
+    chat_ids: Iterable[int],
+    bot_name: str = BOT_NAME,
+    state: Optional[Dict[str, object]] = None,
+    bot_key: Optional[str] = None,
+) -> Optional[IdlePOSTPoster]:
+    poster = IdlePOSTPoster(bot, chat_ids, bot_name=bot_name, bot_key=bot_key)
+    if state:
+        poster.restore_state(state)
     task = poster.start()
     if not task:
         return None
@@ -0,0 +1,209 @@
+"""실행 중인 봇 프로세스를 멈추지 않고 재는 샘플링 프로파일러.
+
+별도 스레드가 PROFILE_SAMPLE_SECONDS마다 sys._current_frames()로 모든 스레드의 스택을 떠서
+함수별 샘플 수와 collapsed-stack(flamegraph 입력) 형태로 모읍니다. 옵션으로 tracemalloc을 함께
+켜서 할당 위치 상위 목록을 봅니다. 최대 PROFILE_MAX_SECONDS가 지나면 스스로 멈춥니다.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+PROFILE_SAMPLE_SECONDS = 0.01
+PROFILE_MAX_SECONDS = 300
+PROFILE_MAX_DEPTH = 64
+PROFILE_TRACEMALLOC_FRAMES = 10
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(_APP_DIR):
+        filename = os.path.relpath(filename, _APP_DIR)
+    else:
+        filename = os.path.basename(filename)
+    return f"{filename}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """start()~stop() 사이 모든 스레드의 스택을 주기적으로 샘플링합니다."""
+
+    def __init__(self) -> None:
+        self._interval = PROFILE_SAMPLE_SECONDS
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stacks: Counter[Tuple[str, ...]] = Counter()
+        self._samples = 0
+        self._memory = False
+        self._memory_snapshot: Optional[tracemalloc.Snapshot] = None
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float = PROFILE_MAX_SECONDS, memory: bool = False) -> None:
+        if self.running:
+            raise RuntimeError("이미 프로파일링 중이에요.")
+        with self._lock:
+            self._stacks.clear()
+            self._samples = 0
+        self._memory_snapshot = None
+        self._memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+        self.started_at = time.time()
+        self.stopped_at = None
+        self._stop_event.clear()
+        deadline = time.monotonic() + max(1.0, min(seconds, PROFILE_MAX_SECONDS))
+        self._thread = threading.Thread(target=self._run_sampler, args=(deadline,), name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _finish(self) -> None:
+        if self._memory and tracemalloc.is_tracing():
+            self._memory_snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+        self.stopped_at = time.time()
+
+    def _run_sampler(self, deadline: float) -> None:
+        own = threading.get_ident()
+        try:
+            while not self._stop_event.wait(self._interval) and time.monotonic() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                frames = sys._current_frames()
+                sampled: List[Tuple[str, ...]] = []
+                for ident, frame in frames.items():
+                    if ident == own:
+                        continue
+                    stack: List[str] = []
+                    while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                        stack.append(_frame_label(frame.f_code))
+                        frame = frame.f_back
+                    stack.append(names.get(ident, f"thread-{ident}"))
+                    sampled.append(tuple(reversed(stack)))
+                del frames
+                with self._lock:
+                    self._samples += 1
+                    self._stacks.update(sampled)
+        finally:
+            self._finish()
+
+    def _function_counts(self) -> Tuple[Counter[str], Counter[str], int]:
+        """(자기 시간 샘플, 포함 시간 샘플, 전체 샘플 수)를 반환합니다. 대기 중인 스레드도 포함됩니다."""
+        own: Counter[str] = Counter()
+        inclusive: Counter[str] = Counter()
+        with self._lock:
+            items = list(self._stacks.items())
+            samples = self._samples
+        for stack, n in items:
+            if len(stack) < 2:
+                continue
+            own[stack[-1]] += n
+            for label in set(stack[1:]):
+                inclusive[label] += n
+        return own, inclusive, samples
+
+    def report(self, top: int = 10) -> str:
+        own, inclusive, samples = self._function_counts()
+        if not samples:
+            return "프로파일 샘플이 없어요. /botset profile start 로 시작하세요."
+        end = self.stopped_at or time.time()
+        lines = [
+            f"프로파일 {end - (self.started_at or end):.0f}s, 샘플 {samples}회"
+            f"{' (진행 중)' if self.running else ''}",
+            "자기 시간 상위 (스레드 샘플 비율)",
+        ]
+        lines += [f"- {label}: {n / samples:.0%}" for label, n in own.most_common(top)]
+        lines.append("포함 시간 상위")
+        lines += [f"- {label}: {n / samples:.0%}" for label, n in inclusive.most_common(top)]
+        if self._memory_snapshot is not None:
+            lines.append("할당 위치 상위")
+            for stat in self._memory_snapshot.statistics("lineno")[:top]:
+                frame = stat.traceback[0]
+                lines.append(
+                    f"- {os.path.basename(frame.filename)}:{frame.lineno}: {stat.size / 1024:.0f}KiB ({stat.count}개)"
+                )
+        elif self._memory:
+            lines.append("할당 위치는 프로파일이 끝난 뒤 볼 수 있어요.")
+        return "\n".join(lines)
+
+    def write_collapsed(self, directory: str = PROFILE_DIR) -> str:
+        """flamegraph.pl/speedscope가 읽는 collapsed-stack 파일을 쓰고 경로를 반환합니다."""
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.fromtimestamp(self.started_at or time.time()).strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(directory, f"profile-{stamp}.collapsed")
+        with self._lock:
+            items = sorted(self._stacks.items())
+        with open(path, "w", encoding="utf-8") as fp:
+            for stack, n in items:
+                fp.write(f"{';'.join(stack)} {n}\n")
+        return path
+
+
+_profiler = SamplingProfiler()
+
+
+def handle_profile_command(args: List[str]) -> str:
+    """/botset profile start [초] [mem] | stop | report [N] [file]"""
+    usage = "[사용법] /botset profile [start [초] [mem]|stop|report [N] [file]]"
+    if not args:
+        return usage
+    sub = args[0].lower()
+
+    if sub == "start":
+        seconds: float = 60
+        memory = False
+        for arg in args[1:]:
+            if arg.lower() == "mem":
+                memory = True
+            else:
+                try:
+                    seconds = float(arg)
+                except ValueError:
+                    return usage
+        try:
+            _profiler.start(seconds, memory=memory)
+        except RuntimeError as exc:
+            return str(exc)
+        seconds = max(1.0, min(seconds, PROFILE_MAX_SECONDS))
+        return f"프로파일링을 시작했어요. 최대 {seconds:.0f}초 뒤 자동으로 멈춰요.{' (메모리 포함)' if memory else ''}"
+
+    if sub == "stop":
+        if not _profiler.running:
+            return "실행 중인 프로파일이 없어요."
+        _profiler.stop()
+        return "프로파일링을 멈췄어요. /botset profile report 로 결과를 보세요."
+
+    if sub == "report":
+        top = 10
+        write_file = False
+        for arg in args[1:]:
+            if arg.lower() == "file":
+                write_file = True
+            elif arg.isdigit():
+                top = max(1, min(int(arg), 30))
+            else:
+                return usage
+        text = _profiler.report(top)
+        if write_file and _profiler.started_at is not None:
+            text += f"\ncollapsed-stack 파일: {_profiler.write_collapsed()}"
+        return text
+
+    return usage
@@ -1,9 +1,15 @@
 from __future__ import annotations
 
+import bisect
+import functools
 import os
 import sqlite3
+import threading
 from datetime import datetime, timezone
-from typing import Any, Callable, Dict, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import migrations
+from storage import backend_method
 
 
 def _env_int(name: str, default: int) -> int:
@@ -36,9 +42,13 @@ def _today() -> str:
     return datetime.now(timezone.utc).strftime("%Y-%m-%d")
 
 
-def _initialise_schema(conn: sqlite3.Connection) -> None:
+def usage_day() -> str:
+    """사용량을 쌓는 날짜(UTC). 예약과 취소가 같은 날에 적용되도록 예약 전에 한 번 정해 둘 때 씁니다."""
+    return _today()
+
+
+def _migrate_v1_base(conn: sqlite3.Connection) -> None:
     conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA foreign_keys=ON;")
 
     conn.execute(
         """
@@ -74,11 +84,104 @@ def _initialise_schema(conn: sqlite3.Connection) -> None:
     )
 
 
+def _migrate_v2_llm_ledger(conn: sqlite3.Connection) -> None:
+    # 호출 한 건마다 한 행 (추가만 함). 조회는 아래 시간별 롤업 테이블에서 합니다.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS llm_calls(
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          ts INTEGER NOT NULL,
+          chat_id INTEGER NOT NULL,
+          trigger TEXT,
+          model TEXT,
+          prompt_chars INTEGER NOT NULL,
+          prompt_tokens INTEGER,
+          output_tokens INTEGER,
+          latency_ms INTEGER NOT NULL,
+          finish_reason TEXT,
+          error TEXT
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_calls_ts ON llm_calls(ts)")
+
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS llm_rollup_hourly(
+          hour INTEGER NOT NULL,
+          chat_id INTEGER NOT NULL,
+          calls INTEGER DEFAULT 0,
+          errors INTEGER DEFAULT 0,
+          prompt_chars INTEGER DEFAULT 0,
+          prompt_tokens INTEGER DEFAULT 0,
+          output_tokens INTEGER DEFAULT 0,
+          latency_ms INTEGER DEFAULT 0,
+          max_prompt_chars INTEGER DEFAULT 0,
+          PRIMARY KEY(hour, chat_id)
+        )
+        """
+    )
+
+    # 성공한 호출의 지연 분포 (bucket = LEDGER_LATENCY_BUCKETS_MS 인덱스)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS llm_latency_hourly(
+          hour INTEGER NOT NULL,
+          bucket INTEGER NOT NULL,
+          count INTEGER DEFAULT 0,
+          PRIMARY KEY(hour, bucket)
+        )
+        """
+    )
+
+
+def _migrate_v3_llm_routes(conn: sqlite3.Connection) -> None:
+    # 호출마다 고른 경로(routing.py)를 원장에 남기고, 경로·모델별 시간 롤업으로 비용과 지연을 비교합니다.
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(llm_calls)")}
+    if "route" not in columns:
+        conn.execute("ALTER TABLE llm_calls ADD COLUMN route TEXT")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS llm_route_hourly(
+          hour INTEGER NOT NULL,
+          route TEXT NOT NULL,
+          model TEXT NOT NULL,
+          calls INTEGER DEFAULT 0,
+          errors INTEGER DEFAULT 0,
+          prompt_chars INTEGER DEFAULT 0,
+          prompt_tokens INTEGER DEFAULT 0,
+          output_tokens INTEGER DEFAULT 0,
+          latency_ms INTEGER DEFAULT 0,
+          PRIMARY KEY(hour, route, model)
+        )
+        """
+    )
+
+
+# 순서가 곧 버전 번호(user_version)입니다. 새 변경은 항상 끝에 추가하세요.
+_MIGRATIONS = (_migrate_v1_base, _migrate_v2_llm_ledger, _migrate_v3_llm_routes)
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def _ensure_schema(conn: sqlite3.Connection) -> None:
+    """프로세스당 한 번만 마이그레이션을 확인합니다. 이후 호출은 DDL 없이 바로 반환합니다."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if not _schema_ready:
+            migrations.apply_migrations(conn, _MIGRATIONS, name="usage")
+            _schema_ready = True
+
+
 def _with_conn(fn: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(fn)
     def wrap(*args, **kwargs):
         conn = sqlite3.connect(USAGE_DB_PATH)
         try:
-            _initialise_schema(conn)
+            _ensure_schema(conn)
             return fn(conn, *args, **kwargs)
         finally:
             conn.close()
@@ -86,6 +189,7 @@ def _with_conn(fn: Callable[..., Any]) -> Callable[..., Any]:
     return wrap
 
 
+@backend_method
 @_with_conn
 def _get_overrides(conn: sqlite3.Connection) -> Dict[str, int]:
     rows = conn.execute("SELECT key, value FROM quota_limits").fetchall()
@@ -99,11 +203,16 @@ def get_limits() -> Dict[str, int]:
     return effective
 
 
-@_with_conn
-def set_limit(conn: sqlite3.Connection, key: str, value: int) -> None:
+def set_limit(key: str, value: int) -> None:
     key = key.strip().upper()
     if key not in _ENV_LIMITS:
         raise ValueError(f"알 수 없는 한도 키: {key}")
+    _store_limit(key, int(value))
+
+
+@backend_method
+@_with_conn
+def _store_limit(conn: sqlite3.Connection, key: str, value: int) -> None:
     conn.execute(
         """
         INSERT INTO quota_limits(key, value)
@@ -115,12 +224,14 @@ def set_limit(conn: sqlite3.Connection, key: str, value: int) -> None:
     conn.commit()
 
 
+@backend_method
 @_with_conn
 def reset_limits(conn: sqlite3.Connection) -> None:
     conn.execute("DELETE FROM quota_limits")
     conn.commit()
 
 
+@backend_method
 @_with_conn
 def get_usage_summary_today(conn: sqlite3.Connection) -> Dict[str, Any]:
     day = _today()
@@ -135,6 +246,7 @@ def get_usage_summary_today(conn: sqlite3.Connection) -> Dict[str, Any]:
     return {"total": total, "per_chats": per_chats}
 
 
+@backend_method
 @_with_conn
 def reset_usage(conn: sqlite3.Connection, scope: str = "today") -> None:
     if scope not in ("today", "all"):
@@ -149,14 +261,11 @@ def reset_usage(conn: sqlite3.Connection, scope: str = "today") -> None:
     conn.commit()
 
 
-@_with_conn
-def _add_usage(
-    conn: sqlite3.Connection,
-    chat_id: int,
-    input_chars: int,
-    output_tokens: int,
+def _apply_usage(
+    conn: sqlite3.Connection, chat_id: int, calls: int, input_chars: int, output_tokens: int, day: str | None = None
 ) -> None:
-    day = _today()
+    """day(기본 오늘) 사용량에 값을 더합니다 (음수면 뺌). 커밋은 호출한 쪽에서 합니다."""
+    day = day or _today()
     conn.execute(
         """
         INSERT INTO usage_daily(day, chat_id, calls, input_chars, output_tokens)
@@ -166,7 +275,7 @@ def _add_usage(
           input_chars = usage_daily.input_chars + excluded.input_chars,
           output_tokens = usage_daily.output_tokens + excluded.output_tokens
         """,
-        (day, chat_id, 1, int(input_chars), int(output_tokens)),
+        (day, chat_id, calls, int(input_chars), int(output_tokens)),
     )
 
     conn.execute(
@@ -178,20 +287,30 @@ def _add_usage(
           input_chars = usage_daily_total.input_chars + excluded.input_chars,
           output_tokens = usage_daily_total.output_tokens + excluded.output_tokens
         """,
-        (day, 1, int(input_chars), int(output_tokens)),
+        (day, calls, int(input_chars), int(output_tokens)),
     )
+
+
+@_with_conn
+def _add_usage(
+    conn: sqlite3.Connection,
+    chat_id: int,
+    input_chars: int,
+    output_tokens: int,
+) -> None:
+    _apply_usage(conn, chat_id, 1, input_chars, output_tokens)
     conn.commit()
 
 
+@backend_method
 def add_usage(chat_id: int, input_chars: int, output_tokens: int) -> None:
     _add_usage(chat_id=chat_id, input_chars=input_chars, output_tokens=output_tokens)
 
 
-@_with_conn
-def _fetch_usage_snapshot(
-    conn: sqlite3.Connection, chat_id: int
+def _usage_snapshot(
+    conn: sqlite3.Connection, chat_id: int, day: str | None = None
 ) -> Tuple[Tuple[int, int, int], Tuple[int, int, int]]:
-    day = _today()
+    day = day or _today()
     total = conn.execute(
         "SELECT calls, input_chars, output_tokens FROM usage_daily_total WHERE day=?",
         (day,),
@@ -203,6 +322,309 @@ def _fetch_usage_snapshot(
     return total, per_chat
 
 
+@backend_method
+@_with_conn
+def _fetch_usage_snapshot(
+    conn: sqlite3.Connection, chat_id: int
+) -> Tuple[Tuple[int, int, int], Tuple[int, int, int]]:
+    return _usage_snapshot(conn, chat_id)
+
+
+@backend_method
+@_with_conn
+def _reserve_usage(
+    conn: sqlite3.Connection,
+    chat_id: int,
+    input_chars: int,
+    output_tokens: int,
+    limits: Dict[str, int],
+    day: str | None = None,
+) -> str | None:
+    """BEGIN IMMEDIATE로 쓰기 잠금을 먼저 잡고 한도 확인과 사용량 기록을 한 트랜잭션에서 합니다.
+
+    여러 스레드나 워커 프로세스가 동시에 호출해도 확인과 기록 사이에 다른 호출이 끼어들지 않습니다.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        total, per_chat = _usage_snapshot(conn, chat_id, day)
+        message = _limit_message(limits, total, per_chat, input_chars, output_tokens)
+        if message is None:
+            _apply_usage(conn, chat_id, 1, input_chars, output_tokens, day)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return message
+
+
+@backend_method
+@_with_conn
+def _release_usage(
+    conn: sqlite3.Connection, chat_id: int, input_chars: int, output_tokens: int, day: str | None = None
+) -> None:
+    _apply_usage(conn, chat_id, -1, -int(input_chars), -int(output_tokens), day)
+    conn.commit()
+
+
+def reserve_quota_or_msg(chat_id: int, input_chars: int, config: Any, day: str | None = None) -> str | None:
+    """한도 안이면 이번 호출분을 day(기본 오늘) 사용량에 미리 기록하고 None을, 넘으면 안내 문구를 반환합니다.
+
+    호출이 실패하면 release_usage에 같은 day를 넘겨 되돌립니다 (그사이 자정이 지나도 예약한 날에서 뺌).
+    """
+    return _reserve_usage(chat_id, int(input_chars), _estimate_output_tokens_from_config(config), get_limits(), day)
+
+
+def release_usage(chat_id: int, input_chars: int, config: Any, day: str | None = None) -> None:
+    """reserve_quota_or_msg로 day에 잡아 둔 사용량을 취소합니다."""
+    _release_usage(chat_id, int(input_chars), _estimate_output_tokens_from_config(config), day)
+
+
+def _headroom(limits: Dict[str, int], total: Tuple[int, int, int], per_chat: Tuple[int, int, int]) -> float:
+    """오늘 한도 중 가장 많이 쓴 것의 남은 비율 (0~1). 한도가 0이면 이미 다 쓴 것으로 봅니다."""
+    pairs = [
+        (limits["MAX_CALLS_PER_DAY"], total[0]),
+        (limits["MAX_INPUT_CHARS_PER_DAY"], total[1]),
+        (limits["MAX_OUTPUT_TOKENS_PER_DAY"], total[2]),
+    ]
+    if limits["MAX_CALLS_PER_CHAT_PER_DAY"]:
+        pairs.append((limits["MAX_CALLS_PER_CHAT_PER_DAY"], per_chat[0]))
+    return min(max(0.0, 1 - used / limit) if limit > 0 else 0.0 for limit, used in pairs)
+
+
+def quota_headroom(chat_id: int) -> float:
+    """이 채팅방이 지금 쓸 수 있는 한도 여유 (0~1). routing.py가 가벼운 설정을 고를 때 씁니다."""
+    total, per_chat = _fetch_usage_snapshot(chat_id)
+    return _headroom(get_limits(), total, per_chat)
+
+
+### LLM 호출 원장 (ledger.py가 배치로 기록)
+
+# 지연 분포 버킷 상한(ms). 마지막 인덱스(len)는 그보다 느린 호출입니다.
+LEDGER_LATENCY_BUCKETS_MS = (100, 250, 500, 750, 1000, 1500, 2000, 3000, 5000, 7500, 10000, 20000, 30000)
+
+# 호출별 원장(llm_calls)을 남겨 둘 일수. 시간별 롤업은 지우지 않으므로 /botset perf 집계는 그대로입니다.
+LEDGER_RETAIN_DAYS = _env_int("LEDGER_RETAIN_DAYS", 30)
+
+
+@backend_method
+@_with_conn
+def checkpoint_usage_wal(conn: sqlite3.Connection) -> int:
+    """usage DB의 WAL을 DB 파일에 옮기고 비웁니다. 끝까지 못 옮겼으면 1을 반환합니다."""
+    row = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    return 1 if row and row[0] else 0
+
+
+@backend_method
+@_with_conn
+def prune_llm_calls(conn: sqlite3.Connection, before_ts: int, batch_size: int = 5000) -> int:
+    """ts가 before_ts보다 이른 원장 행을 최대 batch_size개 지웁니다 (idx_llm_calls_ts 사용)."""
+    cursor = conn.execute(
+        "DELETE FROM llm_calls WHERE id IN (SELECT id FROM llm_calls WHERE ts < ? LIMIT ?)",
+        (int(before_ts), int(batch_size)),
+    )
+    conn.commit()
+    return max(0, cursor.rowcount)
+
+
+def latency_bucket(latency_ms: float) -> int:
+    return bisect.bisect_left(LEDGER_LATENCY_BUCKETS_MS, latency_ms)
+
+
+def _rollup_entries(entries: List[Dict[str, Any]]) -> Tuple[Dict[Tuple[int, int], List[int]], Dict[Tuple[int, int], int]]:
+    """원장 항목을 (hour, chat_id)별 합계와 (hour, bucket)별 지연 개수로 묶습니다."""
+    per_chat: Dict[Tuple[int, int], List[int]] = {}
+    latency: Dict[Tuple[int, int], int] = {}
+    for e in entries:
+        hour = int(e["ts"]) // 3600
+        row = per_chat.setdefault((hour, e["chat_id"]), [0, 0, 0, 0, 0, 0, 0])
+        row[0] += 1
+        row[1] += 1 if e.get("error") else 0
+        row[2] += int(e["prompt_chars"])
+        row[3] += int(e.get("prompt_tokens") or 0)
+        row[4] += int(e.get("output_tokens") or 0)
+        row[5] += int(e["latency_ms"])
+        row[6] = max(row[6], int(e["prompt_chars"]))
+        if not e.get("error"):
+            key = (hour, latency_bucket(e["latency_ms"]))
+            latency[key] = latency.get(key, 0) + 1
+    return per_chat, latency
+
+
+def _rollup_routes(entries: List[Dict[str, Any]]) -> Dict[Tuple[int, str, str], List[int]]:
+    """원장 항목을 (hour, route, model)별 [calls, errors, prompt_chars, prompt_tokens, output_tokens, latency_ms]로 묶습니다."""
+    per_route: Dict[Tuple[int, str, str], List[int]] = {}
+    for e in entries:
+        key = (int(e["ts"]) // 3600, e.get("route") or "-", e.get("model") or "-")
+        row = per_route.setdefault(key, [0, 0, 0, 0, 0, 0])
+        row[0] += 1
+        row[1] += 1 if e.get("error") else 0
+        row[2] += int(e["prompt_chars"])
+        row[3] += int(e.get("prompt_tokens") or 0)
+        row[4] += int(e.get("output_tokens") or 0)
+        row[5] += int(e["latency_ms"])
+    return per_route
+
+
+@backend_method
+@_with_conn
+def write_llm_calls(conn: sqlite3.Connection, entries: List[Dict[str, Any]]) -> None:
+    """원장 항목들을 한 트랜잭션으로 추가하고 시간별 롤업을 함께 갱신합니다."""
+    if not entries:
+        return
+    conn.executemany(
+        """
+        INSERT INTO llm_calls(ts, chat_id, trigger, route, model, prompt_chars, prompt_tokens,
+                              output_tokens, latency_ms, finish_reason, error)
+        VALUES(:ts, :chat_id, :trigger, :route, :model, :prompt_chars, :prompt_tokens,
+               :output_tokens, :latency_ms, :finish_reason, :error)
+        """,
+        entries,
+    )
+    per_chat, latency = _rollup_entries(entries)
+    conn.executemany(
+        """
+        INSERT INTO llm_rollup_hourly(hour, chat_id, calls, errors, prompt_chars, prompt_tokens,
+                                      output_tokens, latency_ms, max_prompt_chars)
+        VALUES(?,?,?,?,?,?,?,?,?)
+        ON CONFLICT(hour, chat_id) DO UPDATE SET
+          calls = llm_rollup_hourly.calls + excluded.calls,
+          errors = llm_rollup_hourly.errors + excluded.errors,
+          prompt_chars = llm_rollup_hourly.prompt_chars + excluded.prompt_chars,
+          prompt_tokens = llm_rollup_hourly.prompt_tokens + excluded.prompt_tokens,
+          output_tokens = llm_rollup_hourly.output_tokens + excluded.output_tokens,
+          latency_ms = llm_rollup_hourly.latency_ms + excluded.latency_ms,
+          max_prompt_chars = MAX(llm_rollup_hourly.max_prompt_chars, excluded.max_prompt_chars)
+        """,
+        [(hour, chat_id, *row) for (hour, chat_id), row in per_chat.items()],
+    )
+    conn.executemany(
+        """
+        INSERT INTO llm_latency_hourly(hour, bucket, count) VALUES(?,?,?)
+        ON CONFLICT(hour, bucket) DO UPDATE SET count = llm_latency_hourly.count + excluded.count
+        """,
+        [(hour, bucket, n) for (hour, bucket), n in latency.items()],
+    )
+    conn.executemany(
+        """
+        INSERT INTO llm_route_hourly(hour, route, model, calls, errors, prompt_chars, prompt_tokens,
+                                     output_tokens, latency_ms)
+        VALUES(?,?,?,?,?,?,?,?,?)
+        ON CONFLICT(hour, route, model) DO UPDATE SET
+          calls = llm_route_hourly.calls + excluded.calls,
+          errors = llm_route_hourly.errors + excluded.errors,
+          prompt_chars = llm_route_hourly.prompt_chars + excluded.prompt_chars,
+          prompt_tokens = llm_route_hourly.prompt_tokens + excluded.prompt_tokens,
+          output_tokens = llm_route_hourly.output_tokens + excluded.output_tokens,
+          latency_ms = llm_route_hourly.latency_ms + excluded.latency_ms
+        """,
+        [(hour, route, model, *row) for (hour, route, model), row in _rollup_routes(entries).items()],
+    )
+    conn.commit()
+
+
+@backend_method
+@_with_conn
+def get_llm_rollups(
+    conn: sqlite3.Connection, since_ts: int, until_ts: int, top: int = 5
+) -> Dict[str, Any]:
+    """[since_ts, until_ts) 구간의 롤업 합계, 지연 분포, 상위 채팅방, 경로별 합계를 반환합니다 (원장은 읽지 않음)."""
+    lo, hi = since_ts // 3600, (until_ts + 3599) // 3600
+    totals = conn.execute(
+        """
+        SELECT COALESCE(SUM(calls),0), COALESCE(SUM(errors),0), COALESCE(SUM(prompt_chars),0),
+               COALESCE(SUM(prompt_tokens),0), COALESCE(SUM(output_tokens),0),
+               COALESCE(SUM(latency_ms),0), COALESCE(MAX(max_prompt_chars),0)
+          FROM llm_rollup_hourly WHERE hour >= ? AND hour < ?
+        """,
+        (lo, hi),
+    ).fetchone()
+    hist = dict(
+        conn.execute(
+            "SELECT bucket, SUM(count) FROM llm_latency_hourly WHERE hour >= ? AND hour < ? GROUP BY bucket",
+            (lo, hi),
+        ).fetchall()
+    )
+    by_calls = conn.execute(
+        """
+        SELECT chat_id, SUM(calls) AS n FROM llm_rollup_hourly
+         WHERE hour >= ? AND hour < ? GROUP BY chat_id ORDER BY n DESC LIMIT ?
+        """,
+        (lo, hi, top),
+    ).fetchall()
+    by_prompt = conn.execute(
+        """
+        SELECT chat_id, SUM(prompt_chars) / SUM(calls) AS avg_chars, MAX(max_prompt_chars)
+          FROM llm_rollup_hourly WHERE hour >= ? AND hour < ?
+         GROUP BY chat_id ORDER BY avg_chars DESC LIMIT ?
+        """,
+        (lo, hi, top),
+    ).fetchall()
+    by_route = conn.execute(
+        """
+        SELECT route, model, SUM(calls), SUM(errors), SUM(prompt_chars), SUM(prompt_tokens),
+               SUM(output_tokens), SUM(latency_ms)
+          FROM llm_route_hourly WHERE hour >= ? AND hour < ?
+         GROUP BY route, model ORDER BY SUM(calls) DESC
+        """,
+        (lo, hi),
+    ).fetchall()
+    return {
+        "totals": tuple(totals),
+        "latency_hist": hist,
+        "top_calls": by_calls,
+        "top_prompt": by_prompt,
+        "by_route": [tuple(row) for row in by_route],
+    }
+
+
+def _hist_percentile(hist: Dict[int, int], pct: float) -> Optional[int]:
+    """버킷 개수에서 pct 백분위가 속한 버킷의 상한(ms)을 반환합니다 (마지막 버킷은 None=초과)."""
+    total = sum(hist.values())
+    if not total:
+        return None
+    target = pct / 100 * total
+    seen = 0
+    for bucket in sorted(hist):
+        seen += hist[bucket]
+        if seen >= target:
+            return LEDGER_LATENCY_BUCKETS_MS[bucket] if bucket < len(LEDGER_LATENCY_BUCKETS_MS) else None
+    return None
+
+
+def llm_perf_summary(since_ts: int, until_ts: int, top: int = 5) -> Dict[str, Any]:
+    """롤업을 바탕으로 호출 수, 오류율, 지연 백분위, 상위 채팅방을 계산합니다."""
+    data = get_llm_rollups(since_ts, until_ts, top)
+    calls, errors, prompt_chars, prompt_tokens, output_tokens, latency_ms, max_prompt = data["totals"]
+    hist = data["latency_hist"]
+    return {
+        "calls": calls,
+        "errors": errors,
+        "avg_prompt_chars": prompt_chars / calls if calls else 0,
+        "max_prompt_chars": max_prompt,
+        "prompt_tokens": prompt_tokens,
+        "output_tokens": output_tokens,
+        "avg_latency_ms": latency_ms / calls if calls else 0,
+        "p50_ms": _hist_percentile(hist, 50),
+        "p95_ms": _hist_percentile(hist, 95),
+        "p99_ms": _hist_percentile(hist, 99),
+        "top_calls": data["top_calls"],
+        "top_prompt": data["top_prompt"],
+        "routes": [
+            {
+                "route": route,
+                "model": model,
+                "calls": n,
+                "errors": errs,
+                "avg_prompt_chars": chars / n if n else 0,
+                "prompt_tokens": p_tok,
+                "output_tokens": o_tok,
+                "avg_latency_ms": lat / n if n else 0,
+            }
+            for route, model, n, errs, chars, p_tok, o_tok, lat in data["by_route"]
+        ],
+    }
+
+
 def _estimate_output_tokens_from_config(config: Any) -> int:
     """Best-effort estimate of maximum output tokens."""
     for attr in ("max_output_tokens", "max_tokens"):
@@ -228,15 +650,16 @@ def _estimate_output_tokens_from_config(config: Any) -> int:
     return 0
 
 
-def _check_quota_or_msg(chat_id: int, input_chars: int, config: Any) -> str | None:
-    limits = get_limits()
-    total, per_chat = _fetch_usage_snapshot(chat_id)
-
+def _limit_message(
+    limits: Dict[str, int],
+    total: Tuple[int, int, int],
+    per_chat: Tuple[int, int, int],
+    input_chars: int,
+    est_output: int,
+) -> str | None:
     t_calls, t_in, t_out = total
     c_calls, c_in, c_out = per_chat
 
-    est_output = _estimate_output_tokens_from_config(config)
-
     will_calls = t_calls + 1
     will_in = t_in + int(input_chars)
     will_out = t_out + est_output
@@ -255,6 +678,12 @@ def _check_quota_or_msg(chat_id: int, input_chars: int, config: Any) -> str | No
     return None
 
 
+def _check_quota_or_msg(chat_id: int, input_chars: int, config: Any) -> str | None:
+    limits = get_limits()
+    total, per_chat = _fetch_usage_snapshot(chat_id)
+    return _limit_message(limits, total, per_chat, input_chars, _estimate_output_tokens_from_config(config))
+
+
 __all__ = [
     "USAGE_DB_PATH",
     "get_limits",
@@ -263,6 +692,14 @@ __all__ = [
     "get_usage_summary_today",
     "reset_usage",
     "add_usage",
+    "reserve_quota_or_msg",
+    "release_usage",
+    "usage_day",
+    "quota_headroom",
+    "write_llm_calls",
+    "checkpoint_usage_wal",
+    "prune_llm_calls",
+    "llm_perf_summary",
     "_check_quota_or_msg",
     "_estimate_output_tokens_from_config",
 ]
@@ -0,0 +1,129 @@
+"""수신 업데이트를 gzip JSONL로 기록하는 디스패처 미들웨어.
+
+UPDATE_RECORD_PATH 환경 변수를 지정하면 run_bot이 기록을 켭니다.
+기록한 파일은 benchmarks/replay.py로 가짜 Telegram/Gemini 환경에서 다시 재생할 수 있습니다.
+
+파일 형식 (한 줄에 JSON 하나)
+    {"type": "meta", "ts": ..., "bot_id": ..., "bot_username": ...}   # 기록 시작마다 한 줄
+    {"type": "update", "ts": ..., "update": {...}}                     # Telegram Update 원본
+
+메시지 본문이 그대로 남으므로 기록 파일은 chat.db와 같은 수준으로 관리하세요.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.types import TelegramObject, Update
+
+import botlog
+
+UPDATE_RECORD_PATH = os.getenv("UPDATE_RECORD_PATH", "")
+RECORD_FLUSH_SECONDS = 1.0
+
+log = botlog.get_logger("recorder")
+
+
+class UpdateRecorder(BaseMiddleware):
+    """업데이트를 처리하기 전에 큐에 넣고, 별도 스레드가 압축 파일에 이어 씁니다."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.recorded = 0
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._meta_written = False
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run_writer, name="update-recorder", daemon=True)
+        self._thread.start()
+        log.info("업데이트 기록 시작: %s", self.path)
+
+    def stop(self) -> None:
+        if not self._thread:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        log.info("업데이트 기록 종료: %d건", self.recorded)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if isinstance(event, Update):
+            if not self._meta_written:
+                self._meta_written = True
+                bot: Optional[Bot] = data.get("bot")
+                me = await bot.me() if bot else None
+                self._put(
+                    {
+                        "type": "meta",
+                        "ts": time.time(),
+                        "bot_id": me.id if me else None,
+                        "bot_username": me.username if me else None,
+                    }
+                )
+            self._put({"type": "update", "ts": time.time(), "update": event.model_dump(mode="json", exclude_none=True)})
+            self.recorded += 1
+        return await handler(event, data)
+
+    def _put(self, record: Dict[str, Any]) -> None:
+        self._queue.put(json.dumps(record, ensure_ascii=False))
+
+    def _run_writer(self) -> None:
+        # 기존 파일에 이어 쓰면 gzip 멤버가 추가되며, gzip.open으로 한 번에 읽을 수 있습니다.
+        with gzip.open(self.path, "at", encoding="utf-8") as fp:
+            last_flush = time.monotonic()
+            while True:
+                try:
+                    line = self._queue.get(timeout=RECORD_FLUSH_SECONDS)
+                except queue.Empty:
+                    line = ""
+                if line is None:
+                    break
+                if line:
+                    fp.write(line + "\n")
+                if time.monotonic() - last_flush >= RECORD_FLUSH_SECONDS:
+                    fp.flush()
+                    last_flush = time.monotonic()
+
+
+def read_records(path: str) -> Iterator[Dict[str, Any]]:
+    """기록 파일의 레코드를 순서대로 돌려줍니다. 잘린 마지막 줄은 건너뜁니다."""
+    with gzip.open(path, "rt", encoding="utf-8") as fp:
+        try:
+            for line in fp:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+        except EOFError:  # 비정상 종료로 gzip 꼬리가 없는 경우
+            return
+
+
+def install_recorder(dp: Dispatcher, path: str = UPDATE_RECORD_PATH) -> Optional[UpdateRecorder]:
+    """path가 비어 있지 않으면 기록 미들웨어를 dp에 등록하고 시작합니다."""
+    if not path:
+        return None
+    recorder = UpdateRecorder(path)
+    dp.update.outer_middleware(recorder)
+    recorder.start()
+    return recorder
@@ -0,0 +1,198 @@
+"""외부 API(Gemini) 호출을 위한 재시도 간격, 최근 지연 분포, 서킷 브레이커.
+
+llm.py가 이 도구들로 호출을 감쌉니다:
+    - backoff_delay: 일시적 오류 뒤 재시도 간격 (상한이 있는 full jitter 지수 백오프)
+    - LatencyWindow: 최근 성공 지연의 p95. 이보다 오래 걸리면 두 번째 요청(헤지)을 보낼 기준
+    - CircuitBreaker: 일시적 오류가 연달아 나면 열려서(open) 호출 없이 바로 실패하고,
+      BREAKER_OPEN_SECONDS가 지나면 배경 태스크가 가벼운 요청으로 회복을 확인해 다시 닫습니다.
+      배경 태스크 없이 쓰면(스크립트 등) 대기 시간 뒤 첫 요청 하나가 그 확인을 맡습니다.
+호출은 스레드(asyncio.to_thread)에서 일어나므로 상태는 threading.Lock으로 보호합니다.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from contextlib import suppress
+from typing import Any, Callable, Deque, Optional
+
+import botlog
+import metrics
+
+BREAKER_FAILURE_THRESHOLD = 5     # 연속 일시적 오류가 이만큼이면 열림
+BREAKER_OPEN_SECONDS = 30.0       # 열린 뒤 회복 확인까지 기다리는 시간
+BREAKER_PROBE_CHECK_SECONDS = 1.0
+
+LATENCY_WINDOW_SIZE = 200
+LATENCY_MIN_SAMPLES = 20          # 이보다 적으면 p95를 믿지 않음 (헤지 안 함)
+
+log = botlog.get_logger("resilience")
+
+BREAKER_TRANSITIONS = metrics.counter("circuit_breaker_transitions_total", "서킷 브레이커 상태 전환 수", ("name", "state"))
+
+# 재시도할 만한 HTTP 상태 (요청 시간 초과, 요청 과다, 서버 오류)
+_TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    """서킷 브레이커가 열려 있어 호출하지 않았음."""
+
+
+def is_transient(exc: BaseException) -> bool:
+    """잠시 뒤 다시 시도하면 성공할 수 있는 오류인지 (네트워크·시간 초과·429·5xx)."""
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    code = getattr(exc, "code", None)  # google.genai.errors.APIError
+    if isinstance(code, int):
+        return code in _TRANSIENT_STATUS
+    import httpx  # google-genai의 전송 계층
+
+    return isinstance(exc, (httpx.TimeoutException, httpx.TransportError))
+
+
+def backoff_delay(attempt: int, base: float, cap: float, rng: Callable[[], float] = random.random) -> float:
+    """attempt번째 실패 뒤 기다릴 시간. 0 ~ min(cap, base·2^(attempt-1)) 사이에서 고릅니다."""
+    return rng() * min(cap, base * (2 ** max(0, attempt - 1)))
+
+
+class LatencyWindow:
+    """최근 성공 호출 지연(초)을 모아 백분위를 계산합니다."""
+
+    def __init__(self, size: int = LATENCY_WINDOW_SIZE, min_samples: int = LATENCY_MIN_SAMPLES) -> None:
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """표본이 모자라면 None."""
+        with self._lock:
+            if len(self._samples) < self._min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class CircuitBreaker:
+    """closed → (연속 실패) → open → (대기 후 확인 1건) → half_open → 성공이면 closed, 실패면 다시 open."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        probe: Optional[Callable[[], Any]] = None,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+    ) -> None:
+        self.name = name
+        self._probe = probe
+        self._failure_threshold = max(1, failure_threshold)
+        self._open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self.rejected = 0
+        self._task: Optional[asyncio.Task[None]] = None
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def _transition(self, state: str) -> None:
+        # self._lock을 쥔 상태에서 호출
+        self._state = state
+        if state == self.OPEN:
+            self._opened_at = time.monotonic()
+        BREAKER_TRANSITIONS.inc(name=self.name, state=state)
+        log.warning("%s 서킷 브레이커: %s", self.name, state, extra={"failures": self._failures})
+
+    def _begin_trial(self) -> bool:
+        """열린 지 open_seconds가 지났으면 half_open으로 바꾸고 True (확인 요청 1건을 맡음)."""
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self._open_seconds:
+            self._transition(self.HALF_OPEN)
+            return True
+        return False
+
+    def allow(self) -> bool:
+        """지금 호출해도 되는지. 열려 있으면 False (배경 확인 태스크가 없으면 대기 뒤 1건은 통과)."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._task is None and self._begin_trial():
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            if self._state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def record_failure(self) -> None:
+        """일시적 오류 한 건. 영구 오류(400 등)는 API 상태와 무관하므로 기록하지 않습니다."""
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or (
+                self._state == self.CLOSED and self._failures >= self._failure_threshold
+            ):
+                self._transition(self.OPEN)
+
+    def record_inconclusive(self) -> None:
+        """영구 오류(400 등) 한 건. API가 살아 있다는 뜻도, 아프다는 뜻도 아니므로 상태는 그대로 둡니다.
+
+        닫혀 있으면 연속 실패 수만 0으로 되돌립니다. 확인 요청(half_open)이 이렇게 끝나면
+        opened_at을 그대로 둔 채 open으로 돌려 다음 요청·확인이 바로 다시 확인을 맡게 합니다.
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                self._failures = 0
+            elif self._state == self.HALF_OPEN:
+                self._state = self.OPEN
+
+    def start(self) -> Optional[asyncio.Task[None]]:
+        """열렸을 때 사용자 요청 대신 probe로 회복을 확인하는 배경 태스크를 시작합니다."""
+        if self._probe is None:
+            return None
+        if self._task and not self._task.done():
+            return self._task
+        self._task = asyncio.create_task(self._run_loop(), name=f"{self.name}-breaker-probe")
+        return self._task
+
+    async def stop(self) -> None:
+        if not self._task:
+            return
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def _run_loop(self) -> None:
+        assert self._probe is not None
+        while True:
+            await asyncio.sleep(BREAKER_PROBE_CHECK_SECONDS)
+            with self._lock:
+                trial = self._begin_trial()
+            if not trial:
+                continue
+            try:
+                await asyncio.to_thread(self._probe)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                log.info("%s 회복 확인 실패: %r", self.name, exc)
+                with self._lock:
+                    self._transition(self.OPEN)
+            else:
+                self.record_success()
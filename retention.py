@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import suppress
+from typing import Dict, Optional
+
+import botlog
+import metrics
+import post_idle
+import quota
+import store
+
+RETENTION_CHECK_SECONDS = 600
+RETENTION_BATCH_SIZE = 500          # 한 트랜잭션에서 지울 최대 행 수
+RETENTION_BATCH_PAUSE_SECONDS = 0.05  # 배치 사이 쉬는 시간 (다른 쓰기에 락 양보)
+RETENTION_VACUUM_PAGES = 200        # incremental_vacuum 한 번에 반환할 페이지 수
+LEDGER_PRUNE_BATCH_SIZE = 5000      # 원장(usage.db llm_calls) 한 번에 지울 최대 행 수
+
+log = botlog.get_logger("retention")
+
+RETENTION_DELETED = metrics.counter("retention_deleted_total", "보존 정책으로 지운 행 수", ("kind",))
+RETENTION_RUN_SECONDS = metrics.histogram(
+    "retention_run_seconds", "보존 정책 한 회차(모든 샤드 + 원장) 소요 시간", buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800)
+)
+
+
+async def prune_chat(
+    chat_id: int,
+    keep: int,
+    days: int,
+    batch_size: int = RETENTION_BATCH_SIZE,
+    pause: float = RETENTION_BATCH_PAUSE_SECONDS,
+) -> int:
+    """한 채팅방의 보존 정책을 끝까지 적용합니다.
+
+    배치 하나씩 그 채팅방 샤드의 writer에 넣고 사이사이 쉬므로, 오래 걸려도 다른 쓰기가 뒤에 밀려 있지 않습니다.
+    """
+    shard = store.shard_of(chat_id)
+    deleted = 0
+    while True:
+        n = await store.run_shard_write(shard, store.prune_chat_messages, chat_id, keep, days, batch_size)
+        deleted += n
+        RETENTION_DELETED.inc(n, kind="messages")
+        if n < batch_size:
+            return deleted
+        await asyncio.sleep(pause)
+
+
+class RetentionScheduler:
+    """조용한 시간대에 채팅방별 keep_per_chat / retain_days 정책을 배치 단위로 적용합니다."""
+
+    def __init__(self) -> None:
+        self._check_interval = RETENTION_CHECK_SECONDS
+        self._batch_size = RETENTION_BATCH_SIZE
+        self._batch_pause = RETENTION_BATCH_PAUSE_SECONDS
+        self._vacuum_pages = RETENTION_VACUUM_PAGES
+        self._timezone = post_idle.POST_IDLE_TIMEZONE
+
+        self._last_run_window: Optional[str] = None
+        self.last_report: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def start(self) -> Optional[asyncio.Task[None]]:
+        if self._task and not self._task.done():
+            return self._task
+        self._task = asyncio.create_task(self._run_loop(), name="retention-scheduler")
+        return self._task
+
+    async def stop(self) -> None:
+        if not self._task:
+            return
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def _run_loop(self) -> None:
+        while True:
+            try:
+                await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # pragma: no cover - 예방적 로그
+                log.error("배경 태스크 오류: %r", exc)
+            await asyncio.sleep(self._check_interval)
+
+    async def _tick(self) -> None:
+        window = post_idle.quiet_window_start(time.time(), tz=self._timezone)
+        if window is None:
+            return
+        # 조용한 시간대마다 한 번만 실행 (자정을 넘는 시간대도 시작 시각이 같으면 같은 회차)
+        key = window.isoformat()
+        if self._last_run_window == key:
+            return
+        await self.run_once()
+        self._last_run_window = key
+
+    async def run_once(self) -> Dict[str, float]:
+        """모든 채팅방에 각자의 정책을 적용하고 정리 건수/소요 시간을 보고합니다.
+
+        샤딩을 쓰면 샤드를 하나씩 정리하므로, 정리 중인 샤드 외에는 쓰기가 막히지 않습니다.
+        """
+        started = time.perf_counter()
+        deleted = 0
+        for shard in range(store.shard_count()):
+            deleted += await self._prune_shard(shard)
+        ledger_deleted = await self._prune_ledger()
+
+        elapsed = time.perf_counter() - started
+        RETENTION_RUN_SECONDS.observe(elapsed)
+        self.last_report = {
+            "deleted": deleted,
+            "ledger_deleted": ledger_deleted,
+            "seconds": elapsed,
+            "finished_at": time.time(),
+        }
+        log.info(
+            "보존 정책 적용: %d건 정리, 원장 %d건 정리, %.2fs",
+            deleted,
+            ledger_deleted,
+            elapsed,
+            extra={"deleted": deleted, "ledger_deleted": ledger_deleted},
+        )
+        return self.last_report
+
+    async def _prune_shard(self, shard: int) -> int:
+        # 채팅방 목록은 한 번만 읽고, 채팅방마다 인덱스 구간만 읽는 배치 삭제를 반복합니다.
+        deleted = 0
+        for chat_id, keep, days in await store.run_read(store.get_chat_policies, shard):
+            deleted += await prune_chat(chat_id, keep, days, self._batch_size, self._batch_pause)
+
+        # 삭제로 생긴 빈 페이지는 조금씩 반환
+        free_pages = await store.run_shard_write(shard, store.incremental_vacuum, self._vacuum_pages, shard=shard)
+        while free_pages > 0:
+            await asyncio.sleep(self._batch_pause)
+            remaining = await store.run_shard_write(
+                shard, store.incremental_vacuum, self._vacuum_pages, shard=shard
+            )
+            if remaining >= free_pages:  # auto_vacuum이 꺼진 DB 등 더 줄지 않는 경우
+                break
+            free_pages = remaining
+        return deleted
+
+    async def _prune_ledger(self) -> int:
+        """LEDGER_RETAIN_DAYS보다 오래된 호출별 원장 행을 지웁니다 (시간별 롤업은 남김)."""
+        if quota.LEDGER_RETAIN_DAYS <= 0:
+            return 0
+        before = int(time.time()) - quota.LEDGER_RETAIN_DAYS * 86400
+        deleted = 0
+        while True:
+            # 원장 쓰기(ledger.py)와 같은 writer 스레드에서 순서대로 실행
+            n = await store.run_write(quota.prune_llm_calls, before, LEDGER_PRUNE_BATCH_SIZE)
+            deleted += n
+            RETENTION_DELETED.inc(n, kind="ledger")
+            if n < LEDGER_PRUNE_BATCH_SIZE:
+                return deleted
+            await asyncio.sleep(self._batch_pause)
+
+
+    def report(self) -> str:
+        """/botset perf에 붙일 마지막 회차 요약."""
+        if not self.last_report:
+            return "보존 정책: 아직 실행 기록이 없어요."
+        r = self.last_report
+        finished = time.strftime("%Y-%m-%d %H:%M", time.localtime(r["finished_at"]))
+        return (
+            f"보존 정책 (마지막 실행 {finished}): 메시지 {int(r['deleted'])}건, "
+            f"원장 {int(r['ledger_deleted'])}건 정리, {r['seconds']:.1f}s"
+        )
+
+
+_scheduler: Optional[RetentionScheduler] = None
+
+
+def start_retention_task() -> RetentionScheduler:
+    global _scheduler
+    _scheduler = RetentionScheduler()
+    _scheduler.start()
+    return _scheduler
+
+
+def get_scheduler() -> Optional[RetentionScheduler]:
+    return _scheduler
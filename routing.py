@@ -0,0 +1,73 @@
+"""응답마다 모델, 출력 길이, 컨텍스트 예산을 고르는 라우팅.
+
+llm.agenerate_genai가 프롬프트를 만들기 전에 choose()로 경로를 정합니다:
+    - full : 기본 모델(llm.MODEL_NAME), 출력 300토큰, 컨텍스트 2000자. 멘션·답장·키워드 응답
+    - light: 가벼운 모델(LLM_LIGHT_MODEL), 출력 200토큰, 컨텍스트 1200자.
+             자동 끼어들기(idle), 한도 여유가 ROUTE_TIGHT_HEADROOM 미만인 채팅방,
+             기본 모델의 최근 p95가 ROUTE_LATENCY_BUDGET_SECONDS를 넘을 때의 키워드 응답
+    - lean : 가벼운 모델, 출력 120토큰, 컨텍스트 800자. 한도 여유가 ROUTE_CRITICAL_HEADROOM 미만
+한도 여유는 quota.quota_headroom()으로, 오늘 한도 중 가장 많이 쓴 것의 남은 비율입니다.
+직접 질문(mention/reply)은 지연 때문에 경로를 낮추지 않으므로 기본 모델의 지연 표본도 계속 갱신됩니다.
+
+결정은 llm_routes_total{route,reason}·llm_route_seconds{route} 지표, 호출 원장의 route 열,
+`/botset perf`의 경로별 합계(호출·토큰·평균 지연)로 비교합니다. LLM_ROUTING=0이면 항상 full입니다.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Optional, Tuple
+
+LLM_ROUTING = os.getenv("LLM_ROUTING", "1").strip().lower() not in ("0", "false", "no")
+LLM_LIGHT_MODEL = os.getenv("LLM_LIGHT_MODEL", "gemini-2.5-flash-lite")
+
+ROUTE_TIGHT_HEADROOM = 0.2          # 한도 여유가 이보다 적으면 light
+ROUTE_CRITICAL_HEADROOM = 0.05      # 이보다 적으면 lean
+ROUTE_LATENCY_BUDGET_SECONDS = 8.0  # 기본 모델 p95가 이보다 길면 키워드 응답은 light
+
+_DIRECT_TRIGGERS = ("mention", "reply")
+
+
+class Route:
+    """경로 하나의 모델과 출력·컨텍스트 크기."""
+
+    __slots__ = ("name", "model", "max_output_tokens", "budget_chars")
+
+    def __init__(self, name: str, model: str, max_output_tokens: int, budget_chars: int) -> None:
+        self.name = name
+        self.model = model
+        self.max_output_tokens = max_output_tokens
+        self.budget_chars = budget_chars
+
+    def __repr__(self) -> str:
+        return f"Route({self.name}, {self.model}, out={self.max_output_tokens}, ctx={self.budget_chars})"
+
+
+def build_routes(full_model: str) -> Tuple[Route, Route, Route]:
+    """(full, light, lean) 경로. full의 크기는 예전 고정 설정(출력 300토큰, 컨텍스트 2000자)과 같습니다."""
+    return (
+        Route("full", full_model, 300, 2000),
+        Route("light", LLM_LIGHT_MODEL, 200, 1200),
+        Route("lean", LLM_LIGHT_MODEL, 120, 800),
+    )
+
+
+def choose(
+    routes: Tuple[Route, Route, Route],
+    trigger: Optional[str],
+    headroom: Optional[float],
+    full_p95: Optional[float],
+) -> Tuple[Route, str]:
+    """(경로, 고른 이유)를 반환합니다. headroom·full_p95가 None이면 그 조건은 보지 않습니다."""
+    full, light, lean = routes
+    if not LLM_ROUTING:
+        return full, "disabled"
+    if headroom is not None and headroom < ROUTE_CRITICAL_HEADROOM:
+        return lean, "quota_critical"
+    if trigger == "idle":
+        return light, "idle"
+    if headroom is not None and headroom < ROUTE_TIGHT_HEADROOM:
+        return light, "quota_tight"
+    if trigger not in _DIRECT_TRIGGERS and full_p95 is not None and full_p95 > ROUTE_LATENCY_BUDGET_SECONDS:
+        return light, "slow"
+    return full, "default"
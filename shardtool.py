@@ -0,0 +1,101 @@
+"""기존 chat.db를 chat_id 해시 기준의 샤드 파일들로 나누는 도구.
+
+사용 예)
+    python shardtool.py split --shards 4
+    # 완료 후 .env에 CHAT_DB_SHARDS=4 를 추가하고 봇을 재시작하세요.
+
+원본 chat.db는 지우지 않으며, 대상 샤드 파일이 이미 있으면 중단합니다.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+from typing import List
+
+import store
+
+# 샤드로 옮길 테이블과 컬럼 (모두 chat_id 기준으로 나뉨)
+_TABLES = {
+    "messages": "id, chat_id, user_id, username, sender, text, ts",
+    "settings": "chat_id, window_minutes, memory_limit, keep_per_chat, retain_days",
+    "guidelines": "chat_id, guidetext, updated_by, updated_at",
+    "message_archive": "id, chat_id, day, first_ts, last_ts, count, data",
+}
+
+
+def split(src_path: str, shards: int) -> List[str]:
+    """src_path의 데이터를 shards개 파일로 복사하고 생성된 경로 목록을 반환합니다."""
+    if shards < 2:
+        raise ValueError("shards는 2 이상이어야 합니다.")
+    if not os.path.exists(src_path):
+        raise FileNotFoundError(src_path)
+
+    # 원본 스키마를 최신으로 맞춘 뒤 샤드 설정으로 전환
+    store.DB_PATH = src_path
+    store.SHARD_COUNT = 0
+    store.init_db()
+
+    store.SHARD_COUNT = shards
+    paths = [store.shard_path(i) for i in range(shards)]
+    existing = [p for p in paths if os.path.exists(p)]
+    if existing:
+        raise FileExistsError(f"이미 샤드 파일이 있어요: {', '.join(existing)}")
+    store.init_db()
+
+    for shard, path in enumerate(paths):
+        conn = sqlite3.connect(path)
+        try:
+            conn.create_function("shard_of", 1, store.shard_of, deterministic=True)
+            conn.execute("ATTACH DATABASE ? AS src", (src_path,))
+            for table, cols in _TABLES.items():
+                conn.execute(
+                    f"INSERT INTO main.{table}({cols}) SELECT {cols} FROM src.{table} WHERE shard_of(chat_id)=?",
+                    (shard,),
+                )
+            conn.commit()
+            conn.execute("DETACH DATABASE src")
+        finally:
+            conn.close()
+
+    _verify(src_path, paths)
+    return paths
+
+
+def _verify(src_path: str, paths: List[str]) -> None:
+    src = sqlite3.connect(src_path)
+    try:
+        for table in _TABLES:
+            expected = src.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            copied = 0
+            for path in paths:
+                conn = sqlite3.connect(path)
+                try:
+                    copied += conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                finally:
+                    conn.close()
+            print(f"[shard] {table}: {copied}/{expected}행")
+            if copied != expected:
+                raise RuntimeError(f"{table} 행 수가 맞지 않아요 ({copied} != {expected})")
+    finally:
+        src.close()
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_split = sub.add_parser("split", help="chat.db를 샤드 파일로 나눕니다")
+    p_split.add_argument("--shards", type=int, required=True)
+    p_split.add_argument("--src", default=store.DB_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == "split":
+        paths = split(args.src, args.shards)
+        print(f"[shard] 완료: {', '.join(paths)}")
+        print(f"[shard] .env에 CHAT_DB_SHARDS={args.shards} 를 설정한 뒤 봇을 재시작하세요.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,122 @@
+"""정상 종료(SIGTERM/SIGINT) 때 처리 중인 작업을 마무리하는 순서와 기한.
+
+run_bot의 finally가 아래 순서로 진행하며, 전체를 SHUTDOWN_TIMEOUT_SECONDS 안에 끝내려고 합니다.
+    1. 업데이트 수신 중단: 폴링 종료(aiogram이 신호 처리) / 웹훅 서버 종료 / 워커 stdin 닫기
+    2. 새 작업을 만드는 배경 작업 중단: 자동 게시, 미리 읽기, 보존 정리
+    3. 처리 중인 업데이트(LLM 생성과 발신 큐 대기 포함)를 기한까지 기다리고, 남은 것은 취소
+    4. 모아 둔 쓰기 비우기: 호출 원장, 업데이트 기록, 상태 스냅샷, DB writer 스레드의 메시지·사용량 쓰기
+    5. SQLite WAL을 DB 파일에 옮기고 비우기 (wal_checkpoint(TRUNCATE))
+걸린 시간과 포기한 작업은 `[shutdown]` 로그로 남깁니다. systemd의 TimeoutStopSec(기본 90초)보다
+짧게 두세요.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import signal
+import time
+from contextlib import suppress
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import botlog
+
+SHUTDOWN_TIMEOUT_SECONDS = max(1.0, float(os.getenv("SHUTDOWN_TIMEOUT_SECONDS", "30") or 30))
+
+log = botlog.get_logger("shutdown")
+
+
+class InflightTracker:
+    """dp 바깥 미들웨어로 처리 중인 업데이트와 그 태스크를 추적합니다."""
+
+    def __init__(self) -> None:
+        self._tasks: Dict[asyncio.Task[Any], str] = {}
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.finished = 0
+
+    @property
+    def count(self) -> int:
+        return len(self._tasks)
+
+    async def middleware(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+        task = asyncio.current_task()
+        if task is None:  # pragma: no cover - 이벤트 루프 밖에서는 호출되지 않음
+            return await handler(event, data)
+        self._tasks[task] = f"{getattr(event, 'event_type', 'update')}#{getattr(event, 'update_id', '?')}"
+        self._idle.clear()
+        try:
+            return await handler(event, data)
+        finally:
+            self._tasks.pop(task, None)
+            self.finished += 1
+            if not self._tasks:
+                self._idle.set()
+
+    async def drain(self, timeout: float) -> List[str]:
+        """처리 중인 업데이트가 끝나기를 timeout초까지 기다리고, 남은 것은 취소해 그 목록을 반환합니다."""
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self._idle.wait(), max(0.0, timeout))
+        abandoned = list(self._tasks.items())
+        for task, _desc in abandoned:
+            task.cancel()
+        if abandoned:
+            await asyncio.gather(*(task for task, _desc in abandoned), return_exceptions=True)
+        return [desc for _task, desc in abandoned]
+
+
+class Deadline:
+    """종료 시작 시각과 남은 시간. 단계마다 remaining()만큼만 기다립니다."""
+
+    def __init__(self, seconds: float = SHUTDOWN_TIMEOUT_SECONDS) -> None:
+        self.started = time.perf_counter()
+        self._seconds = seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def remaining(self) -> float:
+        return max(0.0, self._seconds - self.elapsed())
+
+
+def install_stop_signals(stop: asyncio.Event) -> None:
+    """SIGTERM/SIGINT를 받으면 stop을 세웁니다 (aiogram 폴링을 쓰지 않는 웹훅 모드용)."""
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        with suppress(NotImplementedError):  # Windows
+            loop.add_signal_handler(sig, _on_signal, sig, stop)
+
+
+def _on_signal(sig: signal.Signals, stop: asyncio.Event) -> None:
+    log.warning("%s 신호를 받아 종료를 시작해요.", sig.name)
+    stop.set()
+
+
+def report(deadline: Deadline, tracker: InflightTracker, abandoned: List[str], **extra: Any) -> None:
+    """종료에 걸린 시간과 포기한 작업을 남깁니다."""
+    elapsed = deadline.elapsed()
+    fields = {
+        "elapsed_ms": int(elapsed * 1000),
+        "completed": tracker.finished - len(abandoned),
+        "abandoned": len(abandoned),
+        **extra,
+    }
+    if abandoned:
+        log.warning("종료 완료 (%.2fs), 기한을 넘겨 취소한 업데이트: %s", elapsed, ", ".join(abandoned[:20]), extra=fields)
+    else:
+        log.info("종료 완료 (%.2fs)", elapsed, extra=fields)
+
+
+_tracker: Optional[InflightTracker] = None
+
+
+def get_tracker() -> InflightTracker:
+    global _tracker
+    if _tracker is None:
+        _tracker = InflightTracker()
+    return _tracker
@@ -0,0 +1,131 @@
+"""프로세스 시작부터 업데이트를 받을 준비가 될 때까지의 단계별 소요 시간.
+
+main.py가 단계가 끝날 때마다 mark()로 표시합니다:
+    imports(인터프리터 시작~모듈 import) → init_db → bots(Bot 생성) → tasks(백그라운드 작업 시작)
+    → 준비 단계 ready(): first_poll(첫 getUpdates 요청) / webhook(웹훅 서버 시작) / worker(워커 입력 대기)
+시작 시각은 /proc/self/stat의 프로세스 시작 시각을 쓰므로 인터프리터 기동과 import 시간도 포함됩니다
+(리눅스가 아니면 이 모듈을 import한 시각). 준비까지 STARTUP_BUDGET_SECONDS를 넘기면 경고합니다.
+첫 업데이트는 사람이 메시지를 보낼 때까지 기다린 시간이 섞이지 않도록, 받은 때부터 처리가 끝날 때까지만
+bot_first_update_seconds로 따로 잽니다.
+import 단계를 모듈별로 나눠 보려면 benchmarks/startup_report.py를 쓰세요.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import botlog
+import metrics
+
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "10") or 10)
+
+log = botlog.get_logger("startup")
+
+STARTUP_SECONDS = metrics.histogram(
+    "bot_startup_phase_seconds",
+    "시작 단계별 소요 시간 (total은 프로세스 시작부터 업데이트 수신 준비까지)",
+    ("phase",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60),
+)
+FIRST_UPDATE_SECONDS = metrics.histogram(
+    "bot_first_update_seconds",
+    "시작 후 첫 업데이트를 받은 때부터 처리를 마칠 때까지 (google-genai 첫 import 등 지연 초기화 포함)",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60),
+)
+
+
+def _process_age() -> Optional[float]:
+    """프로세스가 시작된 지 몇 초 지났는지. /proc이 없으면 None."""
+    try:
+        with open("/proc/self/stat", "rb") as fp:
+            # comm 필드에 공백이 있을 수 있어 마지막 ')' 뒤부터 셉니다. starttime은 22번째 필드.
+            fields = fp.read().rsplit(b")", 1)[1].split()
+        with open("/proc/uptime", "rb") as fp:
+            uptime = float(fp.read().split()[0])
+        return max(0.0, uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+_started = time.perf_counter() - (_process_age() or 0.0)
+_last = _started
+_phases: List[Tuple[str, float]] = []
+_ready_logged = False
+_ready_event = asyncio.Event()
+_first_update_done = False
+
+
+def mark(phase: str) -> float:
+    """직전 표시부터 지금까지를 phase 단계로 기록하고 그 시간을 반환합니다."""
+    global _last
+    now = time.perf_counter()
+    seconds = now - _last
+    _last = now
+    _phases.append((phase, seconds))
+    STARTUP_SECONDS.observe(seconds, phase=phase)
+    return seconds
+
+
+def phases() -> List[Tuple[str, float]]:
+    return list(_phases)
+
+
+def summary() -> str:
+    """'imports 2.91s, init_db 0.01s, ... (합계 3.20s / 예산 10s)' 형태의 한 줄 요약."""
+    parts = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in _phases)
+    return f"{parts or '-'} (합계 {_last - _started:.2f}s / 예산 {STARTUP_BUDGET_SECONDS:g}s)"
+
+
+def ready(phase: str) -> None:
+    """업데이트를 받을 준비가 된 단계(첫 getUpdates, 웹훅 서버 시작 등)를 한 번만 기록하고 예산과 비교합니다."""
+    global _ready_logged
+    if _ready_logged:
+        return
+    _ready_logged = True
+    _ready_event.set()
+    mark(phase)
+    total = _last - _started
+    STARTUP_SECONDS.observe(total, phase="total")
+    if total > STARTUP_BUDGET_SECONDS:
+        log.warning("업데이트 수신 준비까지 %.2fs로 예산을 넘었어요: %s", total, summary())
+    else:
+        log.info("업데이트 수신 준비: %s", summary())
+
+
+async def wait_ready() -> None:
+    """업데이트를 받을 준비가 될 때까지 기다립니다. 시작을 늦추면 안 되는 준비 작업(WarmUp 등)이 씁니다."""
+    await _ready_event.wait()
+
+
+async def first_poll_middleware(
+    make_request: Callable[[Any, Any], Awaitable[Any]],
+    bot: Any,
+    method: Any,
+) -> Any:
+    """Bot 세션 요청 미들웨어. 첫 getUpdates 요청을 보낼 때 first_poll을 기록하고 스스로 빠집니다."""
+    if type(method).__name__ == "GetUpdates":
+        ready("first_poll")
+        if first_poll_middleware in bot.session.middleware:  # 여러 봇이 세션을 공유할 수 있음
+            bot.session.middleware.unregister(first_poll_middleware)
+    return await make_request(bot, method)
+
+
+async def first_update_middleware(
+    handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+    event: Any,
+    data: Dict[str, Any],
+) -> Any:
+    """dp 바깥 미들웨어. 첫 업데이트를 받은 때부터 처리가 끝날 때까지의 시간을 기록합니다."""
+    global _first_update_done
+    received = time.perf_counter()
+    try:
+        return await handler(event, data)
+    finally:
+        if not _first_update_done:
+            _first_update_done = True
+            seconds = time.perf_counter() - received
+            FIRST_UPDATE_SECONDS.observe(seconds)
+            log.info("첫 업데이트 처리 %.2fs (받은 때부터)", seconds)
@@ -0,0 +1,606 @@
+"""저장소 백엔드 인터페이스와 구현 선택.
+
+기본값은 SQLite 파일 백엔드(store.py / quota.py 그대로)이며,
+STORAGE_BACKEND=memory로 실행하면 모든 메시지/설정/지침/사용량을 프로세스 메모리에만
+보관하는 MemoryBackend를 사용합니다 (테스트/부하 측정용, 재시작하면 사라짐).
+
+store.py, quota.py의 공개 함수는 @backend_method로 감싸져 있어,
+SQLite가 아닌 백엔드가 활성화되면 같은 이름(앞의 밑줄 제외)의 메서드로 호출이 넘어갑니다.
+"""
+
+from __future__ import annotations
+
+import bisect
+import functools
+import importlib
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, TypeVar
+
+import metrics
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+STORAGE_BACKEND = (os.getenv("STORAGE_BACKEND", "sqlite") or "sqlite").strip().lower()
+
+_DEFAULT_SETTINGS = (60, 10, 100, 3)  # window_minutes, memory_limit, keep_per_chat, retain_days
+
+
+class StorageBackend(ABC):
+    """메시지·설정·지침·사용량 저장소가 제공해야 하는 연산 목록.
+
+    모든 연산이 추상 메서드라, 하나라도 빠진 백엔드는 첫 호출이 아니라 생성할 때 TypeError가 납니다.
+    """
+
+    name = "base"
+
+    # --- 스키마 / 유지보수 ---
+    @abstractmethod
+    def init_db(self, shard: Optional[int] = None) -> None:
+        ...
+
+    @abstractmethod
+    def reset_db(self, shard: Optional[int] = None) -> None:
+        ...
+
+    @abstractmethod
+    def vacuum(self, shard: Optional[int] = None) -> None:
+        ...
+
+    @abstractmethod
+    def incremental_vacuum(self, pages: int = 200, shard: Optional[int] = None) -> int:
+        ...
+
+    @abstractmethod
+    def checkpoint_wal(self, shard: Optional[int] = None) -> int:
+        ...
+
+    # --- 메시지 ---
+    @abstractmethod
+    def save_message(
+        self,
+        chat_id: int,
+        user_id: Optional[int],
+        username: Optional[str],
+        sender: str,
+        text: str,
+        ts: Optional[int] = None,
+        message_id: Optional[int] = None,
+        bot_key: Optional[str] = None,
+    ) -> None:
+        ...
+
+    @abstractmethod
+    def get_recent_messages(
+        self, chat_id: int, minutes: int, limit: int, bot_key: Optional[str] = None
+    ) -> List[Tuple[int, str, str, int]]:
+        ...
+
+    @abstractmethod
+    def get_messages_before(self, chat_id: int, before_ts: int, limit: int = 200) -> List[Tuple[int, str, str, int]]:
+        ...
+
+    @abstractmethod
+    def get_last_message(self, chat_id: int) -> Optional[Tuple[str, str, int]]:
+        ...
+
+    # --- 보존 정책 / 아카이브 ---
+    @abstractmethod
+    def cleanup_keep_recent_per_chat(self, keep: int, batch_size: int = 5000, archive: bool = True, shard: Optional[int] = None) -> int:
+        ...
+
+    @abstractmethod
+    def get_chat_policies(self, shard: Optional[int] = None) -> List[Tuple[int, int, int]]:
+        ...
+
+    @abstractmethod
+    def prune_by_policy(self, batch_size: int = 500, archive: bool = True, shard: Optional[int] = None) -> int:
+        ...
+
+    @abstractmethod
+    def prune_chat_messages(self, chat_id: int, keep: int, days: int, batch_size: int = 500, archive: bool = True) -> int:
+        ...
+
+    @abstractmethod
+    def cleanup_old_messages(self, days: int, batch_size: int = 5000, archive: bool = True, shard: Optional[int] = None) -> int:
+        ...
+
+    @abstractmethod
+    def iter_archived_messages(self, chat_id: int, since_ts: Optional[int] = None, until_ts: Optional[int] = None) -> Iterator[Tuple[int, str, str, int]]:
+        ...
+
+    @abstractmethod
+    def get_archive_stats(self, chat_id: Optional[int] = None) -> Tuple[int, int, int]:
+        ...
+
+    # --- 설정 / 지침 ---
+    @abstractmethod
+    def get_memory_config(self, chat_id: int) -> Tuple[int, int, int, int]:
+        ...
+
+    @abstractmethod
+    def set_memory_config(self, chat_id: int, **fields: Optional[int]) -> None:
+        ...
+
+    @abstractmethod
+    def set_guidelines(self, chat_id: int, text: str, updated_by: int | None = None) -> None:
+        ...
+
+    @abstractmethod
+    def get_guidelines(self, chat_id: int) -> str:
+        ...
+
+    @abstractmethod
+    def clear_guidelines(self, chat_id: int) -> None:
+        ...
+
+    # --- 사용량 / 한도 (quota.py) ---
+    @abstractmethod
+    def get_overrides(self) -> Dict[str, int]:
+        ...
+
+    @abstractmethod
+    def store_limit(self, key: str, value: int) -> None:
+        ...
+
+    @abstractmethod
+    def reset_limits(self) -> None:
+        ...
+
+    @abstractmethod
+    def get_usage_summary_today(self) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def reset_usage(self, scope: str = "today") -> None:
+        ...
+
+    @abstractmethod
+    def add_usage(self, chat_id: int, input_chars: int, output_tokens: int) -> None:
+        ...
+
+    @abstractmethod
+    def fetch_usage_snapshot(self, chat_id: int) -> Tuple[Tuple[int, int, int], Tuple[int, int, int]]:
+        ...
+
+    @abstractmethod
+    def reserve_usage(
+        self, chat_id: int, input_chars: int, output_tokens: int, limits: Dict[str, int], day: Optional[str] = None
+    ) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def release_usage(self, chat_id: int, input_chars: int, output_tokens: int, day: Optional[str] = None) -> None:
+        ...
+
+    # --- LLM 호출 원장 (quota.py) ---
+    @abstractmethod
+    def write_llm_calls(self, entries: List[Dict[str, Any]]) -> None:
+        ...
+
+    @abstractmethod
+    def get_llm_rollups(self, since_ts: int, until_ts: int, top: int = 5) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def checkpoint_usage_wal(self) -> int:
+        ...
+
+    @abstractmethod
+    def prune_llm_calls(self, before_ts: int, batch_size: int = 5000) -> int:
+        ...
+
+
+def _sqlite_method(module_name: str, func_name: str) -> Callable[..., Any]:
+    def method(self: "SQLiteBackend", *args: Any, **kwargs: Any) -> Any:
+        func = getattr(importlib.import_module(module_name), func_name)
+        return getattr(func, "__wrapped__", func)(*args, **kwargs)
+
+    method.__name__ = func_name.lstrip("_")
+    return method
+
+
+class SQLiteBackend(StorageBackend):
+    """store.py / quota.py의 SQLite 파일 구현을 그대로 호출하는 백엔드."""
+
+    name = "sqlite"
+
+    init_db = _sqlite_method("store", "init_db")
+    reset_db = _sqlite_method("store", "reset_db")
+    vacuum = _sqlite_method("store", "vacuum")
+    incremental_vacuum = _sqlite_method("store", "incremental_vacuum")
+    checkpoint_wal = _sqlite_method("store", "checkpoint_wal")
+    save_message = _sqlite_method("store", "save_message")
+    get_recent_messages = _sqlite_method("store", "get_recent_messages")
+    get_messages_before = _sqlite_method("store", "get_messages_before")
+    get_last_message = _sqlite_method("store", "get_last_message")
+    cleanup_keep_recent_per_chat = _sqlite_method("store", "cleanup_keep_recent_per_chat")
+    get_chat_policies = _sqlite_method("store", "get_chat_policies")
+    prune_by_policy = _sqlite_method("store", "prune_by_policy")
+    prune_chat_messages = _sqlite_method("store", "prune_chat_messages")
+    cleanup_old_messages = _sqlite_method("store", "cleanup_old_messages")
+    iter_archived_messages = _sqlite_method("store", "iter_archived_messages")
+    get_archive_stats = _sqlite_method("store", "get_archive_stats")
+    get_memory_config = _sqlite_method("store", "get_memory_config")
+    set_memory_config = _sqlite_method("store", "set_memory_config")
+    set_guidelines = _sqlite_method("store", "set_guidelines")
+    get_guidelines = _sqlite_method("store", "get_guidelines")
+    clear_guidelines = _sqlite_method("store", "clear_guidelines")
+    get_overrides = _sqlite_method("quota", "_get_overrides")
+    store_limit = _sqlite_method("quota", "_store_limit")
+    reset_limits = _sqlite_method("quota", "reset_limits")
+    get_usage_summary_today = _sqlite_method("quota", "get_usage_summary_today")
+    reset_usage = _sqlite_method("quota", "reset_usage")
+    add_usage = _sqlite_method("quota", "add_usage")
+    fetch_usage_snapshot = _sqlite_method("quota", "_fetch_usage_snapshot")
+    reserve_usage = _sqlite_method("quota", "_reserve_usage")
+    release_usage = _sqlite_method("quota", "_release_usage")
+    write_llm_calls = _sqlite_method("quota", "write_llm_calls")
+    checkpoint_usage_wal = _sqlite_method("quota", "checkpoint_usage_wal")
+    prune_llm_calls = _sqlite_method("quota", "prune_llm_calls")
+    get_llm_rollups = _sqlite_method("quota", "get_llm_rollups")
+
+
+# (ts, id, user_id, username, sender, text, bot_key, message_id)
+_MemoryRow = Tuple[int, int, Optional[int], Optional[str], str, str, Optional[str], Optional[int]]
+
+
+class MemoryBackend(StorageBackend):
+    """모든 데이터를 딕셔너리에만 두는 백엔드. 스레드 안전하며 아카이브는 지원하지 않습니다."""
+
+    name = "memory"
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset_db()
+        self._overrides: Dict[str, int] = {}
+        self._usage: Dict[Tuple[str, int], List[int]] = {}
+        self._usage_total: Dict[str, List[int]] = {}
+        self._llm_calls: List[Dict[str, Any]] = []
+        self._llm_rollup: Dict[Tuple[int, int], List[int]] = {}
+        self._llm_latency: Dict[Tuple[int, int], int] = {}
+        self._llm_routes: Dict[Tuple[int, str, str], List[int]] = {}
+
+    # --- 스키마 / 유지보수 ---
+    def init_db(self, shard: Optional[int] = None) -> None:
+        return None
+
+    def reset_db(self, shard: Optional[int] = None) -> None:
+        with self._lock:
+            # chat_id -> [_MemoryRow] (ts, id 오름차순)
+            self._messages: Dict[int, List[_MemoryRow]] = {}
+            self._message_ids: Dict[int, Set[int]] = {}  # chat_id -> 저장된 텔레그램 message_id (중복 저장 방지)
+            self._settings: Dict[int, List[int]] = {}
+            self._guidelines: Dict[int, str] = {}
+            self._next_id = 1
+
+    def vacuum(self, shard: Optional[int] = None) -> None:
+        return None
+
+    def incremental_vacuum(self, pages: int = 200, shard: Optional[int] = None) -> int:
+        return 0
+
+    def checkpoint_wal(self, shard: Optional[int] = None) -> int:
+        return 0
+
+    # --- 메시지 ---
+    def save_message(self, chat_id, user_id, username, sender, text, ts=None, message_id=None, bot_key=None) -> None:
+        ts = ts or int(time.time())
+        with self._lock:
+            if message_id is not None:
+                seen = self._message_ids.setdefault(chat_id, set())
+                if message_id in seen:
+                    return
+                seen.add(message_id)
+            row = (ts, self._next_id, user_id, username, sender, text, bot_key, message_id)
+            self._next_id += 1
+            rows = self._messages.setdefault(chat_id, [])
+            if not rows or rows[-1][:2] <= row[:2]:
+                rows.append(row)
+            else:
+                bisect.insort(rows, row, key=lambda r: r[:2])
+
+    def get_recent_messages(self, chat_id, minutes, limit, bot_key=None):
+        since = int(time.time()) - minutes * 60
+        with self._lock:
+            rows = self._messages.get(chat_id, [])
+            start = bisect.bisect_left(rows, since, key=lambda r: r[0])
+            if bot_key is not None:
+                rows = [r for r in rows[start:] if r[6] is None or r[6] == bot_key]
+                start = 0
+            picked = rows[max(start, len(rows) - limit):] if limit > 0 else []
+        return [(user_id, username or sender, text, ts) for ts, _id, user_id, username, sender, text, *_ in picked]
+
+    def get_messages_before(self, chat_id, before_ts, limit=200):
+        with self._lock:
+            rows = self._messages.get(chat_id, [])
+            end = bisect.bisect_left(rows, before_ts, key=lambda r: r[0])
+            picked = rows[max(0, end - limit):end] if limit > 0 else []
+        return [(user_id, username or sender, text, ts) for ts, _id, user_id, username, sender, text, *_ in picked]
+
+    def get_last_message(self, chat_id):
+        with self._lock:
+            rows = self._messages.get(chat_id)
+            if not rows:
+                return None
+            ts, _id, _user_id, _username, sender, text, *_ = rows[-1]
+        return sender or "", text or "", int(ts or 0)
+
+    # --- 보존 정책 / 아카이브 ---
+    def _evict_chat(self, chat_id: int, keep: int, days: int, budget: int) -> int:
+        rows = self._messages.get(chat_id, [])
+        excess = len(rows) - keep if keep > 0 else 0
+        if days > 0:
+            cutoff = int(time.time()) - days * 86400
+            excess = max(excess, bisect.bisect_left(rows, cutoff, key=lambda r: r[0]))
+        n = max(0, min(excess, budget))
+        if n:
+            seen = self._message_ids.get(chat_id)
+            if seen:
+                seen.difference_update(r[7] for r in rows[:n])
+            del rows[:n]
+        return n
+
+    def cleanup_keep_recent_per_chat(self, keep, batch_size=5000, archive=True, shard=None):
+        deleted = 0
+        with self._lock:
+            chat_ids = list(self._messages)
+        for cid in chat_ids:
+            while True:  # SQLite 백엔드처럼 batch_size개씩 (배치 사이에는 잠금을 놓음)
+                with self._lock:
+                    n = self._evict_chat(cid, keep, 0, batch_size)
+                deleted += n
+                if n < batch_size:
+                    break
+        return deleted
+
+    def get_chat_policies(self, shard=None):
+        with self._lock:
+            return [
+                (cid, *self._settings.get(cid, _DEFAULT_SETTINGS)[2:]) for cid, rows in self._messages.items() if rows
+            ]
+
+    def prune_by_policy(self, batch_size=500, archive=True, shard=None):
+        deleted = 0
+        with self._lock:
+            for cid in list(self._messages):
+                if deleted >= batch_size:
+                    break
+                _win, _lim, keep, days = self._settings.get(cid, _DEFAULT_SETTINGS)
+                deleted += self._evict_chat(cid, keep, days, batch_size - deleted)
+        return deleted
+
+    def prune_chat_messages(self, chat_id, keep, days, batch_size=500, archive=True):
+        with self._lock:
+            return self._evict_chat(chat_id, keep, days, batch_size)
+
+    def cleanup_old_messages(self, days, batch_size=5000, archive=True, shard=None):
+        with self._lock:
+            if days <= 0:
+                deleted = sum(len(rows) for rows in self._messages.values())
+                self._messages.clear()
+                self._message_ids.clear()
+                return deleted
+            return sum(self._evict_chat(cid, 0, days, 2**62) for cid in list(self._messages))
+
+    def iter_archived_messages(self, chat_id, since_ts=None, until_ts=None):
+        return iter(())
+
+    def get_archive_stats(self, chat_id=None):
+        return 0, 0, 0
+
+    # --- 설정 / 지침 ---
+    def get_memory_config(self, chat_id):
+        with self._lock:
+            return tuple(self._settings.get(chat_id, _DEFAULT_SETTINGS))  # type: ignore
+
+    def set_memory_config(self, chat_id, *, window_minutes=None, memory_limit=None, keep_per_chat=None, retain_days=None):
+        with self._lock:
+            row = self._settings.setdefault(chat_id, list(_DEFAULT_SETTINGS))
+            for i, val in enumerate((window_minutes, memory_limit, keep_per_chat, retain_days)):
+                if val is not None:
+                    row[i] = int(val)
+
+    def set_guidelines(self, chat_id, text, updated_by=None):
+        with self._lock:
+            if text.strip():
+                self._guidelines[chat_id] = text
+            else:
+                self._guidelines.pop(chat_id, None)
+
+    def get_guidelines(self, chat_id):
+        with self._lock:
+            return self._guidelines.get(chat_id, "")
+
+    def clear_guidelines(self, chat_id):
+        with self._lock:
+            self._guidelines.pop(chat_id, None)
+
+    # --- 사용량 / 한도 ---
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    def get_overrides(self):
+        with self._lock:
+            return dict(self._overrides)
+
+    def store_limit(self, key, value):
+        with self._lock:
+            self._overrides[key] = int(value)
+
+    def reset_limits(self):
+        with self._lock:
+            self._overrides.clear()
+
+    def get_usage_summary_today(self):
+        day = self._today()
+        with self._lock:
+            total = tuple(self._usage_total.get(day, (0, 0, 0)))
+            per_chats = [(cid, *vals) for (d, cid), vals in self._usage.items() if d == day]
+        per_chats.sort(key=lambda row: row[1], reverse=True)
+        return {"total": total, "per_chats": per_chats}
+
+    def reset_usage(self, scope="today"):
+        if scope not in ("today", "all"):
+            raise ValueError("scope must be 'today' or 'all'")
+        day = self._today()
+        with self._lock:
+            if scope == "all":
+                self._usage.clear()
+                self._usage_total.clear()
+            else:
+                self._usage = {k: v for k, v in self._usage.items() if k[0] != day}
+                self._usage_total.pop(day, None)
+
+    def add_usage(self, chat_id, input_chars, output_tokens):
+        with self._lock:
+            self._apply_usage(chat_id, 1, input_chars, output_tokens)
+
+    def _apply_usage(self, chat_id, calls, input_chars, output_tokens, day=None):
+        day = day or self._today()
+        for row in (self._usage.setdefault((day, chat_id), [0, 0, 0]), self._usage_total.setdefault(day, [0, 0, 0])):
+            row[0] += calls
+            row[1] += int(input_chars)
+            row[2] += int(output_tokens)
+
+    def fetch_usage_snapshot(self, chat_id):
+        day = self._today()
+        with self._lock:
+            total = tuple(self._usage_total.get(day, (0, 0, 0)))
+            per_chat = tuple(self._usage.get((day, chat_id), (0, 0, 0)))
+        return total, per_chat  # type: ignore
+
+    def reserve_usage(self, chat_id, input_chars, output_tokens, limits, day=None):
+        limit_message = importlib.import_module("quota")._limit_message
+        day = day or self._today()
+        with self._lock:
+            total = tuple(self._usage_total.get(day, (0, 0, 0)))
+            per_chat = tuple(self._usage.get((day, chat_id), (0, 0, 0)))
+            message = limit_message(limits, total, per_chat, input_chars, output_tokens)
+            if message is None:
+                self._apply_usage(chat_id, 1, input_chars, output_tokens, day)
+        return message
+
+    def release_usage(self, chat_id, input_chars, output_tokens, day=None):
+        with self._lock:
+            self._apply_usage(chat_id, -1, -int(input_chars), -int(output_tokens), day)
+
+    # --- LLM 호출 원장 ---
+    def write_llm_calls(self, entries):
+        quota = importlib.import_module("quota")
+        per_chat, latency = quota._rollup_entries(entries)
+        per_route = quota._rollup_routes(entries)
+        with self._lock:
+            self._llm_calls.extend(dict(e) for e in entries)
+            for key, vals in per_chat.items():
+                row = self._llm_rollup.setdefault(key, [0] * 7)
+                for i in range(6):
+                    row[i] += vals[i]
+                row[6] = max(row[6], vals[6])
+            for key, n in latency.items():
+                self._llm_latency[key] = self._llm_latency.get(key, 0) + n
+            for key, vals in per_route.items():
+                row = self._llm_routes.setdefault(key, [0] * 6)
+                for i in range(6):
+                    row[i] += vals[i]
+
+    def get_llm_rollups(self, since_ts, until_ts, top=5):
+        lo, hi = since_ts // 3600, (until_ts + 3599) // 3600
+        with self._lock:
+            rows = [(chat_id, vals) for (hour, chat_id), vals in self._llm_rollup.items() if lo <= hour < hi]
+            hist: Dict[int, int] = {}
+            for (hour, bucket), n in self._llm_latency.items():
+                if lo <= hour < hi:
+                    hist[bucket] = hist.get(bucket, 0) + n
+            routes: Dict[Tuple[str, str], List[int]] = {}
+            for (hour, route, model), vals in self._llm_routes.items():
+                if lo <= hour < hi:
+                    agg = routes.setdefault((route, model), [0] * 6)
+                    for i in range(6):
+                        agg[i] += vals[i]
+        totals = [0] * 7
+        chats: Dict[int, List[int]] = {}
+        for chat_id, vals in rows:
+            for i in range(6):
+                totals[i] += vals[i]
+            totals[6] = max(totals[6], vals[6])
+            agg = chats.setdefault(chat_id, [0, 0, 0])
+            agg[0] += vals[0]
+            agg[1] += vals[2]
+            agg[2] = max(agg[2], vals[6])
+        by_calls = sorted(((cid, a[0]) for cid, a in chats.items()), key=lambda r: r[1], reverse=True)[:top]
+        by_prompt = sorted(
+            ((cid, a[1] // a[0] if a[0] else 0, a[2]) for cid, a in chats.items()), key=lambda r: r[1], reverse=True
+        )[:top]
+        by_route = sorted(((*key, *vals) for key, vals in routes.items()), key=lambda r: r[2], reverse=True)
+        return {
+            "totals": tuple(totals),
+            "latency_hist": hist,
+            "top_calls": by_calls,
+            "top_prompt": by_prompt,
+            "by_route": by_route,
+        }
+
+    def prune_llm_calls(self, before_ts, batch_size=5000):
+        deleted = 0
+        kept: List[Dict[str, Any]] = []
+        with self._lock:
+            for entry in self._llm_calls:
+                if entry["ts"] < before_ts and deleted < batch_size:
+                    deleted += 1
+                else:
+                    kept.append(entry)
+            self._llm_calls = kept
+        return deleted
+
+    def checkpoint_usage_wal(self) -> int:
+        return 0
+
+
+_BACKENDS = {"sqlite": SQLiteBackend, "memory": MemoryBackend}
+
+# SQLite가 아닌 백엔드가 활성화된 경우에만 값이 있습니다 (None이면 store/quota의 SQLite 구현 사용).
+_active: Optional[StorageBackend] = None
+
+
+def create_backend(name: str) -> StorageBackend:
+    try:
+        return _BACKENDS[name.strip().lower()]()
+    except KeyError:
+        raise ValueError(f"알 수 없는 저장소 백엔드: {name!r} (가능: {', '.join(_BACKENDS)})") from None
+
+
+def use_backend(backend: StorageBackend | str) -> StorageBackend:
+    """사용할 백엔드를 바꿉니다. 이름('sqlite'/'memory') 또는 인스턴스를 받습니다."""
+    global _active
+    if isinstance(backend, str):
+        backend = create_backend(backend)
+    _active = None if isinstance(backend, SQLiteBackend) else backend
+    return backend
+
+
+def get_backend() -> StorageBackend:
+    return _active if _active is not None else SQLiteBackend()
+
+
+def backend_method(fn: F) -> F:
+    """SQLite 구현 함수를 감싸, 다른 백엔드가 활성화되면 같은 이름의 메서드로 넘깁니다."""
+    name = fn.__name__.lstrip("_")
+    label = f"{fn.__module__}.{fn.__name__}"
+
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        with metrics.STORE_SECONDS.time(function=label):
+            if _active is not None:
+                return getattr(_active, name)(*args, **kwargs)
+            return fn(*args, **kwargs)
+
+    return wrapper  # type: ignore[return-value]
+
+
+if STORAGE_BACKEND != "sqlite":
+    use_backend(STORAGE_BACKEND)
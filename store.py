@@ -1,11 +1,19 @@
 """SQLite-backed persistence helpers for the Telegram bot."""
 
+import asyncio
+import functools
+import json
 import os
 import sqlite3
 import time
-from typing import Any, List, Optional, Tuple
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
 
+import migrations
 import utils
+from storage import backend_method
 
 
 ### 기본 경로 / 상수
@@ -13,18 +21,66 @@ import utils
 DB_PATH = os.path.join(utils.mainpath, "chat.db")
 CHAT_DB_PATH = os.getenv("CHAT_DB_PATH", "chat.db")
 
+DEFAULT_WINDOW_MINUTES = 60
+DEFAULT_MEMORY_LIMIT = 10
+DEFAULT_KEEP_PER_CHAT = 100
+DEFAULT_RETAIN_DAYS = 3
+
+# 보존 기간이 지난 메시지를 지우지 않고 압축 아카이브로 옮길지 여부
+ARCHIVE_ENABLED = os.getenv("CHAT_ARCHIVE_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+ARCHIVE_COMPRESS_LEVEL = 6
+ARCHIVE_TIMEZONE = timezone(timedelta(hours=9))  # 날짜 블록 기준 (한국 표준시)
+
+# 2 이상이면 채팅방을 chat_id 해시로 N개의 DB 파일(chat.shard0.db ...)에 나눠 저장합니다.
+# 기존 chat.db를 나누려면 shardtool.py split을 먼저 실행하세요.
+SHARD_COUNT = max(0, int(os.getenv("CHAT_DB_SHARDS", "0") or 0))
+
 
 
 ### 내부 헬퍼
 
-def get_conn() -> sqlite3.Connection:
-    """공통 PRAGMA가 적용된 데이터베이스 커넥션을 생성합니다."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA journal_mode=WAL")
+def shard_count() -> int:
+    """DB 파일 개수 (샤딩을 쓰지 않으면 1)."""
+    return SHARD_COUNT if SHARD_COUNT > 1 else 1
+
+
+def shard_of(chat_id: int) -> int:
+    """chat_id가 속한 샤드 번호. 프로세스/실행마다 같은 값이 나오도록 crc32를 씁니다."""
+    n = shard_count()
+    if n == 1:
+        return 0
+    return zlib.crc32(str(int(chat_id)).encode("ascii")) % n
+
+
+def shard_path(shard: int) -> str:
+    if shard_count() == 1:
+        return DB_PATH
+    root, ext = os.path.splitext(DB_PATH)
+    return f"{root}.shard{shard}{ext or '.db'}"
+
+
+def _shard_ids(shard: Optional[int] = None) -> List[int]:
+    """shard를 지정하면 그 샤드만, 아니면 전체 샤드 번호 목록."""
+    return [shard] if shard is not None else list(range(shard_count()))
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
     conn.execute("PRAGMA foreign_keys=ON")
     return conn
 
 
+def get_conn(chat_id: Optional[int] = None, *, shard: Optional[int] = None) -> sqlite3.Connection:
+    """공통 PRAGMA가 적용된 커넥션을 생성합니다.
+
+    chat_id를 주면 그 채팅방의 샤드로, shard를 주면 해당 샤드로 연결합니다.
+    둘 다 없으면 0번 샤드(샤딩 미사용 시 chat.db)입니다.
+    """
+    if shard is None:
+        shard = shard_of(chat_id) if chat_id is not None else 0
+    return _connect(shard_path(shard))
+
+
 def _rowcount(cursor: sqlite3.Cursor) -> int:
     """sqlite3에서 rowcount가 -1일 수 있는 문제를 보완합니다."""
     try:
@@ -36,108 +92,201 @@ def _rowcount(cursor: sqlite3.Cursor) -> int:
 
 ### 스키마 초기화 / 마이그레이션
 
-def init_db() -> None:
-    """필요한 모든 테이블과 누락된 컬럼을 생성합니다."""
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = get_conn()
-    try:
-        c = conn.cursor()
-
-        # 메시지 테이블
-        c.execute(
-            """
-            CREATE TABLE IF NOT EXISTS messages(
-                id       INTEGER PRIMARY KEY AUTOINCREMENT,
-                chat_id  INTEGER NOT NULL,
-                user_id  INTEGER,
-                username TEXT,
-                sender   TEXT,
-                text     TEXT,
-                ts       INTEGER
-            )
-            """
+def _migrate_v1_base(conn: sqlite3.Connection) -> None:
+    """기본 테이블을 만들고, 버전 관리 이전에 생성된 DB의 누락 컬럼을 채웁니다."""
+    conn.execute("PRAGMA journal_mode=WAL")  # DB 파일에 영구 저장되는 설정
+    c = conn.cursor()
+
+    # 메시지 테이블
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS messages(
+            id       INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id  INTEGER NOT NULL,
+            user_id  INTEGER,
+            username TEXT,
+            sender   TEXT,
+            text     TEXT,
+            ts       INTEGER
         )
+        """
+    )
 
-        c.execute("PRAGMA table_info(messages)")
-        message_columns = {row[1] for row in c.fetchall()}
-        if "sender" not in message_columns:
-            c.execute("ALTER TABLE messages ADD COLUMN sender TEXT")
-            c.execute(
-                """
-                UPDATE messages
-                   SET sender = CASE
-                     WHEN user_id IS NULL THEN 'bot'
-                     ELSE 'user'
-                   END
-                """
-            )
-
-        # 설정 테이블 (기본값 포함)
-
+    c.execute("PRAGMA table_info(messages)")
+    message_columns = {row[1] for row in c.fetchall()}
+    if "sender" not in message_columns:
+        c.execute("ALTER TABLE messages ADD COLUMN sender TEXT")
         c.execute(
             """
-            CREATE TABLE IF NOT EXISTS settings(
-                chat_id        INTEGER PRIMARY KEY,
-                window_minutes INTEGER DEFAULT 60,
-                memory_limit   INTEGER DEFAULT 10,
-                keep_per_chat  INTEGER DEFAULT 100,
-                retain_days    INTEGER DEFAULT 3
-            )
+            UPDATE messages
+               SET sender = CASE
+                 WHEN user_id IS NULL THEN 'bot'
+                 ELSE 'user'
+               END
             """
         )
 
-        for col, decl in [
-            ("window_minutes", "INTEGER DEFAULT 60"),
-            ("memory_limit", "INTEGER DEFAULT 10"),
-            ("keep_per_chat", "INTEGER DEFAULT 100"),
-            ("retain_days", "INTEGER DEFAULT 3"),
-        ]:
-            try:
-                c.execute(f"ALTER TABLE settings ADD COLUMN {col} {decl}")
-            except sqlite3.OperationalError:
-                pass
-
-        # 커스텀 지침 테이블
+    # 설정 테이블 (기본값 포함)
 
-        c.execute(
-            """
-            CREATE TABLE IF NOT EXISTS guidelines(
-                chat_id    INTEGER PRIMARY KEY,
-                guidetext  TEXT,
-                updated_by INTEGER,
-                updated_at INTEGER
-            )
-            """
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS settings(
+            chat_id        INTEGER PRIMARY KEY,
+            window_minutes INTEGER DEFAULT 60,
+            memory_limit   INTEGER DEFAULT 10,
+            keep_per_chat  INTEGER DEFAULT 100,
+            retain_days    INTEGER DEFAULT 3
         )
-
-        c.execute("PRAGMA table_info(guidelines)")
-        guideline_columns = {row[1] for row in c.fetchall()}
-        if "updated_by" not in guideline_columns:
-            c.execute("ALTER TABLE guidelines ADD COLUMN updated_by INTEGER")
-        if "updated_at" not in guideline_columns:
-            c.execute("ALTER TABLE guidelines ADD COLUMN updated_at INTEGER")
-
-        c.execute(
-            """CREATE INDEX IF NOT EXISTS idx_messages_chat_ts
-                   ON messages(chat_id, ts)"""
+        """
+    )
+
+    for col, decl in [
+        ("window_minutes", "INTEGER DEFAULT 60"),
+        ("memory_limit", "INTEGER DEFAULT 10"),
+        ("keep_per_chat", "INTEGER DEFAULT 100"),
+        ("retain_days", "INTEGER DEFAULT 3"),
+    ]:
+        try:
+            c.execute(f"ALTER TABLE settings ADD COLUMN {col} {decl}")
+        except sqlite3.OperationalError:
+            pass
+
+    # 커스텀 지침 테이블
+
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS guidelines(
+            chat_id    INTEGER PRIMARY KEY,
+            guidetext  TEXT,
+            updated_by INTEGER,
+            updated_at INTEGER
         )
-
-        conn.commit()
-    finally:
-        conn.close()
+        """
+    )
+
+    c.execute("PRAGMA table_info(guidelines)")
+    guideline_columns = {row[1] for row in c.fetchall()}
+    if "updated_by" not in guideline_columns:
+        c.execute("ALTER TABLE guidelines ADD COLUMN updated_by INTEGER")
+    if "updated_at" not in guideline_columns:
+        c.execute("ALTER TABLE guidelines ADD COLUMN updated_at INTEGER")
+
+    c.execute(
+        """CREATE INDEX IF NOT EXISTS idx_messages_chat_ts
+               ON messages(chat_id, ts)"""
+    )
+
+
+def _migrate_v2_incremental_vacuum(conn: sqlite3.Connection) -> None:
+    """빈 페이지를 조금씩 반환할 수 있도록 auto_vacuum=INCREMENTAL로 전환합니다."""
+    # 이미 만들어진 DB는 VACUUM을 한 번 거쳐야 모드가 바뀝니다.
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
 
 
-def _ensure_settings_row(chat_id: int) -> None:
-    """settings 테이블에 해당 chat_id 행이 없으면 생성합니다."""
-    conn = get_conn()
-    try:
-        c = conn.cursor()
-        c.execute("SELECT chat_id FROM settings WHERE chat_id=?", (chat_id,))
-        if not c.fetchone():
-            c.execute("INSERT INTO settings(chat_id) VALUES(?)", (chat_id,))
-            conn.commit()
-    finally:
-        conn.close()
+def _migrate_v3_archive(conn: sqlite3.Connection) -> None:
+    """아카이브 테이블 (채팅방·날짜별 zlib 압축 JSON lines 블록)을 만듭니다."""
+    c = conn.cursor()
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS message_archive(
+            id       INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id  INTEGER NOT NULL,
+            day      TEXT NOT NULL,
+            first_ts INTEGER,
+            last_ts  INTEGER,
+            count    INTEGER,
+            data     BLOB NOT NULL
+        )
+        """
+    )
+    c.execute(
+        """CREATE INDEX IF NOT EXISTS idx_archive_chat_ts
+               ON message_archive(chat_id, first_ts)"""
+    )
+
+
+def _migrate_v4_covering_index(conn: sqlite3.Connection) -> None:
+    """읽기 경로 전용 커버링 인덱스로 교체합니다.
+
+    (chat_id, ts DESC, id DESC) 순서라 ORDER BY가 인덱스 순서와 같고,
+    읽는 컬럼을 모두 담고 있어 테이블 본문을 다시 찾지 않습니다.
+    """
+    conn.execute(
+        """CREATE INDEX IF NOT EXISTS idx_messages_chat_recent
+               ON messages(chat_id, ts DESC, id DESC, user_id, username, sender, text)"""
+    )
+    conn.execute("DROP INDEX IF EXISTS idx_messages_chat_ts")
+
+
+def _migrate_v5_archive_day_blocks(conn: sqlite3.Connection) -> None:
+    """아카이브를 (chat_id, day)마다 블록 하나로 합치고 UNIQUE 인덱스로 유지합니다."""
+    c = conn.cursor()
+    dupes = c.execute(
+        "SELECT chat_id, day FROM message_archive GROUP BY chat_id, day HAVING COUNT(*) > 1"
+    ).fetchall()
+    for chat_id, day in dupes:
+        lines: List[str] = []
+        for (data,) in c.execute(
+            "SELECT data FROM message_archive WHERE chat_id=? AND day=?", (chat_id, day)
+        ).fetchall():
+            lines.extend(zlib.decompress(data).decode("utf-8").splitlines())
+        c.execute("DELETE FROM message_archive WHERE chat_id=? AND day=?", (chat_id, day))
+        _insert_archive_block(c, chat_id, day, lines)
+    c.execute(
+        """CREATE UNIQUE INDEX IF NOT EXISTS idx_archive_chat_day
+               ON message_archive(chat_id, day)"""
+    )
+
+
+def _migrate_v6_tenant_messages(conn: sqlite3.Connection) -> None:
+    """여러 봇(tenants.py)이 한 DB를 쓸 때를 위한 컬럼을 더합니다.
+
+    message_id: 그룹 메시지의 텔레그램 id. 같은 그룹의 봇들이 같은 사용자 메시지를 받아도 (chat_id, message_id)로
+                한 번만 저장. 개인 채팅은 봇마다 id를 따로 매기므로 NULL.
+    bot_key   : 봇 응답과 개인 채팅 메시지를 주고받은 봇(Tenant.key). 그룹의 사용자 메시지와 이전 행은 NULL.
+    읽기 경로 커버링 인덱스에도 bot_key를 넣어 봇별 필터가 테이블 본문을 다시 찾지 않게 합니다.
+    """
+    c = conn.cursor()
+    columns = {row[1] for row in c.execute("PRAGMA table_info(messages)").fetchall()}
+    if "message_id" not in columns:
+        c.execute("ALTER TABLE messages ADD COLUMN message_id INTEGER")
+    if "bot_key" not in columns:
+        c.execute("ALTER TABLE messages ADD COLUMN bot_key TEXT")
+    c.execute(
+        """CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_chat_msgid
+               ON messages(chat_id, message_id) WHERE message_id IS NOT NULL"""
+    )
+    c.execute(
+        """CREATE INDEX IF NOT EXISTS idx_messages_chat_recent_bot
+               ON messages(chat_id, ts DESC, id DESC, user_id, username, sender, text, bot_key)"""
+    )
+    c.execute("DROP INDEX IF EXISTS idx_messages_chat_recent")
+
+
+# 순서가 곧 버전 번호(user_version)입니다. 새 변경은 항상 끝에 추가하세요.
+_MIGRATIONS = (
+    _migrate_v1_base,
+    _migrate_v2_incremental_vacuum,
+    _migrate_v3_archive,
+    _migrate_v4_covering_index,
+    _migrate_v5_archive_day_blocks,
+    _migrate_v6_tenant_messages,
+)
+
+
+@backend_method
+def init_db(shard: Optional[int] = None) -> None:
+    """아직 적용되지 않은 스키마 마이그레이션만 실행합니다 (최신이면 DDL 없음). shard를 주면 그 샤드만."""
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    for shard in _shard_ids(shard):
+        conn = get_conn(shard=shard)
+        try:
+            name = "db" if shard_count() == 1 else f"db.shard{shard}"
+            migrations.apply_migrations(conn, _MIGRATIONS, name=name)
+        finally:
+            conn.close()
 
 
 ### CHAT_DB 없으면 생성
@@ -151,6 +300,35 @@ if _db_dir and not os.path.exists(_db_dir):
 
 ### 메시지 저장 / 조회
 
+# 읽기 경로는 모두 idx_messages_chat_recent_bot 하나로 정렬·조회가 끝나도록 맞춰 두었습니다.
+# (READ_PATH_QUERIES는 benchmarks/store_bench.py가 실행 계획을 검사할 때 사용)
+# bot_key를 주면 다른 봇의 응답은 빼고, None이면 모든 행을 봅니다.
+_SQL_RECENT_MESSAGES = """SELECT user_id, COALESCE(username, sender) AS name, text, ts
+                            FROM messages
+                           WHERE chat_id=? AND ts>=?
+                             AND (bot_key IS NULL OR bot_key = COALESCE(?, bot_key))
+                           ORDER BY ts DESC, id DESC
+                           LIMIT ?"""
+
+_SQL_MESSAGES_BEFORE = """SELECT user_id, COALESCE(username, sender) AS name, text, ts
+                            FROM messages
+                           WHERE chat_id=? AND ts<?
+                           ORDER BY ts DESC, id DESC
+                           LIMIT ?"""
+
+_SQL_LAST_MESSAGE = """SELECT sender, text, ts
+                         FROM messages
+                        WHERE chat_id=?
+                        ORDER BY ts DESC, id DESC
+                        LIMIT 1"""
+
+READ_PATH_QUERIES = {
+    "get_recent_messages": (_SQL_RECENT_MESSAGES, (0, 0, "chatbot", 1)),
+    "get_messages_before": (_SQL_MESSAGES_BEFORE, (0, 0, 1)),
+    "get_last_message": (_SQL_LAST_MESSAGE, (0,)),
+}
+
+@backend_method
 def save_message(
     chat_id: int,
     user_id: Optional[int],
@@ -158,75 +336,66 @@ def save_message(
     sender: str,
     text: str,
     ts: Optional[int] = None,
+    message_id: Optional[int] = None,
+    bot_key: Optional[str] = None,
 ) -> None:
-    """대화 메시지를 저장합니다. sender는 'user' 또는 'bot'."""
+    """대화 메시지를 저장합니다. sender는 'user' 또는 'bot'.
+
+    message_id(그룹 메시지의 텔레그램 id)가 같은 메시지는 한 번만 저장하고, 봇 응답과 개인 채팅 메시지는
+    bot_key(Tenant.key)를 남깁니다. 개인 채팅의 chat_id는 모든 봇에게 같은 사용자 id라서 bot_key로만 구분됩니다.
+    """
     ts = ts or int(time.time())
-    conn = get_conn()
+    conn = get_conn(chat_id)
     try:
         c = conn.cursor()
         c.execute(
-            """INSERT INTO messages(chat_id, user_id, username, sender, text, ts)
-                   VALUES(?,?,?,?,?,?)""",
-            (chat_id, user_id, username, sender, text, ts),
+            """INSERT INTO messages(chat_id, user_id, username, sender, text, ts, message_id, bot_key)
+                   VALUES(?,?,?,?,?,?,?,?)
+                   ON CONFLICT(chat_id, message_id) WHERE message_id IS NOT NULL DO NOTHING""",
+            (chat_id, user_id, username, sender, text, ts, message_id, bot_key),
         )
         conn.commit()
     finally:
         conn.close()
 
 
-def get_recent_messages(chat_id: int, minutes: int, limit: int) -> List[Tuple[int, str, str, int]]:
-    """최근 N분 간의 메시지를 오래된 순서로 최대 limit개 반환합니다."""
+@backend_method
+def get_recent_messages(
+    chat_id: int, minutes: int, limit: int, bot_key: Optional[str] = None
+) -> List[Tuple[int, str, str, int]]:
+    """최근 N분 간의 메시지를 오래된 순서로 최대 limit개 반환합니다. bot_key를 주면 다른 봇의 응답은 뺍니다."""
     now = int(time.time())
     since = now - minutes * 60
-    conn = get_conn()
+    conn = get_conn(chat_id)
     try:
         c = conn.cursor()
-        c.execute(
-            """SELECT user_id, COALESCE(username, sender) AS name, text, ts
-                   FROM messages
-                  WHERE chat_id=? AND ts>=?
-                  ORDER BY ts DESC, id DESC
-                  LIMIT ?""",
-            (chat_id, since, limit),
-        )
+        c.execute(_SQL_RECENT_MESSAGES, (chat_id, since, bot_key, limit))
         rows = list(reversed(c.fetchall()))
     finally:
         conn.close()
     return rows
 
 
+@backend_method
 def get_messages_before(chat_id: int, before_ts: int, limit: int = 200) -> List[Tuple[int, str, str, int]]:
     """특정 타임스탬프 이전의 메시지를 오래된 순서로 반환합니다."""
-    conn = get_conn()
+    conn = get_conn(chat_id)
     try:
         c = conn.cursor()
-        c.execute(
-            """SELECT user_id, COALESCE(username, sender) AS name, text, ts
-                   FROM messages
-                  WHERE chat_id=? AND ts<?
-                  ORDER BY ts DESC
-                  LIMIT ?""",
-            (chat_id, before_ts, limit),
-        )
+        c.execute(_SQL_MESSAGES_BEFORE, (chat_id, before_ts, limit))
         rows = list(reversed(c.fetchall()))
     finally:
         conn.close()
     return rows
 
 
+@backend_method
 def get_last_message(chat_id: int) -> Optional[Tuple[str, str, int]]:
     """가장 최근 메시지의 (sender, text, ts) 정보를 반환합니다."""
-    conn = get_conn()
+    conn = get_conn(chat_id)
     try:
         c = conn.cursor()
-        c.execute(
-            """SELECT sender, text, ts
-                   FROM messages
-                  WHERE chat_id=?
-                  ORDER BY ts DESC, id DESC
-                  LIMIT 1""",
-            (chat_id,),
-        )
+        c.execute(_SQL_LAST_MESSAGE, (chat_id,))
         row = c.fetchone()
     finally:
         conn.close()
@@ -242,9 +411,13 @@ def get_last_message(chat_id: int) -> Optional[Tuple[str, str, int]]:
 
 ### 컨텍스트 설정 (commands.py 연동)
 
+@backend_method
 def get_memory_config(chat_id: int) -> Tuple[int, int, int, int]:
-    _ensure_settings_row(chat_id)
-    conn = get_conn()
+    """(window_minutes, memory_limit, keep_per_chat, retain_days). 읽기 전용이라 reader 스레드에서 불러도 됩니다.
+
+    settings 행은 set_memory_config가 처음 바꿀 때 만들어지며, 그 전에는 기본값을 반환합니다.
+    """
+    conn = get_conn(chat_id)
     try:
         c = conn.cursor()
         c.execute(
@@ -257,10 +430,11 @@ def get_memory_config(chat_id: int) -> Tuple[int, int, int, int]:
         conn.close()
 
     if not row:
-        return (30, 16, 3000, 3)
+        return (DEFAULT_WINDOW_MINUTES, DEFAULT_MEMORY_LIMIT, DEFAULT_KEEP_PER_CHAT, DEFAULT_RETAIN_DAYS)
     return tuple(int(x) for x in row)  # type: ignore
 
 
+@backend_method
 def set_memory_config(
     chat_id: int,
     *,
@@ -269,7 +443,6 @@ def set_memory_config(
     keep_per_chat: Optional[int] = None,
     retain_days: Optional[int] = None,
 ) -> None:
-    _ensure_settings_row(chat_id)
     fields: List[str] = []
     vals: List[Any] = []
     for key, val in [
@@ -286,9 +459,11 @@ def set_memory_config(
         return
 
     vals.append(chat_id)
-    conn = get_conn()
+    conn = get_conn(chat_id)
     try:
         c = conn.cursor()
+        # 행은 여기(쓰기 경로)에서만 만듭니다. 없던 채팅방은 테이블 기본값에서 시작합니다.
+        c.execute("INSERT OR IGNORE INTO settings(chat_id) VALUES(?)", (chat_id,))
         c.execute(f"UPDATE settings SET {', '.join(fields)} WHERE chat_id=?", vals)
         conn.commit()
     finally:
@@ -298,9 +473,10 @@ def set_memory_config(
 
 ### 커스텀 지침 정책
 
+@backend_method
 def set_guidelines(chat_id: int, text: str, updated_by: int | None = None) -> None:
     """방별 커스텀 지침을 저장하거나 빈 문자열이면 삭제합니다."""
-    conn = get_conn()
+    conn = get_conn(chat_id)
     try:
         c = conn.cursor()
         now = int(time.time())
@@ -322,9 +498,10 @@ def set_guidelines(chat_id: int, text: str, updated_by: int | None = None) -> No
         conn.close()
 
 
+@backend_method
 def get_guidelines(chat_id: int) -> str:
     """방별 커스텀 지침 텍스트를 반환합니다 (없으면 빈 문자열)."""
-    conn = get_conn()
+    conn = get_conn(chat_id)
     try:
         c = conn.cursor()
         c.execute("SELECT guidetext FROM guidelines WHERE chat_id=?", (chat_id,))
@@ -334,9 +511,10 @@ def get_guidelines(chat_id: int) -> str:
     return row[0] if row and row[0] else ""
 
 
+@backend_method
 def clear_guidelines(chat_id: int) -> None:
     """특정 방의 커스텀 지침을 삭제합니다."""
-    conn = get_conn()
+    conn = get_conn(chat_id)
     try:
         c = conn.cursor()
         c.execute("DELETE FROM guidelines WHERE chat_id=?", (chat_id,))
@@ -346,88 +524,480 @@ def clear_guidelines(chat_id: int) -> None:
 
 
 
-### 정리/보존 정책 (commands.py의 cleanup 명령과 연동)
+### 정리/보존 정책 (commands.py, retention.py와 연동)
 
-def cleanup_keep_recent_per_chat(keep: int) -> int:
-    """각 채팅방의 최근 keep개 메시지만 남기고 나머지를 삭제합니다."""
-    conn = get_conn()
-    try:
-        c = conn.cursor()
-        c.execute("SELECT DISTINCT chat_id FROM messages")
-        chat_ids = [row[0] for row in c.fetchall()]
-        deleted_total = 0
+def _evict(c: sqlite3.Cursor, id_query: str, params: Tuple[Any, ...], archive: bool) -> int:
+    """id_query가 고른 메시지를 hot 테이블에서 빼냅니다 (archive=True면 보관 후 삭제)."""
+    if not archive:
+        c.execute(f"DELETE FROM messages WHERE id IN ({id_query})", params)
+        return _rowcount(c)
 
-        for cid in chat_ids:
-            c.execute(
-                """
-                DELETE FROM messages
-                 WHERE id IN (
-                       SELECT id FROM messages
-                        WHERE chat_id=?
-                        ORDER BY ts DESC, id DESC
-                        LIMIT -1 OFFSET ?
-                 )
-                """,
-                (cid, keep),
+    c.execute(
+        f"""SELECT id, chat_id, user_id, username, sender, text, ts
+              FROM messages
+             WHERE id IN ({id_query})
+             ORDER BY chat_id, ts, id""",
+        params,
+    )
+    rows = c.fetchall()
+    if not rows:
+        return 0
+    _write_archive_blocks(c, rows)
+    c.execute(
+        "DELETE FROM messages WHERE id IN (SELECT value FROM json_each(?))",
+        (json.dumps([row[0] for row in rows]),),
+    )
+    return _rowcount(c)
+
+
+@backend_method
+def cleanup_keep_recent_per_chat(
+    keep: int,
+    batch_size: int = 5000,
+    archive: bool = ARCHIVE_ENABLED,
+    shard: Optional[int] = None,
+) -> int:
+    """각 채팅방의 최근 keep개 메시지만 남기고 나머지를 정리합니다 (keep이 0 이하면 아무것도 하지 않음).
+
+    채팅방 목록을 한 번 읽은 뒤 채팅방마다 _prune_chat으로 그 채팅방의 인덱스 구간만 batch_size개씩
+    지우고 커밋합니다 (배치마다 샤드 전체에 윈도우 함수를 다시 돌리지 않음).
+    shard를 지정하면 그 샤드만 정리합니다.
+    """
+    deleted_total = 0
+    for sid in _shard_ids(shard):
+        conn = get_conn(shard=sid)
+        try:
+            c = conn.cursor()
+            chat_ids = [row[0] for row in c.execute("SELECT DISTINCT chat_id FROM messages").fetchall()]
+            for chat_id in chat_ids:
+                while True:
+                    deleted = _prune_chat(c, chat_id, keep, 0, batch_size, archive)
+                    conn.commit()
+                    deleted_total += deleted
+                    if deleted < batch_size:
+                        break
+        finally:
+            conn.close()
+    return deleted_total
+
+
+@backend_method
+def get_chat_policies(shard: Optional[int] = None) -> List[Tuple[int, int, int]]:
+    """메시지가 있는 채팅방마다 (chat_id, keep_per_chat, retain_days). settings 행이 없으면 기본값입니다.
+
+    chat_id가 앞에 오는 idx_messages_chat_recent_bot만 훑으므로 본문 테이블은 읽지 않습니다.
+    """
+    policies: List[Tuple[int, int, int]] = []
+    for sid in _shard_ids(shard):
+        conn = get_conn(shard=sid)
+        try:
+            policies.extend(
+                conn.execute(
+                    """
+                    SELECT m.chat_id, COALESCE(s.keep_per_chat, ?), COALESCE(s.retain_days, ?)
+                      FROM (SELECT DISTINCT chat_id FROM messages) AS m
+                      LEFT JOIN settings AS s ON s.chat_id = m.chat_id
+                    """,
+                    (DEFAULT_KEEP_PER_CHAT, DEFAULT_RETAIN_DAYS),
+                ).fetchall()
             )
-            deleted_total += _rowcount(c)
+        finally:
+            conn.close()
+    return policies
 
+
+def _prune_chat(c: sqlite3.Cursor, chat_id: int, keep: int, days: int, batch_size: int, archive: bool) -> int:
+    """한 채팅방에서 최대 batch_size개를 정리합니다. 두 조회 모두 그 채팅방의 인덱스 구간만 읽습니다."""
+    deleted = 0
+    if keep > 0:
+        deleted += _evict(
+            c,
+            """
+            SELECT id FROM messages
+             WHERE chat_id=?
+             ORDER BY ts DESC, id DESC
+             LIMIT ? OFFSET ?
+            """,
+            (chat_id, batch_size, keep),
+            archive,
+        )
+
+    remaining = batch_size - deleted
+    if days > 0 and remaining > 0:
+        cutoff = int(time.time()) - days * 86400
+        deleted += _evict(
+            c,
+            """
+            SELECT id FROM messages
+             WHERE chat_id=? AND ts<?
+             LIMIT ?
+            """,
+            (chat_id, cutoff, remaining),
+            archive,
+        )
+    return deleted
+
+
+@backend_method
+def prune_by_policy(
+    batch_size: int = 500,
+    archive: bool = ARCHIVE_ENABLED,
+    shard: Optional[int] = None,
+) -> int:
+    """모든 채팅방에 각자의 keep_per_chat / retain_days 정책을 적용해 최대 batch_size개만 정리합니다.
+
+    settings 행이 없는 채팅방은 기본값을 따르며, 반환값이 batch_size보다 작으면 더 정리할 것이
+    없다는 뜻입니다. 호출마다 채팅방 목록을 다시 읽으므로, 끝까지 정리할 때는 retention.py처럼
+    get_chat_policies()를 한 번 읽고 채팅방마다 prune_chat_messages를 반복하세요.
+    shard를 지정하면 그 샤드만 정리합니다.
+    """
+    deleted = 0
+    for sid in _shard_ids(shard):
+        conn = get_conn(shard=sid)
+        try:
+            c = conn.cursor()
+            for chat_id, keep, days in get_chat_policies(sid):
+                if deleted >= batch_size:
+                    break
+                deleted += _prune_chat(c, chat_id, keep, days, batch_size - deleted, archive)
+            conn.commit()
+        finally:
+            conn.close()
+        if deleted >= batch_size:
+            break
+    return deleted
+
+
+@backend_method
+def prune_chat_messages(
+    chat_id: int, keep: int, days: int, batch_size: int = 500, archive: bool = ARCHIVE_ENABLED
+) -> int:
+    """한 채팅방에 보존 정책을 적용해 최대 batch_size개까지만 정리합니다.
+
+    keep개를 넘는 오래된 메시지를 먼저 정리하고, 남은 여유분으로 days일보다
+    오래된 메시지를 정리합니다. 0 이하인 값은 해당 조건을 적용하지 않습니다.
+    반환값이 batch_size보다 작으면 더 정리할 것이 없다는 뜻입니다.
+    """
+    conn = get_conn(chat_id)
+    try:
+        deleted = _prune_chat(conn.cursor(), chat_id, keep, days, batch_size, archive)
         conn.commit()
     finally:
         conn.close()
+    return deleted
+
+
+@backend_method
+def cleanup_old_messages(
+    days: int,
+    batch_size: int = 5000,
+    archive: bool = ARCHIVE_ENABLED,
+    shard: Optional[int] = None,
+) -> int:
+    """days일보다 오래된 메시지를 정리합니다 (0이면 전체). shard를 지정하면 그 샤드만."""
+    cutoff = int(time.time()) - days * 86400 if days > 0 else None
+    deleted_total = 0
+    for sid in _shard_ids(shard):
+        conn = get_conn(shard=sid)
+        try:
+            c = conn.cursor()
+            if cutoff is None and not archive:
+                c.execute("DELETE FROM messages")
+                deleted_total += _rowcount(c)
+                conn.commit()
+                continue
+
+            while True:
+                if cutoff is None:
+                    deleted = _evict(c, "SELECT id FROM messages LIMIT ?", (batch_size,), archive)
+                else:
+                    deleted = _evict(
+                        c, "SELECT id FROM messages WHERE ts < ? LIMIT ?", (cutoff, batch_size), archive
+                    )
+                conn.commit()
+                deleted_total += deleted
+                if deleted < batch_size:
+                    break
+        finally:
+            conn.close()
     return deleted_total
 
 
-def cleanup_old_messages(days: int) -> int:
-    """days일보다 오래된 메시지를 삭제합니다 (0이면 전체 삭제)."""
-    conn = get_conn()
-    try:
-        c = conn.cursor()
-        if days <= 0:
-            c.execute("DELETE FROM messages")
-            deleted = _rowcount(c)
-            conn.commit()
-            return deleted
+### 아카이브 (오래된 메시지를 채팅방·날짜별 zlib 블록으로 보관)
+
+def _archive_line_key(line: str) -> Tuple[int, int]:
+    """블록 한 줄([id, user_id, username, sender, text, ts])의 정렬 키 (ts, id)."""
+    mid, _user_id, _username, _sender, _text, ts = json.loads(line)
+    return int(ts or 0), int(mid)
+
+
+def _insert_archive_block(c: sqlite3.Cursor, chat_id: int, day: str, lines: List[str]) -> None:
+    """줄들을 (ts, id) 순으로 정렬해 (chat_id, day) 블록 하나로 씁니다 (이미 있으면 바꿔 씀)."""
+    keyed = sorted(((_archive_line_key(line), line) for line in lines), key=lambda kv: kv[0])
+    c.execute(
+        """INSERT OR REPLACE INTO message_archive(chat_id, day, first_ts, last_ts, count, data)
+               VALUES(?,?,?,?,?,?)""",
+        (
+            chat_id,
+            day,
+            keyed[0][0][0],
+            keyed[-1][0][0],
+            len(keyed),
+            zlib.compress("\n".join(line for _key, line in keyed).encode("utf-8"), ARCHIVE_COMPRESS_LEVEL),
+        ),
+    )
+
+
+def _write_archive_blocks(c: sqlite3.Cursor, rows: List[Tuple[Any, ...]]) -> None:
+    """(id, chat_id, user_id, username, sender, text, ts) 행을 채팅방·날짜별 블록에 보관합니다.
+
+    정리는 채팅방마다 작은 배치로 나눠 오므로, 같은 (chat_id, day) 블록이 이미 있으면 풀어서
+    합친 뒤 다시 압축합니다. 그래서 채팅방·날짜마다 블록은 늘 하나이고 압축률도 유지됩니다.
+    """
+    groups: dict[Tuple[int, str], List[str]] = {}
+    for mid, chat_id, user_id, username, sender, text, ts in rows:
+        day = datetime.fromtimestamp(ts or 0, ARCHIVE_TIMEZONE).strftime("%Y-%m-%d")
+        groups.setdefault((chat_id, day), []).append(
+            json.dumps([mid, user_id, username, sender, text, ts], ensure_ascii=False)
+        )
 
-        cutoff = int(time.time()) - days * 86400
-        c.execute("DELETE FROM messages WHERE ts < ?", (cutoff,))
-        deleted = _rowcount(c)
-        conn.commit()
-        return deleted
+    for (chat_id, day), lines in groups.items():
+        existing = c.execute(
+            "SELECT data FROM message_archive WHERE chat_id=? AND day=?", (chat_id, day)
+        ).fetchone()
+        if existing:
+            lines = zlib.decompress(existing[0]).decode("utf-8").splitlines() + lines
+        _insert_archive_block(c, chat_id, day, lines)
+
+
+@backend_method
+def iter_archived_messages(
+    chat_id: int,
+    since_ts: Optional[int] = None,
+    until_ts: Optional[int] = None,
+) -> Iterator[Tuple[int, str, str, int]]:
+    """보관된 메시지를 (user_id, name, text, ts) 형태로 오래된 순서대로 흘려보냅니다.
+
+    블록을 하나씩 읽어 압축을 풀기 때문에 전체 기록이 커도 메모리를 거의 쓰지 않습니다.
+    """
+    since = since_ts if since_ts is not None else 0
+    until = until_ts if until_ts is not None else 2**62
+    conn = get_conn(chat_id)
+    try:
+        cursor = conn.execute(
+            """SELECT data FROM message_archive
+                WHERE chat_id=? AND last_ts>=? AND first_ts<?
+                ORDER BY first_ts, id""",
+            (chat_id, since, until),
+        )
+        for (data,) in cursor:
+            for line in zlib.decompress(data).decode("utf-8").splitlines():
+                _mid, user_id, username, sender, text, ts = json.loads(line)
+                if since <= ts < until:
+                    yield user_id, username or sender, text, ts
     finally:
         conn.close()
 
 
+@backend_method
+def get_archive_stats(chat_id: Optional[int] = None) -> Tuple[int, int, int]:
+    """(블록 수, 메시지 수, 압축 바이트 수)를 반환합니다."""
+    shards = [shard_of(chat_id)] if chat_id is not None else _shard_ids()
+    totals = [0, 0, 0]
+    for sid in shards:
+        conn = get_conn(shard=sid)
+        try:
+            c = conn.cursor()
+            if chat_id is None:
+                c.execute("SELECT COUNT(*), SUM(count), SUM(LENGTH(data)) FROM message_archive")
+            else:
+                c.execute(
+                    "SELECT COUNT(*), SUM(count), SUM(LENGTH(data)) FROM message_archive WHERE chat_id=?",
+                    (chat_id,),
+                )
+            row = c.fetchone()
+        finally:
+            conn.close()
+        for i, value in enumerate(row):
+            totals[i] += int(value or 0)
+    return totals[0], totals[1], totals[2]
+
 
 ### 유지보수
 
-def vacuum() -> None:
-    """VACUUM 명령으로 DB 파일을 최적화합니다."""
-    conn = get_conn()
-    try:
-        conn.execute("VACUUM")
-    finally:
-        conn.close()
+@backend_method
+def vacuum(shard: Optional[int] = None) -> None:
+    """VACUUM 명령으로 DB 파일 전체를 다시 씁니다 (수동 실행용, 실행 중 해당 DB가 잠깁니다).
+
+    shard를 지정하면 그 샤드 파일만 다시 쓰고 다른 샤드는 건드리지 않습니다.
+    """
+    for sid in _shard_ids(shard):
+        conn = get_conn(shard=sid)
+        try:
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+
+
+@backend_method
+def incremental_vacuum(pages: int = 200, shard: Optional[int] = None) -> int:
+    """샤드마다 빈 페이지를 최대 pages개 반환하고 남은 빈 페이지 수(합계)를 돌려줍니다.
+
+    auto_vacuum=INCREMENTAL 상태에서만 공간이 줄어들며, 짧게 끝나므로
+    정리 작업 사이사이에 여러 번 나눠 호출합니다.
+    """
+    free_pages = 0
+    for sid in _shard_ids(shard):
+        conn = get_conn(shard=sid)
+        try:
+            # execute()로는 한 단계(1페이지)만 진행되므로 executescript로 끝까지 실행
+            conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+            row = conn.execute("PRAGMA freelist_count").fetchone()
+        finally:
+            conn.close()
+        free_pages += int(row[0]) if row else 0
+    return free_pages
+
+
+@backend_method
+def checkpoint_wal(shard: Optional[int] = None) -> int:
+    """WAL 내용을 DB 파일에 모두 옮기고 -wal 파일을 비웁니다 (종료 직전용).
+
+    다른 연결이 읽고 있어 끝까지 못 옮긴 샤드 수를 반환합니다 (0이면 전부 완료).
+    """
+    busy = 0
+    for sid in _shard_ids(shard):
+        conn = get_conn(shard=sid)
+        try:
+            row = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        finally:
+            conn.close()
+        busy += 1 if row and row[0] else 0
+    return busy
+
+
+@backend_method
+def reset_db(shard: Optional[int] = None) -> None:
+    """모든 데이터를 삭제하고 스키마를 재생성합니다. shard를 주면 그 샤드만 (샤드 writer에서 하나씩 실행할 때)."""
+    for sid in _shard_ids(shard):
+        conn = get_conn(shard=sid)
+        try:
+            c = conn.cursor()
+            c.execute("DROP TABLE IF EXISTS messages")
+            c.execute("DROP TABLE IF EXISTS settings")
+            c.execute("DROP TABLE IF EXISTS guidelines")
+            c.execute("DROP TABLE IF EXISTS message_archive")
+            c.execute("PRAGMA user_version=0")
+            conn.commit()
 
+            # 파일 파편 정리
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
 
-def reset_db() -> None:
-    """모든 데이터를 삭제하고 스키마를 재생성합니다."""
-    conn = get_conn()
-    try:
-        c = conn.cursor()
-        c.execute("DROP TABLE IF EXISTS messages")
-        c.execute("DROP TABLE IF EXISTS settings")
-        c.execute("DROP TABLE IF EXISTS guidelines")
-        conn.commit()
-    finally:
-        conn.close()
+    init_db(shard)
+
+
+### 비동기 API (SQLite 호출을 이벤트 루프 밖에서 실행)
+# 읽기는 전용 reader 스레드 풀에서, 쓰기는 샤드마다 하나인 writer 스레드에서 순서대로 실행합니다.
+# 동기 함수들은 스크립트/관리 도구용으로 그대로 남겨 둡니다.
+
+T = TypeVar("T")
+
+STORE_READ_THREADS = max(1, int(os.getenv("STORE_READ_THREADS", "4") or 4))
+
+_reader: Optional[ThreadPoolExecutor] = None
+_writers: Dict[int, ThreadPoolExecutor] = {}
+
+
+def _get_reader() -> ThreadPoolExecutor:
+    global _reader
+    if _reader is None:
+        _reader = ThreadPoolExecutor(max_workers=STORE_READ_THREADS, thread_name_prefix="store-reader")
+    return _reader
+
+
+def _get_writer(shard: int = 0) -> ThreadPoolExecutor:
+    writer = _writers.get(shard)
+    if writer is None:
+        writer = _writers[shard] = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"store-writer-{shard}"
+        )
+    return writer
+
+
+async def run_read(fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+    """읽기 전용 동기 함수를 reader 스레드 풀에서 실행합니다."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_reader(), functools.partial(fn, *args, **kwargs))
+
+
+async def run_shard_write(shard: int, fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+    """쓰기가 포함된 동기 함수를 해당 샤드의 writer 스레드에서 순서대로 실행합니다."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_writer(shard), functools.partial(fn, *args, **kwargs))
+
+
+async def run_write(fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+    """특정 채팅방에 묶이지 않은 쓰기를 0번 writer 스레드에서 실행합니다."""
+    return await run_shard_write(0, fn, *args, **kwargs)
+
+
+def shutdown_executors(wait: bool = True) -> None:
+    """대기 중인 쓰기를 마치고 스레드 풀을 정리합니다."""
+    global _reader
+    for writer in list(_writers.values()):
+        writer.shutdown(wait=wait)
+    _writers.clear()
+    if _reader is not None:
+        _reader.shutdown(wait=wait)
+        _reader = None
+
+
+async def asave_message(
+    chat_id: int,
+    user_id: Optional[int],
+    username: Optional[str],
+    sender: str,
+    text: str,
+    ts: Optional[int] = None,
+    message_id: Optional[int] = None,
+    bot_key: Optional[str] = None,
+) -> None:
+    await run_shard_write(
+        shard_of(chat_id), save_message, chat_id, user_id, username, sender, text, ts, message_id, bot_key
+    )
+
+
+async def aget_recent_messages(
+    chat_id: int, minutes: int, limit: int, bot_key: Optional[str] = None
+) -> List[Tuple[int, str, str, int]]:
+    return await run_read(get_recent_messages, chat_id, minutes, limit, bot_key)
+
+
+async def aget_messages_before(chat_id: int, before_ts: int, limit: int = 200) -> List[Tuple[int, str, str, int]]:
+    return await run_read(get_messages_before, chat_id, before_ts, limit)
+
+
+async def aget_last_message(chat_id: int) -> Optional[Tuple[str, str, int]]:
+    return await run_read(get_last_message, chat_id)
+
+
+async def aget_memory_config(chat_id: int) -> Tuple[int, int, int, int]:
+    return await run_read(get_memory_config, chat_id)
+
+
+async def aset_memory_config(chat_id: int, **kwargs: Optional[int]) -> None:
+    await run_shard_write(shard_of(chat_id), set_memory_config, chat_id, **kwargs)
+
+
+async def aget_guidelines(chat_id: int) -> str:
+    return await run_read(get_guidelines, chat_id)
+
+
+async def aset_guidelines(chat_id: int, text: str, updated_by: int | None = None) -> None:
+    await run_shard_write(shard_of(chat_id), set_guidelines, chat_id, text, updated_by)
 
-    # 파일 파편 정리 후 스키마 재생성
-    vacuum_conn = sqlite3.connect(DB_PATH)
-    try:
-        vacuum_conn.execute("VACUUM")
-        vacuum_conn.commit()
-    finally:
-        vacuum_conn.close()
 
-    init_db()
\ No newline at end of file
+async def aclear_guidelines(chat_id: int) -> None:
+    await run_shard_write(shard_of(chat_id), clear_guidelines, chat_id)
@@ -0,0 +1,233 @@
+"""업데이트를 chat_id별로 여러 워커 프로세스에 나눠 처리하는 슈퍼바이저 모드.
+
+BOT_WORKERS를 2 이상으로 지정하면 `python main.py`로 띄운 프로세스가 앞단(front)이 되어
+폴링이나 웹훅으로 업데이트를 받기만 하고, 같은 main.py를 BOT_WORKER_INDEX 환경 변수와 함께
+워커 프로세스 N개로 실행합니다. 업데이트는 chat_id의 crc32 해시로 고른 워커의 stdin에
+JSON 한 줄씩 전달되므로, 한 채팅방의 메시지·캐시·발신 큐는 늘 같은 워커가 맡습니다.
+워커가 밀리면 파이프가 차서 앞단의 전달이 기다리게 됩니다 (웹훅 모드면 결국 503).
+
+텔레그램 발신 전역 한도(초당 30건)는 워커마다 1/N씩 나눠 받습니다 (outbound.PROCESS_GLOBAL_RATE).
+사용량 한도는 quota.reserve_quota_or_msg가 usage DB에서 BEGIN IMMEDIATE로 확인과 기록을
+한 번에 하므로 워커 사이에서도 한도를 넘지 않습니다.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import signal
+import sys
+import zlib
+from contextlib import suppress
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set
+
+from aiogram import Bot, Dispatcher, types
+
+import botlog
+import metrics
+import outbound
+import shutdown
+import startup
+
+BOT_WORKERS = max(1, int(os.getenv("BOT_WORKERS", "1") or 1))
+WORKER_CONCURRENCY = 64        # 워커 하나가 동시에 처리하는 업데이트 수
+WORKER_LINE_LIMIT = 4 * 1024 * 1024  # 업데이트 JSON 한 줄의 최대 크기
+WORKER_RESTART_SECONDS = 1.0
+WORKER_STOP_TIMEOUT = shutdown.SHUTDOWN_TIMEOUT_SECONDS + 10  # 워커가 스스로 마무리·기록할 시간까지
+
+_MAIN_SCRIPT = Path(__file__).resolve().parent / "main.py"
+
+log = botlog.get_logger("supervisor")
+
+WORKER_ROUTED = metrics.counter("supervisor_routed_total", "워커로 전달한 업데이트 수", ("worker",))
+WORKER_DROPPED = metrics.counter("supervisor_dropped_total", "워커가 내려가 있어 버린 업데이트 수", ("worker",))
+WORKER_RESTARTS = metrics.counter("supervisor_worker_restarts_total", "비정상 종료 후 다시 띄운 워커 수", ("worker",))
+
+
+def worker_index() -> Optional[int]:
+    """이 프로세스가 워커면 번호를, 앞단이나 단일 프로세스면 None을 반환합니다."""
+    raw = os.getenv("BOT_WORKER_INDEX")
+    return int(raw) if raw not in (None, "") else None
+
+
+def shard_for(chat_id: int, workers: int = BOT_WORKERS) -> int:
+    """chat_id를 맡을 워커 번호. store.shard_of와 같은 crc32 방식입니다."""
+    if workers <= 1:
+        return 0
+    return zlib.crc32(str(int(chat_id)).encode("ascii")) % workers
+
+
+def own_chats(chat_ids: Iterable[int]) -> Set[int]:
+    """이 프로세스가 맡는 채팅방만 남깁니다 (워커가 아니면 전부)."""
+    index = worker_index()
+    if index is None:
+        return set(chat_ids)
+    return {cid for cid in chat_ids if shard_for(cid) == index}
+
+
+def update_chat_id(update: types.Update) -> int:
+    """업데이트가 속한 채팅방. 채팅방이 없는 업데이트(인라인 등)는 보낸 사용자 ID를 씁니다."""
+    event = update.event
+    chat = getattr(event, "chat", None)
+    if chat is None and isinstance(event, types.CallbackQuery) and event.message:
+        chat = event.message.chat
+    if chat is not None:
+        return chat.id
+    user = getattr(event, "from_user", None)
+    return user.id if user is not None else 0
+
+
+class _WorkerProcess:
+    """main.py 워커 프로세스 하나. 비정상 종료하면 다시 띄웁니다."""
+
+    def __init__(self, index: int, count: int) -> None:
+        self.index = index
+        self._count = count
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self._task: Optional[asyncio.Task[None]] = None
+        self._ready = asyncio.Event()
+        self._stopping = False
+
+    def _env(self) -> Dict[str, str]:
+        env = dict(os.environ)
+        env["BOT_WORKER_INDEX"] = str(self.index)
+        env["BOT_WORKERS"] = str(self._count)
+        # 발신 전역 한도는 봇 토큰 하나에 걸리므로 워커끼리 나눠 씀 (앞단은 보내지 않음)
+        env["OUTBOUND_GLOBAL_RATE"] = str(outbound.GLOBAL_RATE_PER_SECOND / self._count)
+        env.pop("WEBHOOK_URL", None)  # 업데이트는 앞단에서만 받음
+        env.pop("UPDATE_RECORD_PATH", None)
+        if metrics.METRICS_PORT:  # 워커마다 다음 포트에서 각자 지표를 제공
+            env["METRICS_PORT"] = str(metrics.METRICS_PORT + 1 + self.index)
+        return env
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name=f"bot-worker-{self.index}")
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            self._proc = await asyncio.create_subprocess_exec(
+                sys.executable, str(_MAIN_SCRIPT), stdin=asyncio.subprocess.PIPE, env=self._env()
+            )
+            self._ready.set()
+            log.info("워커 시작", extra={"worker": self.index, "pid": self._proc.pid})
+            code = await self._proc.wait()
+            self._ready.clear()
+            if self._stopping:
+                return
+            log.error("워커가 종료되어 다시 띄울게요.", extra={"worker": self.index, "code": code})
+            WORKER_RESTARTS.inc(worker=self.index)
+            await asyncio.sleep(WORKER_RESTART_SECONDS)
+
+    async def send(self, line: bytes) -> None:
+        await self._ready.wait()
+        proc = self._proc
+        if proc is None or proc.stdin is None or proc.returncode is not None:
+            WORKER_DROPPED.inc(worker=self.index)
+            return
+        try:
+            proc.stdin.write(line)
+            await proc.stdin.drain()  # 파이프가 차면 여기서 기다림 (역압)
+        except (BrokenPipeError, ConnectionResetError):
+            WORKER_DROPPED.inc(worker=self.index)
+            log.warning("워커로 업데이트를 보내지 못했어요.", extra={"worker": self.index, "sampled": True})
+            return
+        WORKER_ROUTED.inc(worker=self.index)
+
+    async def stop(self, timeout: float) -> None:
+        """stdin을 닫아 워커가 남은 업데이트를 처리하고 스스로 끝나게 합니다."""
+        self._stopping = True
+        proc = self._proc
+        if proc is not None and proc.returncode is None:
+            if proc.stdin is not None:
+                proc.stdin.close()
+            try:
+                await asyncio.wait_for(proc.wait(), timeout)
+            except asyncio.TimeoutError:
+                log.warning("워커가 제시간에 끝나지 않아 강제로 종료해요.", extra={"worker": self.index})
+                proc.kill()
+                await proc.wait()
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+
+class WorkerPool:
+    """앞단 프로세스에서 워커들을 띄우고, dp 바깥 미들웨어로 업데이트를 워커에 넘깁니다."""
+
+    def __init__(self, count: int = BOT_WORKERS) -> None:
+        self._workers = [_WorkerProcess(i, count) for i in range(count)]
+
+    def start(self) -> None:
+        for worker in self._workers:
+            worker.start()
+
+    async def route_middleware(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: types.Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        """핸들러를 호출하지 않고 업데이트를 해당 워커로 보냅니다."""
+        worker = self._workers[shard_for(update_chat_id(event), len(self._workers))]
+        line = event.model_dump_json(exclude_none=True).encode("utf-8") + b"\n"
+        await worker.send(line)
+        return None
+
+    async def stop(self, timeout: float = WORKER_STOP_TIMEOUT) -> None:
+        await asyncio.gather(*(worker.stop(timeout) for worker in self._workers))
+
+
+async def start_worker_pool(dp: Dispatcher) -> WorkerPool:
+    pool = WorkerPool()
+    pool.start()
+    dp.update.outer_middleware(pool.route_middleware)
+    log.info("슈퍼바이저 모드: 워커 %d개", BOT_WORKERS)
+    return pool
+
+
+async def serve_worker(bot: Bot, dp: Dispatcher) -> None:
+    """워커 프로세스에서 stdin의 업데이트를 EOF까지 읽어 처리합니다.
+
+    남은 업데이트는 기다리지 않고 돌아가며, 마무리는 run_bot의 종료 절차(shutdown.py)가 맡습니다.
+    """
+    # Ctrl+C와 systemd의 SIGTERM은 앞단이 받아 stdin을 닫는 것으로 종료를 알립니다.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=WORKER_LINE_LIMIT)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    startup.ready("worker")
+    slots = asyncio.Semaphore(WORKER_CONCURRENCY)
+    tasks: Set[asyncio.Task[Any]] = set()
+
+    async def handle(update: types.Update) -> None:
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as exc:  # pragma: no cover - 예방적 로그
+            log.error("업데이트 처리 실패: %r", exc)
+        finally:
+            slots.release()
+
+    try:
+        while True:
+            await slots.acquire()  # 처리 중인 업데이트가 많으면 더 읽지 않음
+            line = await reader.readline()
+            if not line:
+                slots.release()
+                break
+            try:
+                update = types.Update.model_validate_json(line, context={"bot": bot})
+            except ValueError as exc:
+                slots.release()
+                log.error("업데이트를 해석하지 못했어요: %r", exc)
+                continue
+            task = asyncio.create_task(handle(update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
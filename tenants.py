@@ -0,0 +1,137 @@
+"""한 프로세스에서 여러 봇 토큰(페르소나)을 함께 돌리기 위한 봇별 설정.
+
+BOTS_CONFIG에 JSON 파일 경로를 지정하면 그 안의 봇마다 Bot 인스턴스를 만들어 같은 Dispatcher로
+폴링합니다. 봇들은 HTTP 세션(AiohttpSession), Gemini 클라이언트, DB 스레드 풀, 보존 정리·원장·지표
+작업을 함께 쓰고, 봇마다 따로 갖는 것은 이 Tenant 객체와 발신 큐, 자동 게시 태스크뿐입니다.
+지정하지 않으면 지금처럼 .env와 persona.py로 봇 하나를 만듭니다.
+
+BOTS_CONFIG 예)
+    {"bots": [
+        {"key": "chatbot", "token_env": "TELEGRAM_BOT_TOKEN", "group_ids": [-100123]},
+        {"key": "cat", "token_env": "CAT_BOT_TOKEN", "name": "고양이", "sign": ["냥이", "고양이"],
+         "instruction_file": "personas/cat.txt", "admin_ids": [1234], "idle_reply_prob": 0.05}
+    ]}
+빠진 항목은 persona.py와 TELEGRAM_GROUP_IDS/TELEGRAM_ADMIN_IDS/BOT_IDLE_REPLY_PROB 값을 씁니다.
+
+모든 봇이 같은 DB를 씁니다. 같은 그룹에 여러 봇이 있으면:
+    - 사용자 메시지는 봇마다 받지만 (chat_id, message_id)로 한 번만 저장됩니다.
+    - 봇 응답은 key(bot_key 열)를 남기고, 각 봇의 [CHAT] 컨텍스트에는 자기 응답만 들어갑니다.
+    - 개인 채팅은 chat_id(사용자 id)가 봇마다 같고 message_id는 봇마다 따로라, 사용자 메시지에도 key를 남겨
+      봇마다 자기와 나눈 대화만 봅니다.
+    - 지침·메모리 설정·보존 정책·사용량 한도는 chat_id 기준이라 그 방의 봇들이 함께 씁니다
+      (봇마다 다르게 하려면 봇별로 다른 그룹을 쓰거나 프로세스를 나누세요).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+
+from persona import bot_instruction, bot_name, bot_sign
+
+BOTS_CONFIG = os.getenv("BOTS_CONFIG", "")
+
+_BASE_DIR = Path(__file__).resolve().parent
+
+
+class Tenant:
+    """봇 하나의 토큰과 페르소나, 허용 채팅방, 관리자 목록."""
+
+    __slots__ = ("key", "token", "name", "sign", "instruction", "allowed_chat_ids", "admin_ids", "idle_reply_prob", "bot")
+
+    def __init__(
+        self,
+        key: str,
+        token: str,
+        *,
+        name: str = bot_name,
+        sign: Iterable[str] = bot_sign,
+        instruction: str = bot_instruction,
+        allowed_chat_ids: Iterable[int] = (),
+        admin_ids: Iterable[int] = (),
+        idle_reply_prob: float = 0.0,
+    ) -> None:
+        self.key = key
+        self.token = token
+        self.name = name
+        self.sign: Tuple[str, ...] = tuple(sign)
+        self.instruction = instruction
+        self.allowed_chat_ids: Set[int] = set(allowed_chat_ids)
+        self.admin_ids: Set[int] = set(admin_ids)
+        self.idle_reply_prob = max(0.0, min(1.0, float(idle_reply_prob)))
+        self.bot: Optional[Bot] = None
+
+    def is_admin(self, user_id: Optional[int]) -> bool:
+        """admin_ids가 비어 있으면 모든 사용자 허용."""
+        if not self.admin_ids:
+            return True
+        return user_id is not None and user_id in self.admin_ids
+
+
+def _tenant_from_config(entry: Dict[str, Any], defaults: Tenant) -> Tenant:
+    key = str(entry["key"])
+    token = entry.get("token") or os.getenv(entry.get("token_env", ""), "")
+    if not token:
+        raise RuntimeError(f"BOTS_CONFIG의 봇 {key!r}에 토큰이 없어요 (token 또는 token_env 확인).")
+    instruction = entry.get("instruction")
+    if instruction is None and entry.get("instruction_file"):
+        instruction = (_BASE_DIR / entry["instruction_file"]).read_text(encoding="utf-8")
+    return Tenant(
+        key,
+        token,
+        name=entry.get("name", defaults.name),
+        sign=entry.get("sign", defaults.sign),
+        instruction=instruction if instruction is not None else defaults.instruction,
+        allowed_chat_ids=entry.get("group_ids", defaults.allowed_chat_ids),
+        admin_ids=entry.get("admin_ids", defaults.admin_ids),
+        idle_reply_prob=entry.get("idle_reply_prob", defaults.idle_reply_prob),
+    )
+
+
+def load_tenants(default: Tenant, path: str = BOTS_CONFIG) -> List[Tenant]:
+    """BOTS_CONFIG의 봇 목록을 읽습니다. 설정이 없으면 [default]를 반환합니다."""
+    if not path:
+        return [default]
+    with open(_BASE_DIR / path, encoding="utf-8") as fp:
+        entries = json.load(fp).get("bots") or []
+    if not entries:
+        raise RuntimeError(f"{path}에 봇이 하나도 없어요.")
+    loaded = [_tenant_from_config(entry, default) for entry in entries]
+    keys = [t.key for t in loaded]
+    if len(set(keys)) != len(keys):
+        raise RuntimeError(f"{path}에 중복된 key가 있어요: {keys}")
+    return loaded
+
+
+_by_bot_id: Dict[int, Tenant] = {}
+
+
+def create_bots(tenants: List[Tenant], default: DefaultBotProperties) -> List[Bot]:
+    """봇마다 Bot을 만들되 HTTP 세션(커넥션 풀)은 하나를 함께 씁니다."""
+    session = AiohttpSession()
+    bots = []
+    for tenant in tenants:
+        tenant.bot = Bot(token=tenant.token, session=session, default=default)
+        _by_bot_id[tenant.bot.id] = tenant
+        bots.append(tenant.bot)
+    return bots
+
+
+def for_bot(bot: Bot) -> Tenant:
+    """업데이트를 받은 Bot의 설정. 하나만 등록되어 있으면 그 설정을 씁니다."""
+    tenant = _by_bot_id.get(bot.id)
+    if tenant is None:
+        if len(_by_bot_id) == 1:
+            return next(iter(_by_bot_id.values()))
+        raise KeyError(f"등록되지 않은 봇이에요: {bot.id}")
+    return tenant
+
+
+def all_tenants() -> List[Tenant]:
+    return list(_by_bot_id.values())
@@ -80,6 +80,10 @@ progress "보존 파일 복사 중"
 for f in "${PRESERVE_LIST[@]}"; do
   [[ -e "$CURRENT_DIR/$f" ]] && cp -a "$CURRENT_DIR/$f" "$NEW_RELEASE/$f" || true
 done
+# 샤딩(CHAT_DB_SHARDS) 사용 시 생성되는 샤드 DB 파일
+for f in "$CURRENT_DIR"/chat.shard*.db*; do
+  [[ -e "$f" ]] && cp -a "$f" "$NEW_RELEASE/" || true
+done
 
 progress "서비스 교체 준비"
 if systemctl is-active --quiet telegram-bot; then
@@ -0,0 +1,246 @@
+"""배포 재시작 뒤에도 바로 평소 지연으로 응답하기 위한 메모리 상태 스냅샷 (warm restart).
+
+정상 종료할 때 run_bot이 save_snapshot()으로 다음을 WARM_STATE_PATH에 gzip JSON으로 남기고
+(임시 파일에 쓰고 fsync한 뒤 os.replace로 바꿔치기하므로 중간에 죽어도 반쯤 쓰인 파일은 없음),
+다음 시작 때 load_snapshot()이 읽어서 검증한 뒤 지웁니다.
+    - 자동 게시: 봇별 채팅방 마지막 게시 시각(유휴 타이머)과 최근 보낸 링크(중복 방지)
+    - 최근 응답한 (채팅방, 봇 key) 목록: 업데이트를 받을 준비가 끝나면(startup.ready) WarmUp이 그 봇의
+      컨텍스트 읽기 경로(설정·지침·그 봇 기준 최근 메시지)를 미리 한 번 돌리고, Gemini 클라이언트도 미리 불러옵니다.
+      목록이 비어 있으면 아무것도 하지 않습니다 (google-genai는 첫 LLM 호출 때 불러옴).
+메시지·설정·지침·사용량은 원래 DB에 있으므로 스냅샷에 담지 않습니다.
+
+검증: 형식 버전·스키마 버전·샤드 수·저장소 종류가 다르거나 WARM_STATE_MAX_AGE_SECONDS보다
+오래된 스냅샷은 버리고, 게시 시각은 DB의 그 채팅방 마지막 메시지보다 늦으면(DB가 바뀐 경우) 버립니다.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+import os
+import time
+from collections import OrderedDict
+from contextlib import suppress
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import botlog
+import llm
+import startup
+import store
+import storage
+from context_builder import build_context_for_llm
+
+WARM_STATE_PATH = os.getenv("WARM_STATE_PATH", "warm_state.json.gz")
+WARM_STATE_MAX_AGE_SECONDS = 24 * 3600
+WARM_STATE_VERSION = 2       # 2: hot_chats 항목에 봇 key를 함께 남김
+WARM_HOT_CHATS = 200         # 스냅샷에 남길 최근 채팅방 수
+WARM_UP_CONCURRENCY = 4      # 시작 직후 미리 읽기 동시 실행 수 (reader 스레드 수 정도)
+
+log = botlog.get_logger("warmstate")
+
+_hot_chats: "OrderedDict[Tuple[int, Optional[str]], int]" = OrderedDict()
+
+
+def touch(chat_id: int, bot_key: Optional[str] = None) -> None:
+    """응답 경로에서 호출. 최근 (채팅방, 봇 key) 목록을 갱신합니다 (오래된 것부터 밀려남)."""
+    key = (chat_id, bot_key)
+    _hot_chats[key] = int(time.time())
+    _hot_chats.move_to_end(key)
+    if len(_hot_chats) > WARM_HOT_CHATS:
+        _hot_chats.popitem(last=False)
+
+
+def snapshot_path(worker: Optional[int] = None) -> str:
+    """워커 프로세스는 각자 맡은 채팅방의 상태만 가지므로 파일을 따로 씁니다."""
+    if not WARM_STATE_PATH:
+        return ""
+    path = os.path.join(os.path.dirname(store.DB_PATH), WARM_STATE_PATH)  # 절대 경로면 그대로
+    return path if worker is None else f"{path}.w{worker}"
+
+
+def _db_identity() -> Dict[str, Any]:
+    return {
+        "backend": storage.STORAGE_BACKEND,
+        "schema": len(store._MIGRATIONS),
+        "shards": store.shard_count(),
+    }
+
+
+def _write_atomic(path: str, payload: bytes) -> None:
+    tmp = f"{path}.tmp.{os.getpid()}"
+    try:
+        with open(tmp, "wb") as fp:
+            fp.write(payload)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp, path)
+    finally:
+        with suppress(FileNotFoundError):
+            os.remove(tmp)
+    with suppress(OSError):  # 디렉터리 항목(rename)까지 디스크에 반영
+        dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def build_snapshot(idle_posters: Iterable[Any]) -> Dict[str, Any]:
+    return {
+        "version": WARM_STATE_VERSION,
+        "written_at": int(time.time()),
+        "db": _db_identity(),
+        "hot_chats": [[cid, ts, key] for (cid, key), ts in reversed(_hot_chats.items())],  # 최근 것부터
+        "idle": {str(poster.bot_id): poster.export_state() for poster in idle_posters if poster},
+    }
+
+
+async def save_snapshot(idle_posters: Iterable[Any], worker: Optional[int] = None) -> Optional[int]:
+    """스냅샷을 원자적으로 씁니다. 쓴 바이트 수를 반환하고, 꺼져 있거나 실패하면 None."""
+    path = snapshot_path(worker)
+    if not path:
+        return None
+    snapshot = build_snapshot(idle_posters)
+    payload = gzip.compress(json.dumps(snapshot, separators=(",", ":")).encode("utf-8"), compresslevel=6)
+    try:
+        await asyncio.to_thread(_write_atomic, path, payload)
+    except OSError as exc:
+        log.warning("스냅샷을 저장하지 못했어요: %r", exc)
+        return None
+    log.info(
+        "스냅샷 저장: %s (%d바이트)",
+        path,
+        len(payload),
+        extra={"hot_chats": len(snapshot["hot_chats"]), "bots": len(snapshot["idle"])},
+    )
+    return len(payload)
+
+
+def _read(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with gzip.open(path, "rb") as fp:
+            data = json.loads(fp.read().decode("utf-8"))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as exc:
+        log.warning("스냅샷을 읽지 못해 버려요: %r", exc)
+        data = None
+    # 한 번 읽은 스냅샷은 지웁니다. 비정상 종료 뒤에 오래된 상태를 다시 쓰지 않도록.
+    with suppress(OSError):
+        os.remove(path)
+    return data if isinstance(data, dict) else None
+
+
+def _stale_reason(snapshot: Dict[str, Any], now: int) -> Optional[str]:
+    if snapshot.get("version") != WARM_STATE_VERSION:
+        return f"형식 버전 {snapshot.get('version')!r}"
+    if snapshot.get("db") != _db_identity():
+        return f"DB 구성 {snapshot.get('db')!r}"
+    age = now - int(snapshot.get("written_at") or 0)
+    if not 0 <= age <= WARM_STATE_MAX_AGE_SECONDS:
+        return f"{age}초 전 스냅샷"
+    return None
+
+
+async def load_snapshot(worker: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """스냅샷을 읽고 검증합니다. 쓸 수 없으면 None (콜드 스타트)."""
+    path = snapshot_path(worker)
+    if not path:
+        return None
+    snapshot = await asyncio.to_thread(_read, path)
+    if snapshot is None:
+        return None
+    now = int(time.time())
+    reason = _stale_reason(snapshot, now)
+    if reason:
+        log.info("스냅샷을 쓰지 않아요: %s", reason)
+        return None
+
+    # 게시 시각은 그때 저장한 봇 메시지보다 늦을 수 없으므로, DB의 마지막 메시지로 확인합니다.
+    idle: Dict[str, Dict[str, Any]] = snapshot.get("idle") or {}
+    chat_ids = sorted({int(cid) for state in idle.values() for cid in (state.get("markers") or {})})
+    last = await asyncio.gather(*(store.aget_last_message(cid) for cid in chat_ids))
+    last_ts = {cid: info[2] for cid, info in zip(chat_ids, last) if info}
+    dropped = 0
+    for state in idle.values():
+        markers = state.get("markers") or {}
+        valid = {cid: ts for cid, ts in markers.items() if int(ts) <= min(now, last_ts.get(int(cid), -1))}
+        dropped += len(markers) - len(valid)
+        state["markers"] = valid
+    for cid, ts, key in reversed(snapshot.get("hot_chats") or []):  # 다음 스냅샷에도 이어지도록
+        _hot_chats.setdefault((int(cid), key), int(ts))
+    log.info(
+        "스냅샷 불러옴: 최근 채팅방 %d개, 봇 %d개",
+        len(snapshot.get("hot_chats") or []),
+        len(idle),
+        extra={"dropped_markers": dropped},
+    )
+    return snapshot
+
+
+def idle_state(snapshot: Optional[Dict[str, Any]], bot_id: int) -> Optional[Dict[str, Any]]:
+    """스냅샷에서 이 봇의 자동 게시 상태를 꺼냅니다."""
+    if not snapshot:
+        return None
+    return (snapshot.get("idle") or {}).get(str(bot_id))
+
+
+class WarmUp:
+    """시작 준비가 끝난 뒤 최근 채팅방의 컨텍스트 읽기 경로와 Gemini 클라이언트를 미리 준비하는 일회성 태스크."""
+
+    def __init__(self, chats: List[Tuple[int, Optional[str]]]) -> None:
+        self._chats = chats
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def start(self) -> asyncio.Task[None]:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="warm-up")
+        return self._task
+
+    async def stop(self) -> None:
+        if not self._task:
+            return
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        if not self._chats:
+            return
+        await startup.wait_ready()  # import·연결과 겹치면 첫 getUpdates가 늦어짐
+        started = time.perf_counter()
+        slots = asyncio.Semaphore(WARM_UP_CONCURRENCY)
+
+        async def warm_chat(chat_id: int, bot_key: Optional[str]) -> bool:
+            async with slots:
+                try:
+                    # 응답 경로(llm._build_prompt)와 같은 모양의 조회 (봇 key로 다른 봇 응답 제외)
+                    await store.run_read(build_context_for_llm, chat_id, "", "", 2000, bot_key)
+                    return True
+                except Exception as exc:  # pragma: no cover - 예방적 로그
+                    log.warning("미리 읽기 실패: %r", exc, extra={"chat_id": chat_id})
+                    return False
+
+        try:
+            await asyncio.to_thread(llm.warm_up)
+        except Exception as exc:  # API 키가 없어도 봇은 계속 돕니다.
+            log.warning("Gemini 클라이언트를 미리 준비하지 못했어요: %r", exc)
+        warmed = await asyncio.gather(*(warm_chat(cid, key) for cid, key in self._chats))
+        log.info(
+            "미리 읽기 완료: 채팅방 %d개, %.2fs",
+            sum(warmed),
+            time.perf_counter() - started,
+        )
+
+
+def start_warm_up(snapshot: Optional[Dict[str, Any]], own_chats: Any = None) -> WarmUp:
+    """스냅샷의 최근 (채팅방, 봇) 중 이 프로세스가 맡는 것만 미리 읽습니다 (맡은 채팅방이 없으면 아무것도 안 함)."""
+    chats = [(int(cid), key) for cid, _ts, key in (snapshot or {}).get("hot_chats") or []]
+    if own_chats is not None:
+        owned = own_chats([cid for cid, _key in chats])
+        chats = [(cid, key) for cid, key in chats if cid in owned]
+    warm_up = WarmUp(chats)
+    warm_up.start()
+    return warm_up
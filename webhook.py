@@ -0,0 +1,187 @@
+"""롱 폴링 대신 Telegram 웹훅으로 업데이트를 받는 aiohttp 서버 (선택).
+
+WEBHOOK_URL을 지정하면 run_bot이 폴링 대신 이 서버를 띄우고 setWebhook을 호출합니다.
+요청은 aiogram의 SimpleRequestHandler가 비밀 토큰(X-Telegram-Bot-Api-Secret-Token)을 확인한 뒤
+크기가 제한된 큐에 넣고 바로 200으로 응답하며, 워커 WEBHOOK_WORKERS개가 큐에서 꺼내
+dp.feed_raw_update로 처리합니다. 큐가 WEBHOOK_ENQUEUE_TIMEOUT초 안에 비지 않으면 503을 돌려
+Telegram이 나중에 다시 보내게 합니다 (역압).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import secrets
+import time
+from contextlib import suppress
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+import botlog
+import metrics
+
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080") or 8080)
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000") or 1000)
+WEBHOOK_WORKERS = 16
+WEBHOOK_ENQUEUE_TIMEOUT = 2.0  # 큐가 가득 찼을 때 요청을 붙잡아 두는 최대 시간
+WEBHOOK_MAX_CONNECTIONS = 40   # setWebhook max_connections (Telegram 동시 요청 수)
+
+log = botlog.get_logger("webhook")
+
+WEBHOOK_QUEUE_WAIT_SECONDS = metrics.histogram("webhook_queue_wait_seconds", "웹훅 업데이트가 큐에서 기다린 시간")
+WEBHOOK_REJECTED = metrics.counter("webhook_rejected_total", "큐가 가득 차 503으로 돌려보낸 웹훅 요청 수")
+
+
+class QueuedRequestHandler(SimpleRequestHandler):
+    """비밀 토큰 확인은 aiogram에 맡기고, 처리만 제한된 큐와 고정 워커로 돌립니다."""
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        *,
+        secret_token: str,
+        queue_size: int = WEBHOOK_QUEUE_SIZE,
+        workers: int = WEBHOOK_WORKERS,
+    ) -> None:
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True, secret_token=secret_token)
+        self._queue: asyncio.Queue[Tuple[float, Bot, Dict[str, Any]]] = asyncio.Queue(max(1, queue_size))
+        self._worker_count = max(1, workers)
+        self._workers: List[asyncio.Task[None]] = []
+        self.close_timeout = WEBHOOK_ENQUEUE_TIMEOUT  # 서버를 내릴 때 큐를 비우며 기다리는 시간
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.abandoned = 0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def start_workers(self) -> None:
+        if self._workers:
+            return
+        self._workers = [
+            asyncio.create_task(self._run_worker(), name=f"webhook-worker-{i}") for i in range(self._worker_count)
+        ]
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        update = await request.json(loads=bot.session.json_loads)
+        try:
+            await asyncio.wait_for(self._queue.put((time.perf_counter(), bot, update)), WEBHOOK_ENQUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            WEBHOOK_REJECTED.inc()
+            log.warning("업데이트 큐가 가득 차 503으로 돌려보냈어요.", extra={"depth": self.depth, "sampled": True})
+            return web.Response(status=503, headers={"Retry-After": "1"})
+        self.accepted += 1
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def _run_worker(self) -> None:
+        while True:
+            queued_at, bot, update = await self._queue.get()
+            WEBHOOK_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - queued_at)
+            try:
+                await self._background_feed_update(bot, update)
+            except Exception as exc:  # pragma: no cover - 예방적 로그
+                log.error("업데이트 처리 실패: %r", exc)
+            finally:
+                self.processed += 1
+                self._queue.task_done()
+
+    async def drain(self, timeout: float) -> bool:
+        """큐에 남은 업데이트를 timeout초까지 처리하고 워커를 멈춥니다. 다 비웠으면 True."""
+        drained = True
+        if self._workers:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                drained = False
+                self.abandoned += self.depth
+        for task in self._workers:
+            task.cancel()
+        for task in self._workers:
+            with suppress(asyncio.CancelledError):
+                await task
+        self._workers = []
+        return drained
+
+    async def close(self) -> None:
+        await self.drain(self.close_timeout)
+        await super().close()
+
+
+class WebhookServer:
+    """QueuedRequestHandler를 WEBHOOK_PATH에 올린 aiohttp 서버. register=True면 setWebhook도 호출합니다."""
+
+    def __init__(
+        self,
+        bot: Bot,
+        dp: Dispatcher,
+        *,
+        host: str = WEBHOOK_HOST,
+        port: int = WEBHOOK_PORT,
+        path: str = WEBHOOK_PATH,
+        secret_token: Optional[str] = None,
+        queue_size: int = WEBHOOK_QUEUE_SIZE,
+        workers: int = WEBHOOK_WORKERS,
+    ) -> None:
+        self._bot = bot
+        self._dp = dp
+        self._host = host
+        self._port = port
+        self._path = path
+        # 지정하지 않으면 실행마다 새 토큰을 만들어 setWebhook에 넘깁니다.
+        self.secret_token = secret_token or WEBHOOK_SECRET or secrets.token_urlsafe(32)
+        self.handler = QueuedRequestHandler(
+            dp, bot, secret_token=self.secret_token, queue_size=queue_size, workers=workers
+        )
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def port(self) -> int:
+        """실제로 바인딩된 포트 (port=0으로 띄운 경우 확인용)."""
+        if self._runner and self._runner.addresses:
+            return self._runner.addresses[0][1]
+        return self._port
+
+    async def start(self, register: bool = True) -> None:
+        if self._runner:
+            return
+        app = web.Application()
+        self.handler.register(app, path=self._path)
+        setup_application(app, self._dp, bot=self._bot)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self._host, self._port).start()
+        self.handler.start_workers()
+        log.info("웹훅 서버 시작: http://%s:%s%s", self._host, self.port, self._path)
+        if register:
+            await self._bot.set_webhook(
+                f"{WEBHOOK_URL}{self._path}",
+                secret_token=self.secret_token,
+                allowed_updates=self._dp.resolve_used_update_types(),
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+            )
+
+    async def stop(self, timeout: Optional[float] = None) -> None:
+        """새 요청을 끊고, 큐에 남은 업데이트를 timeout초까지 처리한 뒤 서버를 내립니다."""
+        if not self._runner:
+            return
+        if timeout is not None:
+            self.handler.close_timeout = timeout
+        await self._runner.cleanup()  # on_shutdown에서 handler.close()가 큐를 비웁니다.
+        self._runner = None
+
+
+async def start_webhook(bot: Bot, dp: Dispatcher) -> WebhookServer:
+    server = WebhookServer(bot, dp)
+    await server.start()
+    return server